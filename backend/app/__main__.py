@@ -13,6 +13,7 @@ from colorlog import ColoredFormatter
 from api.http import *
 from api.mqtt import *
 from api import database
+from logic import weather
 
 
 
@@ -147,15 +148,23 @@ def test_db(db):
 def start_db_client():
     """
     Starts the database client.
-    The client is started in a separate thread.
+    The client is started in a separate thread, and starts the
+    background jobs archiving completed rentals, writing
+    buffered scooter updates, reconciling the active-rental index
+    and prefetching the weather where the scooters are.
     """
     db = database.db(DB_CONFIG)
     set_db_client(db)
+    db.start_rental_archiver()
+    db.start_scooter_flusher()
+    db.start_rental_reconciler()
+    weather.start_weather_prefetcher()
 
     try:
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
+        weather.stop_weather_prefetcher()
         db.close()
 
 
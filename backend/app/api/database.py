@@ -1,20 +1,147 @@
+import os
+import asyncio
 import logging
+import functools
 import mysql.connector
-
+from datetime import date, datetime
+from threading import Lock
+from weakref import WeakKeyDictionary
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from mysql.connector import errorcode
+
+from api import migrations, sqlite_backend
+from api.pool import connection_pool
+from tools.cache import ttl_cache
+from tools.metrics import metrics_registry, instrument
+from tools.periodic import periodic_task
+from tools.rental_index import rental_index
 from tools.singleton import singleton
-
+from tools.spatial_index import grid_index
+from tools.write_buffer import write_buffer
+
+
+DB_BACKEND       = os.getenv("DB_BACKEND", "mysql").lower()
+DB_SQLITE_PATH   = os.getenv("DB_SQLITE_PATH", "escooter.db")
+DB_SQLITE_SEED   = os.getenv("DB_SQLITE_SEED", "True").lower() == "true"
+DB_MIGRATE       = os.getenv("DB_MIGRATE", "True").lower() == "true"
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 1))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+DB_POOL_TIMEOUT  = float(os.getenv("DB_POOL_TIMEOUT", 5.0))
+DB_PING_INTERVAL = float(os.getenv("DB_PING_INTERVAL", 30.0))
+DB_PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", "True").lower() == "true"
+
+SCOOTER_COLUMNS = "uuid, latitude, longtitude, status"
+USER_COLUMNS    = "id, name, funds"
+RENTAL_COLUMNS  = "id, user_id, scooter_id, is_active, start_time, end_time, total_price"
+
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 200.0))
+
+DB_BATCH_SIZE = int(os.getenv("DB_BATCH_SIZE", 500))
+DB_FETCH_SIZE = int(os.getenv("DB_FETCH_SIZE", 1000))
+DB_PAGE_SIZE  = int(os.getenv("DB_PAGE_SIZE", 100))
+DB_PAGE_MAX   = int(os.getenv("DB_PAGE_MAX", 1000))
+
+GEO_CELL_SIZE     = float(os.getenv("GEO_CELL_SIZE", 0.0025))
+GEO_SEARCH_RADIUS = float(os.getenv("GEO_SEARCH_RADIUS", 1000.0))
+
+ENTITY_CACHE_TTL  = float(os.getenv("ENTITY_CACHE_TTL", 10.0))
+ENTITY_CACHE_SIZE = int(os.getenv("ENTITY_CACHE_SIZE", 10000))
+
+SCOOTER_FLUSH_INTERVAL = float(os.getenv("SCOOTER_FLUSH_INTERVAL", 1.0))
+SCOOTER_FLUSH_SIZE     = int(os.getenv("SCOOTER_FLUSH_SIZE", 500))
+
+RENTAL_ARCHIVE_INTERVAL    = float(os.getenv("RENTAL_ARCHIVE_INTERVAL", 300.0))
+RENTAL_ARCHIVE_BATCH_SIZE  = int(os.getenv("RENTAL_ARCHIVE_BATCH_SIZE", 500))
+RENTAL_ARCHIVE_MAX_BATCHES = int(os.getenv("RENTAL_ARCHIVE_MAX_BATCHES", 20))
+RENTAL_ARCHIVE_MIN_AGE     = int(os.getenv("RENTAL_ARCHIVE_MIN_AGE", 3600))
+RENTAL_ARCHIVE_MONTHS_AHEAD = 2
+
+RENTAL_INDEX               = os.getenv("RENTAL_INDEX", "True").lower() == "true"
+RENTAL_RECONCILE_INTERVAL  = float(os.getenv("RENTAL_RECONCILE_INTERVAL", 60.0))
+
+# Completed rentals are moved here by archive_inactive_rentals(). The table is partitioned
+# by month of end_time; monthly partitions are split off p_future ahead of time.
+RENTAL_ARCHIVE_DDL = """
+CREATE TABLE IF NOT EXISTS rentals_archive (
+    id int(11) NOT NULL,
+    user_id int(11) NOT NULL,
+    scooter_id int(11) NOT NULL,
+    start_time datetime NULL DEFAULT NULL,
+    end_time datetime NOT NULL,
+    total_price float NOT NULL,
+    archived_at datetime NOT NULL,
+    PRIMARY KEY (id, end_time),
+    KEY user_id (user_id, end_time),
+    KEY scooter_id (scooter_id, end_time)
+) ENGINE=InnoDB DEFAULT CHARSET=latin1 COLLATE=latin1_swedish_ci
+PARTITION BY RANGE (TO_DAYS(end_time)) (
+    PARTITION p_history VALUES LESS THAN (TO_DAYS('{first_month}')),
+    PARTITION p_future VALUES LESS THAN MAXVALUE
+)
+"""
+
+# Client errors meaning the server connection was lost rather than the statement failing.
+CONNECTION_ERRORS = {
+    errorcode.CR_CONNECTION_ERROR,
+    errorcode.CR_CONN_HOST_ERROR,
+    errorcode.CR_SERVER_GONE_ERROR,
+    errorcode.CR_SERVER_LOST,
+    errorcode.CR_SERVER_LOST_EXTENDED,
+}
+
+
+# Latency, row and error statistics of every public db method, see db.metrics().
+DB_METRICS = metrics_registry(slow_threshold=DB_SLOW_QUERY_MS / 1000, logger=logging.getLogger(__name__))
 
 
 
 @singleton
+@instrument(DB_METRICS, exclude=(
+    "close", "ensure_connection", "set_prepared_statements", "start_rental_archiver",
+    "start_scooter_flusher", "start_rental_reconciler", "pool_stats", "liveness_stats", "statement_stats",
+    "cache_stats", "archiver_stats", "scooter_write_stats", "rental_index_stats", "metrics", "export_metrics",
+))
 class db:
     """
     Database class for managing database connections and queries.
     This class is a singleton, meaning only one instance of it can exist at a time.
     It provides methods for connecting to the database, executing queries,
     and managing transactions.
-    The database connection is established using the credentials provided
-    during initialization.
+    Queries run on connections checked out from a bounded connection pool, so the
+    HTTP handlers, the MQTT network thread and the DB thread never share a cursor.
+    The pool is sized by the environment variables DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE
+    and DB_POOL_TIMEOUT (seconds to wait for a free connection). Connections are only
+    pinged after being idle for DB_PING_INTERVAL seconds; a query failing with a lost
+    connection is retried once on a new connection. The hot lookups and updates are
+    prepared once per pooled connection and reused (disable with DB_PREPARED_STATEMENTS=False).
+    Scooter positions are kept in an in-memory grid index, loaded on startup and updated
+    by every scooter write, which answers the location queries without a database scan.
+    Every public method is measured: latency histograms (p50/p95/p99), rows read or written
+    and errors per method are available from metrics() and export_metrics(), and calls
+    slower than DB_SLOW_QUERY_MS milliseconds are logged as warnings.
+    get_scooter() and get_user() read through a TTL/LRU cache (ENTITY_CACHE_TTL seconds,
+    ENTITY_CACHE_SIZE entries); every write to a scooter or user row invalidates its entry.
+    Scooter position and status updates go through a write-behind buffer keeping the latest
+    value per scooter. Once start_scooter_flusher() has been called they are written in batches
+    every SCOOTER_FLUSH_INTERVAL seconds or when SCOOTER_FLUSH_SIZE scooters are pending;
+    until then, and for rental-critical writes, they are flushed synchronously. Reads of
+    scooter rows include buffered updates.
+    Completed rentals are moved to the monthly partitioned rentals_archive table by a
+    background job (see start_rental_archiver()), so the rentals table only holds active
+    and recently completed rows.
+    The active rentals are kept in an in-memory index by user and by scooter, loaded on
+    startup and updated by every write starting or ending a rental, which answers the
+    active-rental lookups without a query. start_rental_reconciler() compares the index
+    with the rentals table every RENTAL_RECONCILE_INTERVAL seconds and corrects it, so
+    rentals changed outside this process are picked up. Set RENTAL_INDEX=False to query
+    the table instead, e.g. when several processes write rentals to the same database.
+    The storage backend is selected with DB_BACKEND: "mysql" (default), "sqlite" (the file
+    DB_SQLITE_PATH) or "memory" (an in-memory SQLite database). The SQLite backends create
+    the schema on startup and load sample data into an empty database unless
+    DB_SQLITE_SEED=False, so they need no database server; credentials are ignored.
+    Pending schema migrations from resources/migrations are applied on startup
+    (disable with DB_MIGRATE=False), see migrate().
 
     On first initialization, credentials must be provided.
     After that, the same instance will be used throughout the application meaning
@@ -42,6 +169,7 @@ class db:
 
     - MySQL
     - MariaDB
+    - SQLite (DB_BACKEND=sqlite or DB_BACKEND=memory)
     """
 
     credentials = None
@@ -67,23 +195,43 @@ class db:
             db = database.db(credentials=credentials)
             ```
         """
-        self._conn = None
-        self._cursor = None
+        self._pool = None
         self._logger = logging.getLogger(__name__)
+        self._counters = {"pings": 0, "pings_skipped": 0, "retries": 0, "prepared": 0, "reused": 0}
+        self._counters_lock = Lock()
+        self._statements = WeakKeyDictionary()
+        self._statements_lock = Lock()
+        self._use_prepared = DB_PREPARED_STATEMENTS
+        self._scooter_index = grid_index(cell_size=GEO_CELL_SIZE)
+        self._scooter_cache = ttl_cache(max_size=ENTITY_CACHE_SIZE, ttl=ENTITY_CACHE_TTL)
+        self._user_cache = ttl_cache(max_size=ENTITY_CACHE_SIZE, ttl=ENTITY_CACHE_TTL)
+        self._archiver = None
+        self._archive_ready = False
+        self._scooter_writes = write_buffer(write=self._write_scooter_batch)
+        self._scooter_flusher = None
+        self._rentals = rental_index()
+        self._rentals_ready = False
+        self._rental_reconciler = None
         if credentials is not None:
             db.credentials = credentials 
             self._connect(credentials)
         else:
             self._connect(db.credentials)
 
-        self.delete_inactive_rentals()
+        if DB_MIGRATE:
+            self.migrate()
+        self.reindex_scooters()
+        self.reindex_rentals()
 
 
 
     def _connect(self: object, credentials) -> None:
         """
-        Connect to the database using the provided credentials.
-        If credentials are not provided, it will use the existing connection.
+        Create the connection pool using the provided credentials.
+        The pool opens DB_POOL_MIN_SIZE connections immediately and grows on demand.
+        With the SQLite backends the credentials are not used, and the schema is created
+        on the first connection. The in-memory database lives in a single connection, so
+        its pool holds exactly one connection.
 
         Args:
             credentials (dict): A dictionary containing the database connection details.
@@ -96,51 +244,437 @@ class db:
         ## Errors
             Raises an exception if the connection fails.
         """
+        min_size, max_size = DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE
+        if DB_BACKEND == "memory":
+            connect = sqlite_backend.memory_database()
+            min_size = max_size = 1
+        elif DB_BACKEND == "sqlite":
+            connect = lambda: sqlite_backend.connect(DB_SQLITE_PATH)
+        else:
+            connect = lambda: self._open_connection(credentials)
+
         try:
-            self._conn = mysql.connector.connect(**credentials)
-            self._conn.autocommit = True
-            self._cursor = self._conn.cursor()
-            self._logger.debug("Connected to the database")
+            self._pool = connection_pool(
+                connect=connect,
+                min_size=min_size,
+                max_size=max_size,
+                timeout=DB_POOL_TIMEOUT,
+            )
+            if DB_BACKEND != "mysql":
+                with self._pool.connection() as conn:
+                    sqlite_backend.initialize(conn, seed=DB_SQLITE_SEED)
+            self._logger.debug(f"Connected to the database ({DB_BACKEND})")
         except mysql.connector.Error as e:
             self._logger.error(f"Error connecting to the database: {e}")
             raise
 
 
 
+    def _open_connection(self: object, credentials: dict) -> object:
+        """
+        Internal function opening a single autocommit connection for the pool.
+        Args:
+            credentials (dict): A dictionary containing the database connection details.
+        Returns:
+            MySQLConnection: The new connection.
+        """
+        conn = mysql.connector.connect(**credentials)
+        conn.autocommit = True
+        return conn
+
+
+
     def close(self: object) -> None:
         """
-        Close the database connection and cursor.
+        Close all pooled database connections.
         This method should be called when the database operations are complete.
+        The rental archiver, the scooter flusher and the rental reconciler are stopped first, if they are running,
+        and buffered scooter updates are written.
+        """
+        if self._archiver is not None:
+            self._archiver.stop(timeout=DB_POOL_TIMEOUT)
+            self._archiver = None
+        if self._scooter_flusher is not None:
+            self._scooter_flusher.stop(timeout=DB_POOL_TIMEOUT)
+            self._scooter_flusher = None
+        if self._rental_reconciler is not None:
+            self._rental_reconciler.stop(timeout=DB_POOL_TIMEOUT)
+            self._rental_reconciler = None
+        if self._pool:
+            self.flush_scooter_updates()
+        if self._pool:
+            self._pool.close()
+
+
+
+    def migrate(self: object, target: int=None) -> list[int]:
+        """
+        Apply the pending schema migrations in resources/migrations, in version order.
+        Applied versions are recorded in the schema_version table, so calling this
+        again only applies migrations added since. See api/migrations.py.
+        Args:
+            target (int): Highest version to apply. All versions if None.
+        Returns:
+            list: The versions applied by this call.
+        Example:
+            ```python
+            db.migrate() -> [1, 2]
+            db.migrate() -> []
+            ```
+
+        ## Errors
+            Raises an exception if a migration fails.
+        """
+        with self._connection() as conn:
+            try:
+                return migrations.migrate(conn, target=target)
+            except mysql.connector.Error as e:
+                self._logger.error(f"Error migrating the database schema: {e}")
+                raise
+
+
+
+    def schema_version(self: object) -> int:
+        """
+        Get the highest applied schema migration version.
+        Returns:
+            int: The schema version, 0 if no migration has been applied.
+        """
+        with self._connection() as conn:
+            return max(migrations.applied_versions(conn), default=0)
+
+
+
+    def pool_stats(self: object) -> dict:
+        """
+        Get the connection pool metrics.
+        Returns:
+            dict: Pool size, connections in use, checkouts, exhausted count and wait times.
+        Example:
+            ```python
+            db.pool_stats() -> {"size": 3, "idle": 2, "in_use": 1, "exhausted": 0, "wait_avg": 0.0004, ...}
+            ```
         """
-        if self._cursor:
-            self._cursor.close()
-        if self._conn:
-            self._conn.close()
+        return self._pool.stats()
 
 
     def is_connection_alive(self):
         """
         Check if the database connection is alive.
+        Always pings the server, regardless of DB_PING_INTERVAL.
         Returns:
             bool: True if the connection is alive, False otherwise.
         """
         try:
-            self._conn.ping(reconnect=True)
-            return True
+            with self._connection(ping=True):
+                return True
         except mysql.connector.Error as e:
             return False
 
 
     def ensure_connection(self):
         """
-        Ensure that the database connection is alive.
-        If the connection is not alive, it will attempt to reconnect.
+        Ensure that the connection pool exists.
+        Individual connections are validated when they are checked out of the pool.
         """
-        if self._conn is None or self._cursor is None or not self.is_connection_alive():
+        if self._pool is None:
             self._connect(self.credentials)
 
 
 
+    def liveness_stats(self: object) -> dict:
+        """
+        Get the connection liveness counters.
+        Returns:
+            dict: Number of pings sent, pings skipped because the connection was recently used,
+            and queries retried after a connection error.
+        Example:
+            ```python
+            db.liveness_stats() -> {"pings": 4, "pings_skipped": 312, "retries": 1}
+            ```
+        """
+        with self._counters_lock:
+            return {key: self._counters[key] for key in ("pings", "pings_skipped", "retries")}
+
+
+
+    def statement_stats(self: object) -> dict:
+        """
+        Get the prepared statement counters.
+        Returns:
+            dict: Number of statements prepared and number of executions reusing a prepared statement.
+        Example:
+            ```python
+            db.statement_stats() -> {"prepared": 11, "reused": 2048}
+            ```
+        """
+        with self._counters_lock:
+            return {key: self._counters[key] for key in ("prepared", "reused")}
+
+
+
+    def cache_stats(self: object) -> dict:
+        """
+        Get the statistics of the scooter and user caches.
+        Returns:
+            dict: Hits, misses, hit ratio, size and evictions per cache.
+        Example:
+            ```python
+            db.cache_stats() -> {"scooters": {"hits": 140, "misses": 12, "hit_ratio": 0.92, ...}, "users": {...}}
+            ```
+        """
+        return {
+            "scooters": self._scooter_cache.stats(),
+            "users":    self._user_cache.stats(),
+        }
+
+
+
+    def metrics(self: object) -> dict:
+        """
+        Get the latency, row and error statistics of every db method called so far.
+        Latencies are in seconds and include time spent waiting for a pooled connection.
+        Returns:
+            dict: Per method the number of calls, calls with errors, slow calls, rows, and
+            the mean, min, max, p50, p95 and p99 latency.
+        Example:
+            ```python
+            db.metrics()["get_user"] -> {"calls": 152, "errors": 0, "slow": 0, "rows": 12, "p50": 0.00004, "p99": 0.0021, ...}
+            ```
+        """
+        return DB_METRICS.snapshot()
+
+
+
+    def export_metrics(self: object) -> str:
+        """
+        Export the db method statistics in the Prometheus text exposition format.
+        Returns:
+            str: The db_call_seconds histograms and db_call_rows/errors/slow_total counters, labelled by method.
+        """
+        return DB_METRICS.export_prometheus("db_call")
+
+
+
+    def set_prepared_statements(self: object, enabled: bool) -> None:
+        """
+        Enable or disable the use of prepared statements for the hot queries.
+        Args:
+            enabled (bool): True to use prepared statements, False to send plain queries.
+        """
+        self._use_prepared = enabled
+
+
+
+    def _count(self: object, counter: str) -> None:
+        """
+        Internal function incrementing a counter.
+        Args:
+            counter (str): Name of the counter.
+        """
+        with self._counters_lock:
+            self._counters[counter] += 1
+
+
+
+    def _is_connection_error(self: object, error: Exception) -> bool:
+        """
+        Internal function checking whether an error means the connection itself was lost,
+        as opposed to an error in the statement.
+        Args:
+            error (Exception): The error raised by the driver.
+        Returns:
+            bool: True if the query may succeed when retried on a new connection.
+        """
+        return isinstance(error, mysql.connector.errors.InterfaceError) or getattr(error, "errno", None) in CONNECTION_ERRORS
+
+
+
+    @contextmanager
+    def _connection(self: object, ping: bool=False):
+        """
+        Internal context manager checking out a connection from the pool.
+        The connection is only pinged if it has been idle for DB_PING_INTERVAL seconds
+        or longer; recently used connections are assumed alive and connection errors are
+        handled by retrying reads instead (see _run()).
+        The connection is returned to the pool when the block exits.
+        Args:
+            ping (bool): Always ping the connection before using it.
+        """
+        self.ensure_connection()
+        with self._pool.connection() as conn:
+            if ping or self._pool.idle_seconds(conn) >= DB_PING_INTERVAL:
+                conn.ping(reconnect=True)
+                self._count("pings")
+            else:
+                self._count("pings_skipped")
+            yield conn
+
+
+
+    def _prepared_cursor(self: object, conn: object, query: str) -> object:
+        """
+        Internal function returning the prepared cursor for a statement on a connection.
+        The statement is prepared by the server on its first execution and reused by later
+        executions on the same connection. The cache is dropped when the connection has
+        been re-established, since prepared statements belong to the server session.
+        Args:
+            conn (MySQLConnection): A connection checked out of the pool.
+            query (str): The SQL statement.
+        Returns:
+            MySQLCursorPrepared: The cursor holding the prepared statement.
+        """
+        with self._statements_lock:
+            entry = self._statements.get(conn)
+            if entry is None or entry[0] != conn.connection_id:
+                entry = (conn.connection_id, {})
+                self._statements[conn] = entry
+
+        cursor = entry[1].get(query)
+        if cursor is None:
+            cursor = conn.cursor(prepared=True)
+            entry[1][query] = cursor
+            self._count("prepared")
+        else:
+            self._count("reused")
+        return cursor
+
+
+
+    def _forget_statements(self: object, conn: object) -> None:
+        """
+        Internal function dropping the prepared statements cached for a connection.
+        Args:
+            conn (MySQLConnection): The connection.
+        """
+        with self._statements_lock:
+            entry = self._statements.pop(conn, None)
+        if entry is not None:
+            for cursor in entry[1].values():
+                try:
+                    cursor.close()
+                except mysql.connector.Error:
+                    pass
+
+
+
+    def _run(self: object, func, commit: bool=False, prepared: str=None, retry: bool=False):
+        """
+        Internal function running a callable with a cursor on a pooled connection.
+        If the connection turns out to be dead, it is discarded and the call is retried
+        once on another connection, which is pinged (and reconnected) before use since
+        the other idle connections may have been dropped by the server as well.
+        A call which already ran its statements is only retried if `retry` is set: the
+        connections autocommit, so a write may have been committed by the server before
+        the connection was lost, and running it again would apply it twice.
+        Args:
+            func (callable): Function receiving the cursor and returning the result.
+            commit (bool): Commit after the function has run.
+            prepared (str): Statement to run through the connection's prepared cursor, if any.
+            retry (bool): The function is safe to run twice, e.g. it only reads.
+        Returns:
+            The return value of the function.
+        """
+        for attempt in range(2):
+            sent = False
+            try:
+                with self._connection(ping=attempt > 0) as conn:
+                    cursor = self._prepared_cursor(conn, prepared) if prepared else conn.cursor()
+                    try:
+                        sent = True
+                        result = func(cursor)
+                        if commit:
+                            conn.commit()
+                            DB_METRICS.add_rows(cursor.rowcount)
+                        return result
+                    except mysql.connector.Error:
+                        if prepared:
+                            self._forget_statements(conn)
+                        raise
+                    finally:
+                        if not prepared:
+                            cursor.close()
+            except mysql.connector.Error as e:
+                if attempt > 0 or not self._is_connection_error(e) or (sent and not retry):
+                    DB_METRICS.add_error()
+                    raise
+                self._count("retries")
+                self._logger.warning(f"Lost database connection, retrying on a new connection: {e}")
+
+
+
+    def _decode_row(self: object, row: tuple) -> tuple:
+        """
+        Internal function converting text returned as bytes by prepared cursors to str.
+        Args:
+            row (tuple): A row returned by a prepared cursor.
+        Returns:
+            tuple: The row with all byte strings decoded.
+        """
+        if row is None:
+            return None
+        return tuple(value.decode() if isinstance(value, (bytes, bytearray)) else value for value in row)
+
+
+
+    def _fetchone(self: object, query: str, params: tuple=(), prepared: bool=False) -> tuple:
+        """
+        Internal function running a query on a pooled connection and returning the first row.
+        Args:
+            query (str): The SQL query.
+            params (tuple): The query parameters.
+            prepared (bool): Run the query as a prepared statement cached on the connection.
+        Returns:
+            tuple: The first row, or None if the query returned no rows.
+        """
+        def fetchone(cursor):
+            cursor.execute(query, params)
+            if prepared:
+                # A prepared cursor is reused, so all rows must be consumed.
+                rows = cursor.fetchall()
+                return self._decode_row(rows[0]) if rows else None
+            return cursor.fetchone()
+        row = self._run(fetchone, prepared=query if prepared and self._use_prepared else None, retry=True)
+        DB_METRICS.add_rows(0 if row is None else 1)
+        return row
+
+
+
+    def _fetchall(self: object, query: str, params: tuple=()) -> list[tuple]:
+        """
+        Internal function running a query on a pooled connection and returning all rows.
+        Args:
+            query (str): The SQL query.
+            params (tuple): The query parameters.
+        Returns:
+            list: All rows returned by the query.
+        """
+        def fetchall(cursor):
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        rows = self._run(fetchall, retry=True)
+        DB_METRICS.add_rows(len(rows))
+        return rows
+
+
+
+    def _execute(self: object, query: str, params: tuple=(), prepared: bool=False) -> int:
+        """
+        Internal function running a write statement on a pooled connection and committing it.
+        Args:
+            query (str): The SQL statement.
+            params (tuple): The statement parameters.
+            prepared (bool): Run the statement as a prepared statement cached on the connection.
+        Returns:
+            int: The number of affected rows.
+        """
+        def execute(cursor):
+            cursor.execute(query, params)
+            return cursor.rowcount
+        return self._run(execute, commit=True, prepared=query if prepared and self._use_prepared else None)
+
+
+
     def get_user(self: object, user_id: int) -> tuple[int, str, float]:
         """
         Get single user instance from the database by user ID.
@@ -154,10 +688,8 @@ class db:
             db.get_user(1) -> (1, "Kari Normann", 125.0)
             ```
         """
-        self.ensure_connection()
-        query = "SELECT * FROM users WHERE id = %s"
-        self._cursor.execute(query, (user_id,))
-        return self._cursor.fetchone()
+        query = f"SELECT {USER_COLUMNS} FROM users WHERE id = %s"
+        return self._user_cache.get_or_load(str(user_id), lambda: self._fetchone(query, (user_id,), prepared=True))
     
 
 
@@ -173,16 +705,16 @@ class db:
             db.get_scooter(1) -> (1, 63.41947, 10.40174, 0)
             ```
         """
-        self.ensure_connection()
-        query = "SELECT * FROM scooters WHERE uuid = %s"
-        self._cursor.execute(query, (scooter_id,))
-        return self._cursor.fetchone()
+        query = f"SELECT {SCOOTER_COLUMNS} FROM scooters WHERE uuid = %s"
+        scooter = self._scooter_cache.get_or_load(str(scooter_id), lambda: self._fetchone(query, (scooter_id,), prepared=True))
+        return self._overlay_scooter(scooter)
     
 
 
     def get_rental_by_id(self: object, rental_id: int) -> tuple[int, int, str, bool, str, str, float]:
         """
         Get single rental instance from the database by rental ID.
+        Rentals which have been archived are looked up in the archive.
         Args:
             rental_id (int): The ID of the rental to retrieve. (Primary key in the database)
         Returns:
@@ -192,16 +724,19 @@ class db:
             db.get_rental_by_id(1) -> (1, 2, 3, False, "2023-10-01 12:00:00", "2023-10-01 12:30:00", 15.0)
             ```
         """
-        self.ensure_connection()
-        query = "SELECT * FROM rentals WHERE id = %s"
-        self._cursor.execute(query, (rental_id,))
-        return self._cursor.fetchone()
+        query = f"SELECT {RENTAL_COLUMNS} FROM rentals WHERE id = %s"
+        rental = self._fetchone(query, (rental_id,), prepared=True)
+        if rental is None and self._archive_ready:
+            query = "SELECT id, user_id, scooter_id, 0, start_time, end_time, total_price FROM rentals_archive WHERE id = %s"
+            rental = self._fetchone(query, (rental_id,), prepared=True)
+        return rental
     
 
 
     def get_active_rental_by_user(self: object, user_id: int) -> tuple[int, int, str, bool, str, str, float]:
         """
         Get active rental instance from the database by user ID.
+        Answered from the active-rental index, if it is loaded.
         Args:
             user_id (int): The ID of the user to retrieve. (Primary key in the database)
         Returns:
@@ -211,16 +746,17 @@ class db:
             db.get_active_rental_by_user(1) -> (5, 1, 3, True, "2023-10-01 12:00:00", None, 0.0)
             ```
         """
-        self.ensure_connection()
-        query = "SELECT * FROM rentals WHERE user_id = %s AND is_active = 1"
-        self._cursor.execute(query, (user_id,))
-        return self._cursor.fetchone()
+        if self._rentals_ready:
+            return self._rentals.by_user(user_id)
+        query = f"SELECT {RENTAL_COLUMNS} FROM rentals WHERE user_id = %s AND is_active = 1"
+        return self._fetchone(query, (user_id,), prepared=True)
     
 
 
     def get_active_rental_by_scooter(self: object, scooter_id: int) -> tuple[int, int, str, bool, str, str, float]:
         """
         Get active rental instance from the database by scooter ID.
+        Answered from the active-rental index, if it is loaded.
         Args:
             scooter_id (int): The ID of the scooter to retrieve. (Primary key in the database)
         Returns:
@@ -230,10 +766,10 @@ class db:
             db.get_active_rental_by_scooter(1) -> (5, 1, 3, True, "2023-10-01 12:00:00", None, 0.0)
             ```
         """
-        self.ensure_connection()
-        query = "SELECT * FROM rentals WHERE scooter_id = %s AND is_active = 1"
-        self._cursor.execute(query, (scooter_id,))
-        return self._cursor.fetchone()
+        if self._rentals_ready:
+            return self._rentals.by_scooter(scooter_id)
+        query = f"SELECT {RENTAL_COLUMNS} FROM rentals WHERE scooter_id = %s AND is_active = 1"
+        return self._fetchone(query, (scooter_id,), prepared=True)
     
     
 
@@ -250,16 +786,140 @@ class db:
             db.rental_started(5, 6) -> True
             ```
         """
-        self.ensure_connection()
         query = "INSERT INTO rentals (user_id, scooter_id, is_active, start_time, end_time, total_price) VALUES (%s, %s, 1, UTC_TIMESTAMP(), NULL, 0.0)"
+        rental_query = f"SELECT {RENTAL_COLUMNS} FROM rentals WHERE id = %s"
+
+        # The new row is read back in the insert transaction, like in claim_scooter(), so
+        # nothing can fail between the commit and the indexing.
+        def insert(cursor):
+            cursor.execute(query, (user_id, scooter_id))
+            cursor.execute(rental_query, (cursor.lastrowid,))
+            return cursor.fetchone()
+
         try:
-            self._cursor.execute(query, (user_id, scooter_id))
-            self._conn.commit()
-            return True
+            rental = self._run(insert, commit=True)
         except mysql.connector.Error as e:
             self._logger.error(f"Error starting rental: {e}")
             return False
-        
+        # A rental missing from the index is picked up by the next reconcile_rentals().
+        if rental is not None:
+            self._rentals.add(rental)
+        return True
+
+
+
+    def claim_scooter(self: object, user_id: int, scooter_id: int) -> tuple[str, tuple, tuple, int]:
+        """
+        Atomically claim a scooter for a user. In a single transaction the scooter row and
+        the user row are locked, both are checked for active rentals, and a new rental is
+        inserted. Concurrent claims of the same scooter or by the same user are serialized
+        on the row locks, so only one of them can succeed.
+        The rental is started at claim time. If a later step of the unlock fails, the claim
+        must be undone with release_claim().
+        Args:
+            user_id (int): The ID of the user claiming the scooter.
+            scooter_id (int): The ID of the scooter being claimed.
+        Returns:
+            tuple:
+                * [0]: (str) "" if the claim succeeded, otherwise one of "scooter-not-found",
+                  "user-not-found", "user-occupied", "scooter-occupied", "scooter-unavailable"
+                  (scooter status is not 0) or "rental-error".
+                * [1]: (tuple) The scooter row, or None if not found.
+                * [2]: (tuple) The user row, or None if not found.
+                * [3]: (int) The ID of the new rental, or None if the claim failed.
+        Example:
+            ```python
+            db.claim_scooter(1, 2) -> ("", (2, 63.4153, 10.3995, 0), (1, "John Appleseed", 450.0), 228)
+            db.claim_scooter(2, 2) -> ("scooter-occupied", (2, 63.4153, 10.3995, 0), (2, "Kari Nordmann", 600.0), None)
+            ```
+        """
+        scooter_query = f"SELECT {SCOOTER_COLUMNS} FROM scooters WHERE uuid = %s FOR UPDATE"
+        user_query = (
+            "SELECT id, name, funds, "
+            "(SELECT COUNT(*) FROM rentals WHERE user_id = %s AND is_active = 1), "
+            "(SELECT COUNT(*) FROM rentals WHERE scooter_id = %s AND is_active = 1) "
+            "FROM users WHERE id = %s FOR UPDATE"
+        )
+        insert_query = "INSERT INTO rentals (user_id, scooter_id, is_active, start_time, end_time, total_price) VALUES (%s, %s, 1, UTC_TIMESTAMP(), NULL, 0.0)"
+        rental_query = f"SELECT {RENTAL_COLUMNS} FROM rentals WHERE id = %s"
+
+        # The scooter row is checked in the transaction, so it must include buffered updates.
+        if self._scooter_writes.get(int(scooter_id)) is not None:
+            self.flush_scooter_updates()
+
+        scooter = user = None
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    # READ COMMITTED makes the active-rental counts see a competing claim
+                    # which committed while this transaction waited for the row locks.
+                    conn.start_transaction(isolation_level="READ COMMITTED")
+                    cursor.execute(scooter_query, (scooter_id,))
+                    scooter = cursor.fetchone()
+                    if scooter is None:
+                        conn.rollback()
+                        return "scooter-not-found", None, None, None
+
+                    cursor.execute(user_query, (user_id, scooter_id, user_id))
+                    row = cursor.fetchone()
+                    if row is None:
+                        conn.rollback()
+                        return "user-not-found", scooter, None, None
+                    user = row[:3]
+
+                    if row[3] > 0:
+                        conn.rollback()
+                        return "user-occupied", scooter, user, None
+                    if row[4] > 0:
+                        conn.rollback()
+                        return "scooter-occupied", scooter, user, None
+                    if scooter[3] != 0:
+                        conn.rollback()
+                        return "scooter-unavailable", scooter, user, None
+
+                    cursor.execute(insert_query, (user_id, scooter_id))
+                    rental_id = cursor.lastrowid
+                    cursor.execute(rental_query, (rental_id,))
+                    rental = cursor.fetchone()
+                    conn.commit()
+                    DB_METRICS.add_rows(1)
+                    self._rentals.add(rental)
+                    return "", scooter, user, rental_id
+                except mysql.connector.Error:
+                    conn.rollback()
+                    raise
+                finally:
+                    cursor.close()
+        except mysql.connector.Error as e:
+            DB_METRICS.add_error()
+            self._logger.error(f"Error claiming scooter: {e}")
+            return "rental-error", scooter, user, None
+
+
+
+    def release_claim(self: object, rental_id: int) -> bool:
+        """
+        Undo a claim made by claim_scooter() when the unlock could not be completed.
+        The rental is removed, so it will neither be charged nor kept in the history.
+        Args:
+            rental_id (int): The ID of the rental returned by claim_scooter().
+        Returns:
+            bool: True if the claim was released, False otherwise.
+        Example:
+            ```python
+            db.release_claim(228) -> True
+            ```
+        """
+        query = "DELETE FROM rentals WHERE id = %s AND is_active = 1"
+        try:
+            released = self._execute(query, (rental_id,)) > 0
+        except mysql.connector.Error as e:
+            self._logger.error(f"Error releasing claim: {e}")
+            return False
+        self._rentals.remove(rental_id)
+        return released
+
 
 
     def rental_completed(self:object, user_id: int, price: float, lat: float, lon: float, status: int) -> bool:
@@ -278,165 +938,1079 @@ class db:
             db.rental_completed(5, 15.0, {"latitude": 63.41947, "longitude": 10.40174}, 0) -> True
             ```
         """
-        self.ensure_connection()
         rental = self.get_active_rental_by_user(user_id)
         if rental is None:
             self._logger.error("Rental not found")
             return False
         rental_id = rental[0]
         scooter_id = rental[2]
-        query = "UPDATE rentals SET is_active = 0, end_time = NOW(), total_price = %s WHERE user_id = %s AND scooter_id = %s AND id = %s"
+        query = "UPDATE rentals SET is_active = 0, end_time = NOW(), total_price = %s WHERE user_id = %s AND scooter_id = %s AND id = %s AND is_active = 1"
         self._logger.debug(f"Params: {price}, {user_id}, {scooter_id}, {rental_id}, {lat}, {lon}, {status}")
         try:
-            self._cursor.execute(query, (price, user_id, scooter_id, rental_id))
-            self._conn.commit()
-            self._logger.debug(f"Rental completed: {rental_id}")
+            completed = self._execute(query, (price, user_id, scooter_id, rental_id), prepared=True)
         except mysql.connector.Error as e:
             self._logger.error(f"Error completing rental: {e}")
             return False
-        try:
-            return self._update_scooter_info(scooter_id, lat, lon, status)
-        except mysql.connector.Error as e:
-            self._logger.error(f"Error updating scooter info: {e}")
+        self._rentals.remove(rental_id)
+        if not completed:
+            self._logger.error(f"Rental not active: {rental_id}")
+            return False
+        self._logger.debug(f"Rental completed: {rental_id}")
+        return self._update_scooter_info(scooter_id, lat, lon, status, flush=True)
         
 
 
-    def update_scooter_status(self: object, scooter_id: int, status: int) -> bool:
+    def get_riders(self: object, user_ids: list[int]) -> list[tuple[int, str, float, int]]:
         """
-        Update the status of a scooter in the database.
+        Get several users and their number of active rentals in one round trip per DB_BATCH_SIZE IDs.
+        Used to validate all riders of a group ride at once. Unknown IDs are left out of the result.
         Args:
-            scooter_id (int): The ID of the scooter to update.
-            status (int): The new status of the scooter.
+            user_ids (list): The IDs of the users to retrieve.
         Returns:
-            bool: True if the scooter status was successfully updated, False otherwise.
+            list: Tuples of (id, name, funds, active rentals).
+        Example:
+            ```python
+            db.get_riders([1, 2, 99]) -> [(1, "John Appleseed", 450.0, 0), (2, "Kari Nordmann", 600.0, 1)]
+            ```
         """
-        self.ensure_connection()
-        query = "UPDATE scooters SET status = %s WHERE uuid = %s"
-        self._logger.debug(f"update_scooter_status: params: {status}, {scooter_id}")
-        try:
-            self._cursor.execute(query, (status, scooter_id))
-            self._conn.commit()
-            self._logger.debug(f"Scooter info updated: {scooter_id}")
-            return True
-        except mysql.connector.Error as e:
-            self._logger.error(f"Error updating scooter info: {e}")
-            return False
+        query = (
+            "SELECT id, name, funds, "
+            "(SELECT COUNT(*) FROM rentals WHERE rentals.user_id = users.id AND rentals.is_active = 1) "
+            "FROM users WHERE id IN ({})"
+        )
+        return self._fetch_in(query, user_ids)
 
 
 
-    def _update_scooter_info(self: object, scooter_id: int, lat: float, lon: float, status: int) -> bool:
+    def claim_group(self: object, leader_id: int, rides: list[tuple[int, int]]) -> tuple[str, int, int, list[int]]:
         """
-        Internal function to update the scooter information in the database.
+        Atomically claim the scooters of a group ride. In a single transaction all scooter
+        and user rows are locked (in ID order, so concurrent claims cannot deadlock), checked
+        for active rentals, and a rental per rider, a multisession led by the leader and a
+        corider row per rider are inserted. Either every rental is started or none is.
+        If a later step of the group unlock fails, the claim must be undone with release_group().
         Args:
-            scooter_id (str): The ID of the scooter to update.
-            location (dict): The new location of the scooter.
-            status (int): The status of the scooter.
+            leader_id (int): The ID of the user leading the group. Must be one of the riders.
+            rides (list): Tuples of (user_id, scooter_id), one per rider. Users and scooters must be unique.
         Returns:
-            bool: True if the scooter information was successfully updated, False otherwise.
+            tuple:
+                * [0]: (str) "" if the claim succeeded, otherwise one of "scooter-not-found",
+                  "user-not-found", "user-occupied", "scooter-occupied", "scooter-unavailable"
+                  or "rental-error".
+                * [1]: (int) The ID of the user or scooter the claim failed on, or None.
+                * [2]: (int) The ID of the new multisession, or None if the claim failed.
+                * [3]: (list) The IDs of the new rentals in the order of `rides`, or None if the claim failed.
+        Example:
+            ```python
+            db.claim_group(1, [(1, 2), (4, 3)]) -> ("", None, 12, [228, 229])
+            db.claim_group(1, [(1, 2), (5, 7)]) -> ("user-occupied", 5, None, None)
+            ```
         """
-        self.ensure_connection()
-        query = "UPDATE scooters SET latitude = %s, longtitude = %s, status = %s WHERE uuid = %s"
-        self._logger.debug(f"_update_scooter_info: params: {lat}, {lon}, {status}, {scooter_id}")
+        user_ids    = sorted(user_id for user_id, _ in rides)
+        scooter_ids = sorted(scooter_id for _, scooter_id in rides)
+        users_in    = ", ".join(["%s"] * len(user_ids))
+        scooters_in = ", ".join(["%s"] * len(scooter_ids))
+        scooter_query = f"SELECT {SCOOTER_COLUMNS} FROM scooters WHERE uuid IN ({scooters_in}) ORDER BY uuid FOR UPDATE"
+        user_query = (
+            "SELECT id, (SELECT COUNT(*) FROM rentals WHERE rentals.user_id = users.id AND rentals.is_active = 1) "
+            f"FROM users WHERE id IN ({users_in}) ORDER BY id FOR UPDATE"
+        )
+        occupied_query = f"SELECT scooter_id FROM rentals WHERE scooter_id IN ({scooters_in}) AND is_active = 1"
+        session_query = "INSERT INTO multisession (user_id, start_time, end_time, isActive, longtitude, latitude) VALUES (%s, UTC_TIMESTAMP(), NULL, 1, %s, %s)"
+        rental_query = "INSERT INTO rentals (user_id, scooter_id, is_active, start_time, end_time, total_price) VALUES (%s, %s, 1, UTC_TIMESTAMP(), NULL, 0.0)"
+        corider_query = "INSERT INTO corider (user_id, scooter_id, session_id) VALUES (%s, %s, %s)"
+
+        # The scooter rows are checked in the transaction, so they must include buffered updates.
+        if any(self._scooter_writes.get(int(scooter_id)) is not None for scooter_id in scooter_ids):
+            self.flush_scooter_updates()
+
         try:
-            self._cursor.execute(query, (lat, lon, status, scooter_id))
-            self._conn.commit()
-            self._logger.debug(f"Scooter info updated: {scooter_id}")
-            return True
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    conn.start_transaction(isolation_level="READ COMMITTED")
+                    cursor.execute(scooter_query, tuple(scooter_ids))
+                    scooters = {int(row[0]): row for row in cursor.fetchall()}
+                    missing = next((scooter_id for scooter_id in scooter_ids if int(scooter_id) not in scooters), None)
+                    if missing is not None:
+                        conn.rollback()
+                        return "scooter-not-found", missing, None, None
+
+                    cursor.execute(user_query, tuple(user_ids))
+                    users = {int(row[0]): row[1] for row in cursor.fetchall()}
+                    missing = next((user_id for user_id in user_ids if int(user_id) not in users), None)
+                    if missing is not None:
+                        conn.rollback()
+                        return "user-not-found", missing, None, None
+                    occupied = next((user_id for user_id in user_ids if users[int(user_id)] > 0), None)
+                    if occupied is not None:
+                        conn.rollback()
+                        return "user-occupied", occupied, None, None
+
+                    cursor.execute(occupied_query, tuple(scooter_ids))
+                    rented = cursor.fetchall()
+                    if rented:
+                        conn.rollback()
+                        return "scooter-occupied", rented[0][0], None, None
+                    unavailable = next((scooter_id for scooter_id in scooter_ids if scooters[int(scooter_id)][3] != 0), None)
+                    if unavailable is not None:
+                        conn.rollback()
+                        return "scooter-unavailable", unavailable, None, None
+
+                    leader_scooter = scooters[int(next(scooter_id for user_id, scooter_id in rides if user_id == leader_id))]
+                    cursor.execute(session_query, (leader_id, leader_scooter[2], leader_scooter[1]))
+                    session_id = cursor.lastrowid
+                    rental_ids = []
+                    for user_id, scooter_id in rides:
+                        cursor.execute(rental_query, (user_id, scooter_id))
+                        rental_ids.append(cursor.lastrowid)
+                    cursor.executemany(corider_query, [(user_id, scooter_id, session_id) for user_id, scooter_id in rides])
+                    cursor.execute(f"SELECT {RENTAL_COLUMNS} FROM rentals WHERE id IN ({', '.join(['%s'] * len(rental_ids))})", tuple(rental_ids))
+                    rentals = cursor.fetchall()
+                    conn.commit()
+                    DB_METRICS.add_rows(1 + 2 * len(rides))
+                    for rental in rentals:
+                        self._rentals.add(rental)
+                    return "", None, session_id, rental_ids
+                except mysql.connector.Error:
+                    conn.rollback()
+                    raise
+                finally:
+                    cursor.close()
         except mysql.connector.Error as e:
-            self._logger.error(f"Error updating scooter info: {e}")
-            return False
-        
+            DB_METRICS.add_error()
+            self._logger.error(f"Error claiming group: {e}")
+            return "rental-error", None, None, None
 
 
-    def get_all_scooters(self: object) -> list[tuple[int, float, float, int]]:
+
+    def release_group(self: object, session_id: int, rental_ids: list[int]) -> bool:
         """
-        Get all scooters from the database.
+        Undo a claim made by claim_group() when the group unlock could not be completed.
+        The rentals, corider rows and multisession are removed in a single transaction.
+        Args:
+            session_id (int): The ID of the multisession returned by claim_group().
+            rental_ids (list): The IDs of the rentals returned by claim_group().
         Returns:
-            list: A list of dictionaries containing scooter information.
+            bool: True if the claim was released, False otherwise.
+        Example:
+            ```python
+            db.release_group(12, [228, 229]) -> True
+            ```
         """
-        self.ensure_connection()
-        query = "SELECT * FROM scooters"
-        self._cursor.execute(query)
-        return self._cursor.fetchall()
-    
+        rentals_in = ", ".join(["%s"] * len(rental_ids))
 
+        def release(cursor):
+            cursor.execute(f"DELETE FROM rentals WHERE id IN ({rentals_in}) AND is_active = 1", tuple(rental_ids))
+            cursor.execute("DELETE FROM corider WHERE session_id = %s", (session_id,))
+            cursor.execute("DELETE FROM multisession WHERE id = %s AND isActive = 1", (session_id,))
+            return cursor.rowcount > 0
 
-    def get_all_users(self: object) -> list[tuple[int, str, float]]:
-        """
-        Get all users from the database.
-        Returns:
-            list: A list of dictionaries containing user information.
-        """
-        self.ensure_connection()
-        query = "SELECT * FROM users"
-        self._cursor.execute(query)
-        return self._cursor.fetchall()
-    
+        released = self._transaction(release, "Error releasing group")
+        if released:
+            for rental_id in rental_ids:
+                self._rentals.remove(rental_id)
+        return released
 
 
-    def get_all_rentals(self: object) -> list[tuple[int, int, str, bool, str, str, float]]:
+
+    def get_group_session(self: object, session_id: int) -> tuple[int, int, str, str, bool, float, float]:
         """
-        Get all rentals from the database.
+        Get a multisession (group ride) by its ID.
+        Args:
+            session_id (int): The ID of the multisession.
         Returns:
-            list: A list of dictionaries containing rental information.
+            tuple: (id, leader user_id, start_time, end_time, isActive, longtitude, latitude), or None if not found.
+        Example:
+            ```python
+            db.get_group_session(12) -> (12, 1, datetime(2025, 4, 2, 10, 3, 11), None, 1, 10.3995, 63.4153)
+            ```
         """
-        self.ensure_connection()
-        query = "SELECT * FROM rentals"
-        self._cursor.execute(query)
-        return self._cursor.fetchall()
-    
+        query = "SELECT id, user_id, start_time, end_time, isActive, longtitude, latitude FROM multisession WHERE id = %s"
+        return self._fetchone(query, (session_id,), prepared=True)
 
 
-    def get_active_rentals(self: object) -> list[tuple[int, int, str, bool, str, str, float]]:
+
+    def get_group_rides(self: object, session_id: int) -> list[tuple[int, int, int]]:
         """
-        Get all active rentals from the database.
+        Get the riders of a group ride with their active rental.
+        Args:
+            session_id (int): The ID of the multisession.
         Returns:
-            list: A list of dictionaries containing active rental information.
+            list: Tuples of (user_id, scooter_id, rental_id) in the order the riders joined.
+            The rental ID is None if the rider has no active rental on the scooter.
+        Example:
+            ```python
+            db.get_group_rides(12) -> [(1, 2, 228), (4, 3, 229)]
+            ```
         """
-        self.ensure_connection()
-        query = "SELECT * FROM rentals WHERE is_active = 1"
-        self._cursor.execute(query)
-        return self._cursor.fetchall()
+        query = (
+            "SELECT corider.user_id, corider.scooter_id, rentals.id FROM corider "
+            "LEFT JOIN rentals ON rentals.user_id = corider.user_id AND rentals.scooter_id = corider.scooter_id AND rentals.is_active = 1 "
+            "WHERE corider.session_id = %s ORDER BY corider.id"
+        )
+        return self._fetchall(query, (session_id,))
 
 
 
-    def delete_inactive_rentals(self: object) -> bool:
+    def group_completed(self: object, session_id: int, rides: list[tuple[int, int, int]], price: float) -> bool:
         """
-        Delete all inactive rentals from the database.
+        Complete a group ride. In a single transaction every rental is ended at the given
+        price, every rider is charged the price and the multisession is closed. If any
+        rental is no longer active, nothing is changed.
+        The scooters' statuses are updated separately, see update_scooter_statuses().
+        Args:
+            session_id (int): The ID of the multisession.
+            rides (list): Tuples of (user_id, scooter_id, rental_id) as returned by get_group_rides().
+            price (float): The price charged to each rider. Nothing is charged if it is not positive.
         Returns:
-            bool: True if the deletion was successful, False otherwise.
-        """
-        self.ensure_connection()
-        query = "DELETE FROM rentals WHERE is_active = 0"
+            bool: True if the group ride was completed, False otherwise.
+        Example:
+            ```python
+            db.group_completed(12, [(1, 2, 228), (4, 3, 229)], 25.0) -> True
+            ```
+        """
+        rental_ids = [rental_id for _, _, rental_id in rides]
+        user_ids   = [user_id for user_id, _, _ in rides]
+        rentals_in = ", ".join(["%s"] * len(rental_ids))
+        users_in   = ", ".join(["%s"] * len(user_ids))
+        price = max(float(price), 0.0)
+
+        def complete(cursor):
+            cursor.execute(f"UPDATE rentals SET is_active = 0, end_time = NOW(), total_price = %s WHERE id IN ({rentals_in}) AND is_active = 1", (price, *rental_ids))
+            if cursor.rowcount != len(rental_ids):
+                raise mysql.connector.errors.DatabaseError(msg=f"{len(rental_ids) - cursor.rowcount} rentals of group {session_id} are not active")
+            if price > 0:
+                cursor.execute(f"UPDATE users SET funds = funds - %s WHERE id IN ({users_in})", (price, *user_ids))
+            # start_time is set explicitly, since the MySQL column is ON UPDATE current_timestamp().
+            cursor.execute("UPDATE multisession SET isActive = 0, start_time = start_time, end_time = UTC_TIMESTAMP() WHERE id = %s", (session_id,))
+            return True
+
+        completed = self._transaction(complete, "Error completing group")
+        if completed:
+            for rental_id in rental_ids:
+                self._rentals.remove(rental_id)
+        for user_id in user_ids:
+            self._user_cache.invalidate(str(user_id))
+        return completed
+
+
+
+    def _transaction(self: object, func, error: str) -> bool:
+        """
+        Internal function running a callable with a cursor in a single transaction.
+        The transaction is rolled back if the callable raises or returns a false value.
+        Args:
+            func (callable): Function receiving the cursor and returning True to commit.
+            error (str): Prefix of the logged error message.
+        Returns:
+            bool: True if the transaction was committed, False otherwise.
+        """
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    conn.start_transaction(isolation_level="READ COMMITTED")
+                    if not func(cursor):
+                        conn.rollback()
+                        return False
+                    conn.commit()
+                    return True
+                except mysql.connector.Error:
+                    conn.rollback()
+                    raise
+                finally:
+                    cursor.close()
+        except mysql.connector.Error as e:
+            DB_METRICS.add_error()
+            self._logger.error(f"{error}: {e}")
+            return False
+
+
+
+    def update_scooter_status(self: object, scooter_id: int, status: int, flush: bool=False) -> bool:
+        """
+        Update the status of a scooter in the database.
+        The update is buffered and written by the scooter flusher, together with other
+        updates, unless `flush` is set or the flusher is not running.
+        Args:
+            scooter_id (int): The ID of the scooter to update.
+            status (int): The new status of the scooter.
+            flush (bool): Write the update, and all other buffered scooter updates, before returning.
+        Returns:
+            bool: True if the scooter status was successfully updated or buffered, False otherwise.
+        """
+        self._logger.debug(f"update_scooter_status: params: {status}, {scooter_id}")
+        pending = self._buffer_scooter_update(scooter_id, {"status": status})
+        return self._schedule_scooter_flush(pending, flush)
+
+
+
+    def _update_scooter_info(self: object, scooter_id: int, lat: float, lon: float, status: int, flush: bool=False) -> bool:
+        """
+        Internal function to update the scooter information in the database.
+        The update is buffered like in update_scooter_status().
+        Args:
+            scooter_id (str): The ID of the scooter to update.
+            location (dict): The new location of the scooter.
+            status (int): The status of the scooter.
+            flush (bool): Write the update, and all other buffered scooter updates, before returning.
+        Returns:
+            bool: True if the scooter information was successfully updated or buffered, False otherwise.
+        """
+        self._logger.debug(f"_update_scooter_info: params: {lat}, {lon}, {status}, {scooter_id}")
+        pending = self._buffer_scooter_update(scooter_id, {"latitude": lat, "longitude": lon, "status": status})
+        return self._schedule_scooter_flush(pending, flush)
+
+
+
+    def _buffer_scooter_update(self: object, scooter_id: int, fields: dict) -> int:
+        """
+        Internal function buffering a scooter update and applying it to the scooter index,
+        so location queries see it before it is written.
+        Args:
+            scooter_id (int): The ID of the scooter.
+            fields (dict): The updated fields: "latitude", "longitude" and/or "status".
+        Returns:
+            int: The number of scooters with buffered updates.
+        """
+        scooter_id = int(scooter_id)
+        pending = self._scooter_writes.put(scooter_id, fields)
+        if "latitude" in fields:
+            indexed = self._scooter_index.get(scooter_id)
+            status = fields.get("status", indexed[2] if indexed is not None else None)
+            if status is not None:
+                self._scooter_index.upsert(scooter_id, fields["latitude"], fields["longitude"], status)
+        elif "status" in fields:
+            self._scooter_index.set_status(scooter_id, fields["status"])
+        return pending
+
+
+
+    def _schedule_scooter_flush(self: object, pending: int, flush: bool) -> bool:
+        """
+        Internal function flushing the buffered scooter updates now if requested or if the
+        flusher is not running, and waking the flusher once SCOOTER_FLUSH_SIZE scooters are pending.
+        Args:
+            pending (int): The number of scooters with buffered updates.
+            flush (bool): Flush synchronously.
+        Returns:
+            bool: False if a synchronous flush failed, True otherwise.
+        """
+        if flush or self._scooter_flusher is None:
+            return self.flush_scooter_updates()
+        if pending >= SCOOTER_FLUSH_SIZE:
+            self._scooter_flusher.trigger()
+        return True
+
+
+
+    def flush_scooter_updates(self: object) -> bool:
+        """
+        Write all buffered scooter updates with a single commit.
+        Waits for a flush in progress on the scooter flusher's thread to finish first.
+        Returns:
+            bool: True if the updates were written, False otherwise. Failed updates stay
+            buffered and are retried by the next flush.
+        Example:
+            ```python
+            db.update_scooter_status(1, 10)
+            db.update_scooter_status(1, 0)
+            db.flush_scooter_updates() -> True  # writes one row
+            ```
+        """
         try:
-            self._cursor.execute(query)
-            self._conn.commit()
+            self._scooter_writes.flush()
             return True
         except mysql.connector.Error as e:
-            self._logger.error(f"Error deleting inactive rentals: {e}")
+            self._logger.error(f"Error writing scooter updates: {e}")
             return False
-        
+
+
+
+    def _write_scooter_batch(self: object, batch: dict) -> None:
+        """
+        Internal function writing a batch of buffered scooter updates, see write_buffer.
+        Each chunk of DB_BATCH_SIZE scooters is written with one UPDATE statement; columns
+        without an update for a scooter keep their value.
+        Args:
+            batch (dict): The updated fields per scooter ID.
+
+        ## Errors
+            Raises mysql.connector.Error if the batch could not be written.
+        """
+        columns = (("latitude", "latitude"), ("longtitude", "longitude"), ("status", "status"))
+
+        def update(cursor):
+            for chunk in self._chunks(batch.items()):
+                assignments, params = [], []
+                for column, field in columns:
+                    values = [(scooter_id, fields[field]) for scooter_id, fields in chunk if field in fields]
+                    if values:
+                        cases = " ".join(["WHEN %s THEN %s"] * len(values))
+                        assignments.append(f"{column} = CASE uuid {cases} ELSE {column} END")
+                        params.extend(value for row in values for value in row)
+                ids = ", ".join(["%s"] * len(chunk))
+                params.extend(scooter_id for scooter_id, _ in chunk)
+                cursor.execute(f"UPDATE scooters SET {', '.join(assignments)} WHERE uuid IN ({ids})", tuple(params))
+
+        self._run(update, commit=True)
+        for scooter_id in batch:
+            self._scooter_cache.invalidate(str(scooter_id))
+        self._logger.debug(f"Scooter updates written: {len(batch)}")
+
+
+
+    def _overlay_scooter(self: object, scooter: tuple, buffered: dict=None) -> tuple:
+        """
+        Internal function applying the buffered updates of a scooter to a scooter row read from the database.
+        Args:
+            scooter (tuple): The scooter row, or None.
+            buffered (dict): The buffered fields per scooter ID, looked up in the buffer if None.
+        Returns:
+            tuple: The scooter row as it will be once the buffered updates are written.
+        """
+        if scooter is None:
+            return None
+        fields = self._scooter_writes.get(scooter[0]) if buffered is None else buffered.get(scooter[0])
+        if not fields:
+            return scooter
+        return (
+            scooter[0],
+            fields.get("latitude", scooter[1]),
+            fields.get("longitude", scooter[2]),
+            fields.get("status", scooter[3]),
+        )
+
+
+
+    def _overlay_scooters(self: object, scooters: list) -> list:
+        """
+        Internal function applying the buffered updates to a list of scooter rows.
+        """
+        buffered = self._scooter_writes.snapshot()
+        if not buffered:
+            return scooters
+        return [self._overlay_scooter(scooter, buffered) for scooter in scooters]
+
+
+
+    def start_scooter_flusher(self: object, interval: float=None) -> None:
+        """
+        Start the background job writing buffered scooter updates every SCOOTER_FLUSH_INTERVAL
+        seconds, or as soon as SCOOTER_FLUSH_SIZE scooters are pending. Until it is started,
+        scooter updates are written synchronously.
+        Args:
+            interval (float): Seconds between flushes, defaults to SCOOTER_FLUSH_INTERVAL.
+                Scooter updates stay synchronous if it is 0.
+        """
+        interval = SCOOTER_FLUSH_INTERVAL if interval is None else interval
+        if interval <= 0:
+            return
+        if self._scooter_flusher is None:
+            self._scooter_flusher = periodic_task("scooter-flusher", interval, self.flush_scooter_updates)
+        self._scooter_flusher.start()
+
+
+
+    def scooter_write_stats(self: object) -> dict:
+        """
+        Get the statistics of the scooter write-behind buffer.
+        Returns:
+            dict: Buffered scooters, updates received and coalesced, rows written, flushes,
+            and the flusher job statistics (None if it has not been started).
+        Example:
+            ```python
+            db.scooter_write_stats() -> {"pending": 12, "updates": 5120, "coalesced": 4870, "written": 250, "flusher": {...}, ...}
+            ```
+        """
+        stats = self._scooter_writes.stats()
+        stats["flusher"] = None if self._scooter_flusher is None else self._scooter_flusher.stats()
+        return stats
+
+
+
+    def get_all_scooters(self: object) -> list[tuple[int, float, float, int]]:
+        """
+        Get all scooters from the database.
+        Returns:
+            list: A list of dictionaries containing scooter information.
+        """
+        query = f"SELECT {SCOOTER_COLUMNS} FROM scooters"
+        return self._overlay_scooters(self._fetchall(query))
+    
+
+
+    def get_all_users(self: object) -> list[tuple[int, str, float]]:
+        """
+        Get all users from the database.
+        Returns:
+            list: A list of dictionaries containing user information.
+        """
+        query = f"SELECT {USER_COLUMNS} FROM users"
+        return self._fetchall(query)
+    
+
+
+    def get_all_rentals(self: object) -> list[tuple[int, int, str, bool, str, str, float]]:
+        """
+        Get all rentals from the database.
+        Returns:
+            list: A list of dictionaries containing rental information.
+        """
+        query = f"SELECT {RENTAL_COLUMNS} FROM rentals"
+        return self._fetchall(query)
+    
+
+
+    def get_active_rentals(self: object) -> list[tuple[int, int, str, bool, str, str, float]]:
+        """
+        Get all active rentals from the database.
+        Returns:
+            list: A list of dictionaries containing active rental information.
+        """
+        query = f"SELECT {RENTAL_COLUMNS} FROM rentals WHERE is_active = 1"
+        return self._fetchall(query)
+
+
+
+    def _stream(self: object, query: str, params: tuple=(), fetch_size: int=None):
+        """
+        Internal generator running a query on an unbuffered cursor and yielding its rows.
+        Rows are fetched from the server DB_FETCH_SIZE at a time, so memory use does not
+        grow with the size of the result. The connection stays checked out until the
+        generator is exhausted or closed; a connection abandoned with unread rows is
+        discarded rather than returned to the pool, since it cannot run another query.
+        Args:
+            query (str): The SQL query.
+            params (tuple): The query parameters.
+            fetch_size (int): Rows per fetch, defaults to DB_FETCH_SIZE.
+        Yields:
+            tuple: One row at a time.
+        """
+        fetch_size = fetch_size or DB_FETCH_SIZE
+        self.ensure_connection()
+        conn = self._pool.acquire()
+        exhausted = False
+        try:
+            if self._pool.idle_seconds(conn) >= DB_PING_INTERVAL:
+                conn.ping(reconnect=True)
+                self._count("pings")
+            else:
+                self._count("pings_skipped")
+            cursor = conn.cursor(buffered=False)
+            try:
+                cursor.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(fetch_size)
+                    if not rows:
+                        break
+                    yield from rows
+                exhausted = True
+            finally:
+                if exhausted:
+                    cursor.close()
+        finally:
+            self._pool.release(conn, discard=not exhausted)
+
+
+
+    def stream_scooters(self: object, fetch_size: int=None):
+        """
+        Stream all scooters from the database, ordered by UUID.
+        Streaming variant of get_all_scooters() with constant memory use.
+        Args:
+            fetch_size (int): Rows fetched from the server at a time, defaults to DB_FETCH_SIZE.
+        Yields:
+            tuple: One scooter at a time.
+        Example:
+            ```python
+            for uuid, lat, lon, status in db.stream_scooters():
+                ...
+            ```
+        """
+        query = f"SELECT {SCOOTER_COLUMNS} FROM scooters ORDER BY uuid"
+        buffered = self._scooter_writes.snapshot()
+        rows = self._stream(query, fetch_size=fetch_size)
+        return (self._overlay_scooter(row, buffered) for row in rows) if buffered else rows
+
+
+
+    def stream_users(self: object, fetch_size: int=None):
+        """
+        Stream all users from the database, ordered by ID.
+        Streaming variant of get_all_users() with constant memory use.
+        Args:
+            fetch_size (int): Rows fetched from the server at a time, defaults to DB_FETCH_SIZE.
+        Yields:
+            tuple: One user at a time.
+        """
+        query = f"SELECT {USER_COLUMNS} FROM users ORDER BY id"
+        return self._stream(query, fetch_size=fetch_size)
+
+
+
+    def stream_rentals(self: object, fetch_size: int=None):
+        """
+        Stream all rentals from the database, ordered by ID.
+        Streaming variant of get_all_rentals() with constant memory use.
+        Args:
+            fetch_size (int): Rows fetched from the server at a time, defaults to DB_FETCH_SIZE.
+        Yields:
+            tuple: One rental at a time.
+        """
+        query = f"SELECT {RENTAL_COLUMNS} FROM rentals ORDER BY id"
+        return self._stream(query, fetch_size=fetch_size)
+
+
+
+    def _page_limit(self: object, limit: int) -> int:
+        """
+        Internal function clamping a page size to 1..DB_PAGE_MAX.
+        """
+        return max(1, min(int(limit or DB_PAGE_SIZE), DB_PAGE_MAX))
+
+
+
+    def get_scooters_page(self: object, after_id: int=0, limit: int=DB_PAGE_SIZE) -> list[tuple[int, float, float, int]]:
+        """
+        Get a page of scooters ordered by UUID, using keyset pagination.
+        The page starts after the given UUID, so every page is an index range scan on the
+        primary key, no matter how deep into the table it is.
+        Args:
+            after_id (int): UUID of the last scooter on the previous page, 0 for the first page.
+            limit (int): Maximum number of scooters on the page (at most DB_PAGE_MAX).
+        Returns:
+            list: A list of tuples containing scooter information.
+        Example:
+            ```python
+            db.get_scooters_page(limit=2) -> [(1, 63.4197, 10.4018, 0), (2, 63.4153, 10.3995, 0)]
+            db.get_scooters_page(after_id=2, limit=2) -> [(3, 63.4290, 10.3920, 10)]
+            ```
+        """
+        query = f"SELECT {SCOOTER_COLUMNS} FROM scooters WHERE uuid > %s ORDER BY uuid LIMIT %s"
+        return self._overlay_scooters(self._fetchall(query, (after_id, self._page_limit(limit))))
+
+
+
+    def get_users_page(self: object, after_id: int=0, limit: int=DB_PAGE_SIZE) -> list[tuple[int, str, float]]:
+        """
+        Get a page of users ordered by ID, using keyset pagination.
+        Args:
+            after_id (int): ID of the last user on the previous page, 0 for the first page.
+            limit (int): Maximum number of users on the page (at most DB_PAGE_MAX).
+        Returns:
+            list: A list of tuples containing user information.
+        Example:
+            ```python
+            db.get_users_page(after_id=1, limit=1) -> [(2, "Kari Nordmann", 600.0)]
+            ```
+        """
+        query = f"SELECT {USER_COLUMNS} FROM users WHERE id > %s ORDER BY id LIMIT %s"
+        return self._fetchall(query, (after_id, self._page_limit(limit)))
+
+
+
+    def get_rentals_page(self: object, after_id: int=0, limit: int=DB_PAGE_SIZE, active: bool=None) -> list[tuple[int, int, str, bool, str, str, float]]:
+        """
+        Get a page of rentals ordered by ID, using keyset pagination.
+        Args:
+            after_id (int): ID of the last rental on the previous page, 0 for the first page.
+            limit (int): Maximum number of rentals on the page (at most DB_PAGE_MAX).
+            active (bool): Only return active (True) or completed (False) rentals. All rentals if None.
+        Returns:
+            list: A list of tuples containing rental information.
+        Example:
+            ```python
+            db.get_rentals_page(after_id=226, limit=1, active=True) -> [(228, 1, 2, 1, "2023-10-01 12:00:00", None, 0.0)]
+            ```
+        """
+        if active is None:
+            query = f"SELECT {RENTAL_COLUMNS} FROM rentals WHERE id > %s ORDER BY id LIMIT %s"
+            params = (after_id, self._page_limit(limit))
+        else:
+            query = f"SELECT {RENTAL_COLUMNS} FROM rentals WHERE id > %s AND is_active = %s ORDER BY id LIMIT %s"
+            params = (after_id, 1 if active else 0, self._page_limit(limit))
+        return self._fetchall(query, params)
+
+
+
+    def ensure_rental_archive(self: object) -> bool:
+        """
+        Create the rentals_archive table if it does not exist, and make sure it has a
+        partition for the current month and the next RENTAL_ARCHIVE_MONTHS_AHEAD months.
+        New partitions are split off the p_future partition, which is normally empty.
+        With the SQLite backends the unpartitioned table is part of the schema.
+        Returns:
+            bool: True if the archive is ready, False otherwise.
+        """
+        if DB_BACKEND != "mysql":
+            self._archive_ready = True
+            return True
+
+        today = date.today()
+        months = [self._add_months(date(today.year, today.month, 1), i) for i in range(RENTAL_ARCHIVE_MONTHS_AHEAD + 1)]
+        partitions_query = (
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'rentals_archive'"
+        )
+
+        def ensure(cursor):
+            cursor.execute(RENTAL_ARCHIVE_DDL.format(first_month=months[0].isoformat()))
+            cursor.execute(partitions_query)
+            names = [self._decode_row(row)[0] for row in cursor.fetchall()]
+            existing = sorted(name for name in names if isinstance(name, str) and name.startswith("p2"))
+            # Partitions must be added in ascending order behind the newest one.
+            newest = existing[-1] if existing else ""
+            for month in months:
+                name = f"p{month:%Y%m}"
+                if name <= newest:
+                    continue
+                cursor.execute(
+                    f"ALTER TABLE rentals_archive REORGANIZE PARTITION p_future INTO ("
+                    f"PARTITION {name} VALUES LESS THAN (TO_DAYS('{self._add_months(month, 1).isoformat()}')), "
+                    f"PARTITION p_future VALUES LESS THAN MAXVALUE)"
+                )
+                self._logger.debug(f"Added rentals_archive partition {name}")
+
+        try:
+            self._run(ensure, retry=True)
+            self._archive_ready = True
+            return True
+        except mysql.connector.Error as e:
+            self._logger.error(f"Error preparing rental archive: {e}")
+            return False
+
+
+
+    def _add_months(self: object, month: date, count: int) -> date:
+        """
+        Internal function returning the first day of the month `count` months after `month`.
+        """
+        index = month.year * 12 + month.month - 1 + count
+        return date(index // 12, index % 12 + 1, 1)
+
+
+
+    def archive_inactive_rentals(self: object, batch_size: int=None, max_batches: int=None) -> int:
+        """
+        Move completed rentals from the rentals table to rentals_archive.
+        Rentals are moved in batches of `batch_size` rows, each batch in its own short
+        transaction, so the rentals table is never locked for long. Rentals completed less
+        than RENTAL_ARCHIVE_MIN_AGE seconds ago are left in place, so a rider can still
+        look up the ride they just finished without touching the archive.
+        Args:
+            batch_size (int): Rows per batch, defaults to RENTAL_ARCHIVE_BATCH_SIZE.
+            max_batches (int): Maximum number of batches per call, defaults to RENTAL_ARCHIVE_MAX_BATCHES.
+        Returns:
+            int: The number of rentals archived.
+        Example:
+            ```python
+            db.archive_inactive_rentals() -> 1312
+            db.archive_inactive_rentals() -> 0
+            ```
+        """
+        batch_size = batch_size or RENTAL_ARCHIVE_BATCH_SIZE
+        max_batches = max_batches or RENTAL_ARCHIVE_MAX_BATCHES
+        if not self.ensure_rental_archive():
+            return 0
+
+        archived = 0
+        for _ in range(max_batches):
+            try:
+                moved = self._archive_batch(batch_size)
+            except mysql.connector.Error as e:
+                DB_METRICS.add_error()
+                self._logger.error(f"Error archiving rentals: {e}")
+                break
+            archived += moved
+            if moved < batch_size:
+                break
+
+        if archived:
+            self._logger.info(f"Archived {archived} completed rentals")
+        return archived
+
+
+
+    def _archive_batch(self: object, batch_size: int) -> int:
+        """
+        Internal function moving one batch of completed rentals to the archive in a single transaction.
+        Args:
+            batch_size (int): Maximum number of rentals to move.
+        Returns:
+            int: The number of rentals moved.
+        """
+        select_query = (
+            "SELECT id FROM rentals WHERE is_active = 0 "
+            "AND (end_time IS NULL OR end_time < NOW() - INTERVAL %s SECOND) "
+            "ORDER BY id LIMIT %s FOR UPDATE"
+        )
+        copy_query = (
+            "INSERT IGNORE INTO rentals_archive (id, user_id, scooter_id, start_time, end_time, total_price, archived_at) "
+            "SELECT id, user_id, scooter_id, start_time, COALESCE(end_time, start_time, NOW()), total_price, NOW() "
+            "FROM rentals WHERE id IN ({})"
+        )
+        delete_query = "DELETE FROM rentals WHERE id IN ({}) AND is_active = 0"
+
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            try:
+                conn.start_transaction()
+                cursor.execute(select_query, (RENTAL_ARCHIVE_MIN_AGE, batch_size))
+                ids = tuple(row[0] for row in cursor.fetchall())
+                if not ids:
+                    conn.rollback()
+                    return 0
+                placeholders = ", ".join(["%s"] * len(ids))
+                cursor.execute(copy_query.format(placeholders), ids)
+                cursor.execute(delete_query.format(placeholders), ids)
+                conn.commit()
+                DB_METRICS.add_rows(len(ids))
+                return len(ids)
+            except mysql.connector.Error:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+
+
+    def start_rental_archiver(self: object, interval: float=None) -> None:
+        """
+        Start the background job archiving completed rentals every RENTAL_ARCHIVE_INTERVAL seconds.
+        The first run starts immediately on the job's own thread, so startup is not delayed.
+        Args:
+            interval (float): Seconds between runs, defaults to RENTAL_ARCHIVE_INTERVAL.
+        """
+        if self._archiver is None:
+            self._archiver = periodic_task("rental-archiver", interval or RENTAL_ARCHIVE_INTERVAL, self.archive_inactive_rentals)
+        self._archiver.start()
+
+
+
+    def archiver_stats(self: object) -> dict:
+        """
+        Get the statistics of the rental archiver job.
+        Returns:
+            dict: Number of runs and failures, and the duration and number of rentals archived by the last run.
+            None if the archiver has not been started.
+        Example:
+            ```python
+            db.archiver_stats() -> {"name": "rental-archiver", "runs": 3, "failures": 0, "last_result": 412, ...}
+            ```
+        """
+        return None if self._archiver is None else self._archiver.stats()
+
+
+
+    def get_archived_rentals_by_user(self: object, user_id: int, limit: int=50) -> list[tuple[int, int, int, str, str, float]]:
+        """
+        Get the most recent archived rentals of a user, newest first.
+        Args:
+            user_id (int): The ID of the user.
+            limit (int): Maximum number of rentals to return.
+        Returns:
+            list: Tuples of (id, user_id, scooter_id, start_time, end_time, total_price).
+        Example:
+            ```python
+            db.get_archived_rentals_by_user(1, limit=1) -> [(212, 1, 3, "2023-10-01 12:00:00", "2023-10-01 12:30:00", 15.0)]
+            ```
+        """
+        if not self._archive_ready and not self.ensure_rental_archive():
+            return []
+        query = (
+            "SELECT id, user_id, scooter_id, start_time, end_time, total_price FROM rentals_archive "
+            "WHERE user_id = %s ORDER BY end_time DESC LIMIT %s"
+        )
+        return self._fetchall(query, (user_id, limit))
+
+
+
+    def get_completed_rentals(self: object, start: datetime, end: datetime) -> list[tuple[int, int, int, str, str, float, int]]:
+        """
+        Get the rentals completed in a time window, from both the rentals table and the archive,
+        with the number of riders of the group ride each rental belonged to.
+        A rental belongs to a group ride if its user rode its scooter in a multisession which
+        was open when the rental started.
+        Args:
+            start (datetime): Start of the window, inclusive.
+            end (datetime): End of the window, exclusive.
+        Returns:
+            list: Tuples of (id, user_id, scooter_id, start_time, end_time, total_price, riders),
+            where riders is 1 for a single ride.
+        Example:
+            ```python
+            db.get_completed_rentals(datetime(2025, 4, 2), datetime(2025, 4, 3)) -> [(228, 1, 2, datetime(...), datetime(...), 120.0, 2), ...]
+            ```
+        """
+        archived = ""
+        params = (start, end)
+        if self._archive_ready or self.ensure_rental_archive():
+            archived = (
+                "UNION ALL SELECT id, user_id, scooter_id, start_time, end_time, total_price FROM rentals_archive "
+                "WHERE end_time >= %s AND end_time < %s"
+            )
+            params = (start, end, start, end)
+        query = (
+            "SELECT r.id, r.user_id, r.scooter_id, r.start_time, r.end_time, r.total_price, "
+            "COALESCE((SELECT COUNT(*) FROM corider riders WHERE riders.session_id = ("
+            "SELECT MAX(corider.session_id) FROM corider JOIN multisession ON multisession.id = corider.session_id "
+            "WHERE corider.user_id = r.user_id AND corider.scooter_id = r.scooter_id "
+            "AND multisession.start_time <= r.start_time "
+            "AND (multisession.end_time IS NULL OR multisession.end_time >= r.start_time))), 0) "
+            "FROM (SELECT id, user_id, scooter_id, start_time, end_time, total_price FROM rentals "
+            f"WHERE is_active = 0 AND end_time >= %s AND end_time < %s {archived}) r "
+            "ORDER BY r.id"
+        )
+        return [row[:6] + (max(int(row[6]), 1),) for row in self._fetchall(query, params)]
+
 
 
     def get_scooter_near_location(self: object, location: dict) -> list[tuple[str, float, float, int]]:
         """
-        Get all scooters near a given location.
+        Get all scooters near a given location, nearest first.
+        Answered from the in-memory scooter index.
         Args:
-            location (dict): A dictionary containing the latitude+-0.1 and longitude+-0.1 of the location.
+            location (dict): A dictionary containing the latitude and longitude of the location,
+                optionally the search radius in meters (default GEO_SEARCH_RADIUS) and a status to filter on.
         Returns:
             tuple: A list containing tuples containing scooter information.
         Example:
             ```python
             db.get_scooter_near_location({"latitude": 63.41947, "longitude": 10.40174}) -> 
             [(1, 63.40947, 10.41174, 0), (2, 63.42947, 10.39174, 0)]
+
+            db.get_scooter_near_location({"latitude": 63.41947, "longitude": 10.40174, "radius": 200, "status": 0}) ->
+            [(1, 63.40947, 10.41174, 0)]
             ```
         """
-        self.ensure_connection()
-        query = "SELECT * FROM scooters WHERE latitude BETWEEN %s AND %s AND longtiude BETWEEN %s AND %s"
-        latitude = location["latitude"]
-        longitude = location["longitude"]
-        self._cursor.execute(query, (latitude - 0.01, latitude + 0.01, longitude - 0.01, longitude + 0.01))
-        return self._cursor.fetchall()
+        found = self._scooter_index.within_radius(
+            location["latitude"],
+            location["longitude"],
+            location.get("radius", GEO_SEARCH_RADIUS),
+            status=location.get("status"),
+        )
+        return [(uuid, lat, lon, status) for uuid, lat, lon, status, _ in found]
+
+
+
+    def get_nearest_scooters(self: object, latitude: float, longitude: float, k: int=1, status: int=None, max_radius: float=None) -> list[tuple[int, float, float, int]]:
+        """
+        Get the k scooters nearest to a location, nearest first.
+        Answered from the in-memory scooter index.
+        Args:
+            latitude (float): Latitude of the location.
+            longitude (float): Longitude of the location.
+            k (int): Number of scooters to return.
+            status (int): Only return scooters with this status. All scooters if None.
+            max_radius (float): Ignore scooters farther away than this many meters.
+        Returns:
+            list: Up to k tuples containing scooter information.
+        Example:
+            ```python
+            db.get_nearest_scooters(63.41947, 10.40174, k=2, status=0) -> [(1, 63.4197, 10.4018, 0), (2, 63.4153, 10.3995, 0)]
+            ```
+        """
+        found = self._scooter_index.nearest(latitude, longitude, k=k, status=status, max_radius=max_radius)
+        return [(uuid, lat, lon, status) for uuid, lat, lon, status, _ in found]
+
+
+
+    def reindex_scooters(self: object) -> int:
+        """
+        Rebuild the in-memory scooter index from the scooters table.
+        The new index replaces the old one once it is complete, so queries are never
+        answered from a partially loaded index.
+        Returns:
+            int: The number of indexed scooters.
+        """
+        index = grid_index(cell_size=GEO_CELL_SIZE)
+        for uuid, lat, lon, status in self.stream_scooters():
+            index.upsert(uuid, lat, lon, status)
+        self._scooter_index = index
+        self._logger.debug(f"Indexed {len(index)} scooters")
+        return len(index)
+
+
+
+    def reindex_rentals(self: object) -> int:
+        """
+        Load the in-memory active-rental index from the rentals table.
+        Until it has been loaded, and if RENTAL_INDEX=False, the active-rental lookups query the table.
+        Returns:
+            int: The number of indexed rentals, or 0 if the index is disabled or could not be loaded.
+        """
+        if not RENTAL_INDEX:
+            return 0
+        try:
+            count = self._rentals.load(self.get_active_rentals())
+        except mysql.connector.Error as e:
+            self._logger.error(f"Error indexing active rentals: {e}")
+            return 0
+        self._rentals_ready = True
+        self._logger.debug(f"Indexed {count} active rentals")
+        return count
+
+
+
+    def reconcile_rentals(self: object) -> int:
+        """
+        Compare the active-rental index with the rentals table and correct any difference.
+        Rentals started or ended while the table is read are left as they are, and checked on the next run.
+        Loads the index instead if it has not been loaded yet.
+        Returns:
+            int: The number of rentals corrected.
+        Example:
+            ```python
+            db.reconcile_rentals() -> 0
+            ```
+        """
+        if not RENTAL_INDEX:
+            return 0
+        if not self._rentals_ready:
+            self.reindex_rentals()
+            return 0
+        version = self._rentals.version()
+        corrected = self._rentals.reconcile(self.get_active_rentals(), since=version)
+        if corrected:
+            self._logger.warning(f"Active-rental index was out of sync with the rentals table: corrected {corrected} rentals")
+        return corrected
+
+
+
+    def start_rental_reconciler(self: object, interval: float=None) -> None:
+        """
+        Start the background job reconciling the active-rental index every RENTAL_RECONCILE_INTERVAL seconds.
+        Args:
+            interval (float): Seconds between runs, defaults to RENTAL_RECONCILE_INTERVAL.
+                The job is not started if it is 0 or the index is disabled.
+        """
+        interval = RENTAL_RECONCILE_INTERVAL if interval is None else interval
+        if interval <= 0 or not RENTAL_INDEX:
+            return
+        if self._rental_reconciler is None:
+            self._rental_reconciler = periodic_task("rental-reconciler", interval, self.reconcile_rentals, initial_delay=interval)
+        self._rental_reconciler.start()
+
+
+
+    def rental_index_stats(self: object) -> dict:
+        """
+        Get the statistics of the active-rental index.
+        Returns:
+            dict: Whether lookups are answered from the index, indexed rentals, rentals added and
+            removed, reconciliations and rentals corrected, and the reconciler job statistics
+            (None if it has not been started).
+        Example:
+            ```python
+            db.rental_index_stats() -> {"enabled": True, "active": 42, "added": 1200, "removed": 1170, "corrected": 0, "reconciler": {...}, ...}
+            ```
+        """
+        stats = self._rentals.stats()
+        stats["enabled"] = self._rentals_ready
+        stats["reconciler"] = None if self._rental_reconciler is None else self._rental_reconciler.stats()
+        return stats
     
 
 
@@ -453,14 +2027,12 @@ class db:
             db.add_user("John Doe", 350.0) -> True
             ```
         """
-        self.ensure_connection()
         if funds < 0:
             self._logger.error("Funds cannot be negative")
             return False
         query = "INSERT INTO users (name, funds) VALUES (%s, %s)"
         try:
-            self._cursor.execute(query, (name, funds))
-            self._conn.commit()
+            self._execute(query, (name, funds))
             return True
         except mysql.connector.Error as e:
             self._logger.error(f"Error adding user: {e}")
@@ -482,16 +2054,174 @@ class db:
             db.add_scooter(63.41947, 10.40174, 0) -> True
             ```
         """
-        self.ensure_connection()
         query = "INSERT INTO scooters (latitude, longtitude, status) VALUES (%s, %s, %s)"
+
+        def insert(cursor):
+            cursor.execute(query, (latitude, longitude, status))
+            return cursor.lastrowid
+
         try:
-            self._cursor.execute(query, (latitude, longitude, status))
-            self._conn.commit()
+            uuid = self._run(insert, commit=True)
+            self._scooter_index.upsert(uuid, latitude, longitude, status)
             return True
         except mysql.connector.Error as e:
             self._logger.error(f"Error adding scooter: {e}")
             return False
-        
+
+
+
+    def _chunks(self: object, items: list) -> list[list]:
+        """
+        Internal function splitting a batch into chunks of at most DB_BATCH_SIZE items,
+        keeping IN lists and multi-row statements within a reasonable packet size.
+        Args:
+            items (list): The batch.
+        Returns:
+            list: The chunks.
+        """
+        items = list(items)
+        return [items[i:i + DB_BATCH_SIZE] for i in range(0, len(items), DB_BATCH_SIZE)]
+
+
+
+    def _fetch_in(self: object, query: str, ids: list) -> list[tuple]:
+        """
+        Internal function running a query with an IN list over a batch of IDs.
+        All chunks are read on a single pooled connection.
+        Args:
+            query (str): The SQL query containing a single {} placeholder for the IN list.
+            ids (list): The IDs to look up.
+        Returns:
+            list: The rows found, in no particular order.
+        """
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return []
+
+        def fetch(cursor):
+            rows = []
+            for chunk in self._chunks(ids):
+                cursor.execute(query.format(", ".join(["%s"] * len(chunk))), tuple(chunk))
+                rows.extend(cursor.fetchall())
+            return rows
+        rows = self._run(fetch, retry=True)
+        DB_METRICS.add_rows(len(rows))
+        return rows
+
+
+
+    def get_scooters(self: object, scooter_ids: list[int]) -> list[tuple[int, float, float, int]]:
+        """
+        Get several scooters from the database in one round trip per DB_BATCH_SIZE IDs.
+        Unknown IDs are left out of the result.
+        Args:
+            scooter_ids (list): The IDs of the scooters to retrieve.
+        Returns:
+            list: A list of tuples containing scooter information.
+        Example:
+            ```python
+            db.get_scooters([1, 2, 99]) -> [(1, 63.4197, 10.4018, 0), (2, 63.4153, 10.3995, 0)]
+            ```
+        """
+        query = f"SELECT {SCOOTER_COLUMNS} FROM scooters WHERE uuid IN ({{}})"
+        return self._overlay_scooters(self._fetch_in(query, scooter_ids))
+
+
+
+    def get_users(self: object, user_ids: list[int]) -> list[tuple[int, str, float]]:
+        """
+        Get several users from the database in one round trip per DB_BATCH_SIZE IDs.
+        Unknown IDs are left out of the result.
+        Args:
+            user_ids (list): The IDs of the users to retrieve.
+        Returns:
+            list: A list of tuples containing user information.
+        Example:
+            ```python
+            db.get_users([1, 2]) -> [(1, "John Appleseed", 450.0), (2, "Kari Nordmann", 600.0)]
+            ```
+        """
+        query = f"SELECT {USER_COLUMNS} FROM users WHERE id IN ({{}})"
+        return self._fetch_in(query, user_ids)
+
+
+
+    def update_scooter_statuses(self: object, updates: list[tuple[int, int]]) -> bool:
+        """
+        Update the status of several scooters with a single commit.
+        The updates are merged into the scooter write buffer and flushed immediately, so
+        they are ordered correctly with buffered updates. Each chunk of DB_BATCH_SIZE
+        scooters is written with one UPDATE statement.
+        If a scooter occurs several times, its last status wins.
+        Args:
+            updates (list): Tuples of (scooter_id, status).
+        Returns:
+            bool: True if the statuses were successfully updated, False otherwise.
+        Example:
+            ```python
+            db.update_scooter_statuses([(1, 0), (2, 10), (3, 1)]) -> True
+            ```
+        """
+        if not updates:
+            return True
+        for scooter_id, status in updates:
+            self._buffer_scooter_update(scooter_id, {"status": status})
+        return self.flush_scooter_updates()
+
+
+
+    def update_scooter_locations(self: object, updates: list[tuple[int, float, float]]) -> bool:
+        """
+        Update the location of several scooters with a single commit.
+        The updates are merged into the scooter write buffer and flushed immediately, like
+        in update_scooter_statuses().
+        If a scooter occurs several times, its last location wins.
+        Args:
+            updates (list): Tuples of (scooter_id, latitude, longitude).
+        Returns:
+            bool: True if the locations were successfully updated, False otherwise.
+        Example:
+            ```python
+            db.update_scooter_locations([(1, 63.4197, 10.4018), (2, 63.4153, 10.3995)]) -> True
+            ```
+        """
+        if not updates:
+            return True
+        for scooter_id, lat, lon in updates:
+            self._buffer_scooter_update(scooter_id, {"latitude": lat, "longitude": lon})
+        return self.flush_scooter_updates()
+
+
+
+    def add_scooters(self: object, scooters: list[tuple[float, float, int]]) -> bool:
+        """
+        Add several scooters to the database with a single commit.
+        The rows are sent as multi-row INSERT statements through executemany().
+        Args:
+            scooters (list): Tuples of (latitude, longitude, status).
+        Returns:
+            bool: True if the scooters were successfully added, False otherwise.
+        Example:
+            ```python
+            db.add_scooters([(63.41947, 10.40174, 0), (63.4153, 10.3995, 0)]) -> True
+            ```
+        """
+        if not scooters:
+            return True
+        query = "INSERT INTO scooters (latitude, longtitude, status) VALUES (%s, %s, %s)"
+
+        def insert(cursor):
+            for chunk in self._chunks(scooters):
+                cursor.executemany(query, chunk)
+
+        try:
+            self._run(insert, commit=True)
+            self.reindex_scooters()
+            return True
+        except mysql.connector.Error as e:
+            self._logger.error(f"Error adding scooters: {e}")
+            return False
+
 
 
     def charge_user(self: object, user_id: int, amount: float) -> bool:
@@ -511,14 +2241,13 @@ class db:
             db.get_user(1) -> (1, "Kari Normann", 75.0)
             ```
         """
-        self.ensure_connection()
         if amount <= 0:
             self._logger.error("Charge amount cannot be negative")
             return False
         query = "UPDATE users SET funds = funds - %s WHERE id = %s"
         try:
-            self._cursor.execute(query, (amount, user_id))
-            self._conn.commit()
+            self._execute(query, (amount, user_id), prepared=True)
+            self._user_cache.invalidate(str(user_id))
             return True
         except mysql.connector.Error as e:
             self._logger.error(f"Error charging user: {e}")
@@ -543,14 +2272,13 @@ class db:
             db.get_user(1) -> (1, "Kari Normann", 175.0)
             ```
         """
-        self.ensure_connection()
         if amount <= 0:
             self._logger.error("Deposit amount cannot be negative")
             return False
         query = "UPDATE users SET funds = funds + %s WHERE id = %s"
         try:
-            self._cursor.execute(query, (amount, user_id))
-            self._conn.commit()
+            self._execute(query, (amount, user_id), prepared=True)
+            self._user_cache.invalidate(str(user_id))
             return True
         except mysql.connector.Error as e:
             self._logger.error(f"Error depositing to user: {e}")
@@ -560,6 +2288,7 @@ class db:
     def user_has_active_rental(self: object, user_id: int) -> bool:
         """
         Check if a user has an active rental.
+        Answered from the active-rental index, if it is loaded.
         Args:
             user_id (int): The ID of the user to check.
         Returns:
@@ -569,15 +2298,16 @@ class db:
             db.user_has_active_rental(1) -> True
             ```
         """
-        self.ensure_connection()
+        if self._rentals_ready:
+            return self._rentals.by_user(user_id) is not None
         query = "SELECT COUNT(*) FROM rentals WHERE user_id = %s AND is_active = 1"
-        self._cursor.execute(query, (user_id,))
-        return self._cursor.fetchone()[0] > 0
+        return self._fetchone(query, (user_id,), prepared=True)[0] > 0
     
 
     def scooter_has_active_rental(self: object, scooter_id: int) -> bool:
         """
         Check if a scooter has an active rental.
+        Answered from the active-rental index, if it is loaded.
         Args:
             scooter_id (int): The ID of the scooter to check.
         Returns:
@@ -587,7 +2317,228 @@ class db:
             db.scooter_has_active_rental(1) -> True
             ```
         """
-        self.ensure_connection()
+        if self._rentals_ready:
+            return self._rentals.by_scooter(scooter_id) is not None
         query = "SELECT COUNT(*) FROM rentals WHERE scooter_id = %s AND is_active = 1"
-        self._cursor.execute(query, (scooter_id,))
-        return self._cursor.fetchone()[0] > 0
+        return self._fetchone(query, (scooter_id,), prepared=True)[0] > 0
+
+
+
+
+@singleton
+class async_db:
+    """
+    Awaitable variant of the db API for use from the FastAPI event loop.
+    Every call runs the corresponding db method on a dedicated worker pool with as many
+    threads as the connection pool has connections, so concurrent requests overlap on
+    database I/O instead of blocking the event loop or queueing behind each other.
+    The db singleton must be initialized with credentials before this class is used.
+
+    #### Example:
+    ```python
+    from api.database import async_db
+
+    adb = async_db()
+    user = await adb.get_user(1) -> (1, "Kari Normann", 125.0)
+    ```
+    """
+
+    def __init__(self, db_client: object=None) -> None:
+        """
+        Initialize the async database class.
+        Args:
+            db_client (db): The synchronous database client, defaults to the db singleton.
+        """
+        self._db = db_client if db_client is not None else db()
+        self._executor = ThreadPoolExecutor(max_workers=DB_POOL_MAX_SIZE, thread_name_prefix="async-db")
+
+
+    async def run(self: object, func, *args, **kwargs):
+        """
+        Run a blocking callable on the database worker pool and await its result.
+        Args:
+            func (callable): The blocking function to run.
+            *args: Positional arguments for the function.
+            **kwargs: Keyword arguments for the function.
+        Returns:
+            The return value of the function.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+
+    def close(self: object) -> None:
+        """
+        Shut down the worker pool. Pending calls are allowed to finish.
+        """
+        self._executor.shutdown(wait=True)
+
+
+    async def get_user(self: object, user_id: int) -> tuple[int, str, float]:
+        """Awaitable db.get_user."""
+        return await self.run(self._db.get_user, user_id)
+
+
+    async def get_scooter(self: object, scooter_id: int) -> tuple[int, float, float, int]:
+        """Awaitable db.get_scooter."""
+        return await self.run(self._db.get_scooter, scooter_id)
+
+
+    async def get_rental_by_id(self: object, rental_id: int) -> tuple[int, int, str, bool, str, str, float]:
+        """Awaitable db.get_rental_by_id."""
+        return await self.run(self._db.get_rental_by_id, rental_id)
+
+
+    async def get_active_rental_by_user(self: object, user_id: int) -> tuple[int, int, str, bool, str, str, float]:
+        """Awaitable db.get_active_rental_by_user."""
+        return await self.run(self._db.get_active_rental_by_user, user_id)
+
+
+    async def get_active_rental_by_scooter(self: object, scooter_id: int) -> tuple[int, int, str, bool, str, str, float]:
+        """Awaitable db.get_active_rental_by_scooter."""
+        return await self.run(self._db.get_active_rental_by_scooter, scooter_id)
+
+
+    async def rental_started(self: object, user_id: int, scooter_id: int) -> bool:
+        """Awaitable db.rental_started."""
+        return await self.run(self._db.rental_started, user_id, scooter_id)
+
+
+    async def rental_completed(self: object, user_id: int, price: float, lat: float, lon: float, status: int) -> bool:
+        """Awaitable db.rental_completed."""
+        return await self.run(self._db.rental_completed, user_id, price, lat, lon, status)
+
+
+    async def update_scooter_status(self: object, scooter_id: int, status: int, flush: bool=False) -> bool:
+        """Awaitable db.update_scooter_status."""
+        return await self.run(self._db.update_scooter_status, scooter_id, status, flush)
+
+
+    async def flush_scooter_updates(self: object) -> bool:
+        """Awaitable db.flush_scooter_updates."""
+        return await self.run(self._db.flush_scooter_updates)
+
+
+    async def get_all_scooters(self: object) -> list[tuple[int, float, float, int]]:
+        """Awaitable db.get_all_scooters."""
+        return await self.run(self._db.get_all_scooters)
+
+
+    async def get_all_users(self: object) -> list[tuple[int, str, float]]:
+        """Awaitable db.get_all_users."""
+        return await self.run(self._db.get_all_users)
+
+
+    async def get_all_rentals(self: object) -> list[tuple[int, int, str, bool, str, str, float]]:
+        """Awaitable db.get_all_rentals."""
+        return await self.run(self._db.get_all_rentals)
+
+
+    async def get_active_rentals(self: object) -> list[tuple[int, int, str, bool, str, str, float]]:
+        """Awaitable db.get_active_rentals."""
+        return await self.run(self._db.get_active_rentals)
+
+
+    async def get_archived_rentals_by_user(self: object, user_id: int, limit: int=50) -> list[tuple[int, int, int, str, str, float]]:
+        """Awaitable db.get_archived_rentals_by_user."""
+        return await self.run(self._db.get_archived_rentals_by_user, user_id, limit)
+
+
+    async def get_scooters_page(self: object, after_id: int=0, limit: int=DB_PAGE_SIZE) -> list[tuple[int, float, float, int]]:
+        """Awaitable db.get_scooters_page."""
+        return await self.run(self._db.get_scooters_page, after_id, limit)
+
+
+    async def get_users_page(self: object, after_id: int=0, limit: int=DB_PAGE_SIZE) -> list[tuple[int, str, float]]:
+        """Awaitable db.get_users_page."""
+        return await self.run(self._db.get_users_page, after_id, limit)
+
+
+    async def get_rentals_page(self: object, after_id: int=0, limit: int=DB_PAGE_SIZE, active: bool=None) -> list[tuple[int, int, str, bool, str, str, float]]:
+        """Awaitable db.get_rentals_page."""
+        return await self.run(self._db.get_rentals_page, after_id, limit, active)
+
+
+    async def get_completed_rentals(self: object, start: datetime, end: datetime) -> list[tuple[int, int, int, str, str, float, int]]:
+        """Awaitable db.get_completed_rentals."""
+        return await self.run(self._db.get_completed_rentals, start, end)
+
+
+    async def get_scooter_near_location(self: object, location: dict) -> list[tuple[str, float, float, int]]:
+        """Awaitable db.get_scooter_near_location."""
+        return await self.run(self._db.get_scooter_near_location, location)
+
+
+    async def get_nearest_scooters(self: object, latitude: float, longitude: float, k: int=1, status: int=None, max_radius: float=None) -> list[tuple[int, float, float, int]]:
+        """Awaitable db.get_nearest_scooters."""
+        return await self.run(self._db.get_nearest_scooters, latitude, longitude, k, status, max_radius)
+
+
+    async def add_user(self: object, name: str, funds: float) -> bool:
+        """Awaitable db.add_user."""
+        return await self.run(self._db.add_user, name, funds)
+
+
+    async def add_scooter(self: object, latitude: float, longitude: float, status: int) -> bool:
+        """Awaitable db.add_scooter."""
+        return await self.run(self._db.add_scooter, latitude, longitude, status)
+
+
+    async def get_scooters(self: object, scooter_ids: list[int]) -> list[tuple[int, float, float, int]]:
+        """Awaitable db.get_scooters."""
+        return await self.run(self._db.get_scooters, scooter_ids)
+
+
+    async def get_users(self: object, user_ids: list[int]) -> list[tuple[int, str, float]]:
+        """Awaitable db.get_users."""
+        return await self.run(self._db.get_users, user_ids)
+
+
+    async def get_riders(self: object, user_ids: list[int]) -> list[tuple[int, str, float, int]]:
+        """Awaitable db.get_riders."""
+        return await self.run(self._db.get_riders, user_ids)
+
+
+    async def get_group_session(self: object, session_id: int) -> tuple[int, int, str, str, bool, float, float]:
+        """Awaitable db.get_group_session."""
+        return await self.run(self._db.get_group_session, session_id)
+
+
+    async def get_group_rides(self: object, session_id: int) -> list[tuple[int, int, int]]:
+        """Awaitable db.get_group_rides."""
+        return await self.run(self._db.get_group_rides, session_id)
+
+
+    async def update_scooter_statuses(self: object, updates: list[tuple[int, int]]) -> bool:
+        """Awaitable db.update_scooter_statuses."""
+        return await self.run(self._db.update_scooter_statuses, updates)
+
+
+    async def update_scooter_locations(self: object, updates: list[tuple[int, float, float]]) -> bool:
+        """Awaitable db.update_scooter_locations."""
+        return await self.run(self._db.update_scooter_locations, updates)
+
+
+    async def add_scooters(self: object, scooters: list[tuple[float, float, int]]) -> bool:
+        """Awaitable db.add_scooters."""
+        return await self.run(self._db.add_scooters, scooters)
+
+
+    async def charge_user(self: object, user_id: int, amount: float) -> bool:
+        """Awaitable db.charge_user."""
+        return await self.run(self._db.charge_user, user_id, amount)
+
+
+    async def user_deposit(self: object, user_id: int, amount: float) -> bool:
+        """Awaitable db.user_deposit."""
+        return await self.run(self._db.user_deposit, user_id, amount)
+
+
+    async def user_has_active_rental(self: object, user_id: int) -> bool:
+        """Awaitable db.user_has_active_rental."""
+        return await self.run(self._db.user_has_active_rental, user_id)
+
+
+    async def scooter_has_active_rental(self: object, scooter_id: int) -> bool:
+        """Awaitable db.scooter_has_active_rental."""
+        return await self.run(self._db.scooter_has_active_rental, scooter_id)
@@ -1,15 +1,21 @@
 import os
+import math
+import asyncio
 import logging
+from datetime import date
 from contextlib import asynccontextmanager
 
 from fastapi.staticfiles import StaticFiles
 from fastapi.encoders import jsonable_encoder
-from fastapi import FastAPI, Response, Request, Query, APIRouter
+from fastapi import FastAPI, Response, Request, Query, Header, APIRouter
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, JSONResponse
 
-from logic import weather
-from service import single_ride_service, multi_ride_service
+from api import database
+from logic import weather, transaction
+from service import single_ride_service, multi_ride_service, scooter_commands
+from tools.idempotency import idempotency_store, idempotency_conflict
+from tools.incident_log import INCIDENT_LOG
 
 
 DEPLOYMENT_MODE = os.getenv('DEPLOYMENT_MODE', 'TEST')
@@ -17,6 +23,15 @@ DISABLE_MQTT    = os.getenv("DISABLE_MQTT", "False").lower() == "true"
 
 TEST_COORDINATES = (63.41947, 10.40174)
 
+IDEMPOTENCY_KEY_TTL      = float(os.getenv("IDEMPOTENCY_KEY_TTL", 86400.0))
+IDEMPOTENCY_MAX_KEYS     = int(os.getenv("IDEMPOTENCY_MAX_KEYS", 10000))
+IDEMPOTENCY_KEY_MAX_SIZE = 255
+
+PRICING_ESTIMATE_MAX_RIDES = int(os.getenv("PRICING_ESTIMATE_MAX_RIDES", 100))
+
+# Outcomes of unlock and lock requests sent with an Idempotency-Key header.
+idempotency = idempotency_store(max_size=IDEMPOTENCY_MAX_KEYS, ttl=IDEMPOTENCY_KEY_TTL)
+
 logger = logging.getLogger(__name__)
 
 @asynccontextmanager
@@ -29,9 +44,10 @@ async def lifespan(app: FastAPI):
     
     yield
 
-    app.state.db_client.delete_inactive_rentals()
+    # Completed rentals are archived by the db client's background job.
     # app.state.db_client.close()
     app.state.mqtt_client.stop()
+    await weather.WEATHER_CLIENT.aclose()
 
     logger.error("Stopping DB client")
     logger.error("Stopping MQTT client")
@@ -121,6 +137,32 @@ index_file = os.path.join(frontend_path, "index.html")
 
 
 
+async def run_idempotent(key: str, fingerprint: tuple, func) -> tuple[object, dict, JSONResponse]:
+    """
+    Run a request once per Idempotency-Key header, see tools/idempotency.py.
+    Requests without a key always run.
+    Args:
+        key (str): The Idempotency-Key header, or None.
+        fingerprint (tuple): Identifies the request, e.g. ("single-unlock", uuid, user_id).
+        func (callable): Function without arguments returning an awaitable with the outcome.
+    Returns:
+        tuple:
+            * [0]: (object) The outcome, or None if the key was rejected.
+            * [1]: (dict) Headers to add to the response.
+            * [2]: (JSONResponse) The error response if the key was rejected, otherwise None.
+    """
+    if key is None:
+        return await func(), {}, None
+    if not key or len(key) > IDEMPOTENCY_KEY_MAX_SIZE:
+        return None, {}, JSONResponse(content={"message": f"Idempotency-Key must be 1 to {IDEMPOTENCY_KEY_MAX_SIZE} characters"}, status_code=400)
+    try:
+        outcome, replayed = await idempotency.run(key, fingerprint, func)
+    except idempotency_conflict as e:
+        return None, {}, JSONResponse(content={"message": str(e)}, status_code=422)
+    return outcome, {"Idempotency-Key": key, "Idempotent-Replayed": "true" if replayed else "false"}, None
+
+
+
 @api_router.get("/")
 async def root():
     """
@@ -181,15 +223,19 @@ if DEPLOYMENT_MODE == "TEST":
 async def scooter_unlock_single(
     uuid: str, 
     request: Request,
-    user_id: str = Query(..., description="ID of the user trying to unlock the scooter")
+    user_id: str = Query(..., description="ID of the user trying to unlock the scooter"),
+    idempotency_key: str = Header(None, alias="Idempotency-Key", description="Unique key of the unlock, to make retries safe")
 ):
     """
     Unlock a scooter with the given UUID.
     This endpoint is used to unlock a scooter for a single user.
+    With an Idempotency-Key header, retries with the same key return the outcome of the first
+    request instead of unlocking again, also while the first request is still running.
     Args:
         uuid (str): UUID of the scooter to unlock.
         request (Request): FastAPI request object.
         user_id (str): ID of the user trying to unlock the scooter. (Query parameter)
+        idempotency_key (str): Optional unique key of the unlock. (Header)
     Returns:
         dict: A dictionary containing a message indicating the result of the unlock operation.
 
@@ -197,10 +243,17 @@ async def scooter_unlock_single(
         ```
         curl -X POST http://localhost:8000/scooter/1234/single-unlock -> "unlock successful"
         curl -X POST http://localhost:8000/scooter/1235/single-unlock -> "battery too low"
+        curl -X POST -H "Idempotency-Key: 5f0c..." http://localhost:8000/scooter/1234/single-unlock -> "unlock successful"
         ```
     """
-    logger.debug("Request: HTTP POST /scooter/{uuid}/single-unlock?user_id={user_id}")
-    resp = request.app.state.single_ride_service.unlock_scooter(uuid, user_id)
+    logger.debug(f"Request: HTTP POST /scooter/{uuid}/single-unlock?user_id={user_id}")
+    resp, headers, error = await run_idempotent(
+        idempotency_key,
+        ("single-unlock", uuid, user_id),
+        lambda: request.app.state.single_ride_service.unlock_scooter_async(uuid, user_id)
+    )
+    if error is not None:
+        return error
     status_code = 200 if resp[0] else 400
 
     return JSONResponse(
@@ -208,7 +261,8 @@ async def scooter_unlock_single(
             "message": resp[1],
             "redirect": resp[2]
             },
-        status_code=status_code
+        status_code=status_code,
+        headers=headers
     )
 
 
@@ -217,15 +271,19 @@ async def scooter_unlock_single(
 async def scooter_lock_single(
     uuid: str, 
     request: Request,
-    user_id: str = Query(..., description="ID of the user trying to unlock the scooter")
+    user_id: str = Query(..., description="ID of the user trying to unlock the scooter"),
+    idempotency_key: str = Header(None, alias="Idempotency-Key", description="Unique key of the lock, to make retries safe")
 ):
     """
     Lock a scooter with the given UUID.
     This endpoint is used to lock a scooter for a single user.
+    With an Idempotency-Key header, retries with the same key return the outcome of the first
+    request instead of locking and charging the user again.
     Args:
         uuid (str): UUID of the scooter to lock.
         request (Request): FastAPI request object.
         user_id (str): ID of the user trying to unlock the scooter. (Query parameter)
+        idempotency_key (str): Optional unique key of the lock. (Header)
     Returns:
         dict: A dictionary containing a message indicating the result of the lock operation.
     Example:
@@ -234,15 +292,115 @@ async def scooter_lock_single(
         curl -X POST http://localhost:8000/scooter/1235/single-lock -> "invalid parking location"
         ```
     """
-    logger.debug("Request: HTTP POST /scooter/{uuid}/single-lock?user_id={user_id}")
-    resp = request.app.state.single_ride_service.lock_scooter(uuid, user_id)
+    logger.debug(f"Request: HTTP POST /scooter/{uuid}/single-lock?user_id={user_id}")
+    resp, headers, error = await run_idempotent(
+        idempotency_key,
+        ("single-lock", uuid, user_id),
+        lambda: request.app.state.single_ride_service.lock_scooter_async(uuid, user_id)
+    )
+    if error is not None:
+        return error
     status_code = 200 if resp[0] else 400
 
     rental = resp[2]
 
     return JSONResponse(
         content=jsonable_encoder({"message": rental}),
-        status_code=status_code
+        status_code=status_code,
+        headers=headers
+    )
+
+
+
+@api_router.post("/group/unlock")
+async def group_unlock(
+    request: Request,
+    user_id: int = Query(..., description="ID of the user leading the group"),
+    scooters: list[int] = Query(..., alias="scooter", description="UUIDs of the scooters, one per rider"),
+    riders: list[int] = Query(..., alias="rider", description="IDs of the riders, in the same order as the scooters"),
+    idempotency_key: str = Header(None, alias="Idempotency-Key", description="Unique key of the group unlock, to make retries safe")
+):
+    """
+    Unlock a scooter for every rider of a group (co-ride).
+    The n-th rider rides the n-th scooter, and the leader must be one of the riders.
+    Either all scooters are unlocked and all rentals started, or none are.
+    Args:
+        request (Request): FastAPI request object.
+        user_id (int): ID of the user leading the group. (Query parameter)
+        scooters (list): UUIDs of the scooters. (Query parameter `scooter`, repeated)
+        riders (list): IDs of the riders. (Query parameter `rider`, repeated)
+        idempotency_key (str): Optional unique key of the group unlock. (Header)
+    Returns:
+        dict: A message, the redirect of the error page and the group ride if it was started.
+    Example:
+        ```
+        curl -X POST "http://localhost:8000/api/v1/group/unlock?user_id=1&scooter=2&rider=1&scooter=3&rider=4" -> {"message": "group unlock successful", "group": {"session_id": 12, ...}}
+        curl -X POST "http://localhost:8000/api/v1/group/unlock?user_id=1&scooter=2&rider=1&scooter=3&rider=5" -> {"message": "insufficient funds - user: 5", "redirect": "insufficient-funds"}
+        ```
+    """
+    logger.debug(f"Request: HTTP POST /group/unlock?user_id={user_id}&scooters={scooters}&riders={riders}")
+    if len(scooters) != len(riders):
+        return JSONResponse(content={"message": "every rider needs exactly one scooter", "redirect": "invalid-group"}, status_code=400)
+    resp, headers, error = await run_idempotent(
+        idempotency_key,
+        ("group-unlock", user_id, tuple(scooters), tuple(riders)),
+        lambda: request.app.state.multi_ride_service.unlock_group_async(user_id, list(zip(riders, scooters)))
+    )
+    if error is not None:
+        return error
+    status_code = 200 if resp[0] else 400
+
+    return JSONResponse(
+        content=jsonable_encoder({
+            "message": resp[1],
+            "redirect": resp[2],
+            "group": resp[3]
+            }),
+        status_code=status_code,
+        headers=headers
+    )
+
+
+
+@api_router.post("/group/{session_id}/lock")
+async def group_lock(
+    session_id: int,
+    request: Request,
+    user_id: int = Query(..., description="ID of the user leading the group"),
+    idempotency_key: str = Header(None, alias="Idempotency-Key", description="Unique key of the group lock, to make retries safe")
+):
+    """
+    End a group ride: lock all its scooters and charge every rider the co-ride price.
+    Only the leader can end the ride. If a scooter cannot be locked the ride stays active.
+    Args:
+        session_id (int): ID of the group ride.
+        request (Request): FastAPI request object.
+        user_id (int): ID of the user leading the group. (Query parameter)
+        idempotency_key (str): Optional unique key of the group lock. (Header)
+    Returns:
+        dict: A message and the completed group ride, with the price paid by each rider.
+    Example:
+        ```
+        curl -X POST "http://localhost:8000/api/v1/group/12/lock?user_id=1" -> {"message": "group lock successful", "group": {"price": 120.0, ...}}
+        ```
+    """
+    logger.debug(f"Request: HTTP POST /group/{session_id}/lock?user_id={user_id}")
+    resp, headers, error = await run_idempotent(
+        idempotency_key,
+        ("group-lock", session_id, user_id),
+        lambda: request.app.state.multi_ride_service.lock_group_async(session_id, user_id)
+    )
+    if error is not None:
+        return error
+    status_code = 200 if resp[0] else 400
+
+    return JSONResponse(
+        content=jsonable_encoder({
+            "message": resp[1],
+            "group": resp[2]
+            }),
+        status_code=status_code,
+        headers=headers
     )
 
 
@@ -262,7 +420,7 @@ async def test_weather():
             "insufficient conditions <br/> temperature: -2.5 <br/> humidity: 38.1"
         ```
     """
-    resp = weather.is_weather_ok(TEST_COORDINATES[0], TEST_COORDINATES[1])
+    resp = await weather.is_weather_ok_async(TEST_COORDINATES[0], TEST_COORDINATES[1])
     return {"message": resp[1]}
 
 
@@ -288,7 +446,7 @@ async def get_scooter_info(
     """
     logger.debug("Request: HTTP GET /scooter/{uuid}")
     logger.debug(f"single_ride_service: {hasattr(request.app.state, 'single_ride_service')}")
-    resp = request.app.state.single_ride_service.get_scooter_info(uuid)
+    resp = await request.app.state.single_ride_service.get_scooter_info_async(uuid)
     return {"message": resp}
 
 
@@ -312,7 +470,7 @@ async def get_user_info(
         ```
     """
     logger.debug("Request: HTTP GET /user/{id}")
-    resp = request.app.state.single_ride_service.get_user_info(id)
+    resp = await request.app.state.single_ride_service.get_user_info_async(id)
     return {"message": resp}
 
 
@@ -336,7 +494,7 @@ async def get_rental_info(
         ```
     """
     logger.debug("Request: HTTP GET /rental/{rental_id}")
-    resp = request.app.state.single_ride_service.get_rental_info(rental_id)
+    resp = await request.app.state.single_ride_service.get_rental_info_async(rental_id)
     return JSONResponse(
         content=jsonable_encoder({"message": resp}),
         status_code=200
@@ -363,7 +521,7 @@ async def is_rental_ok(
         ```
     """
     logger.debug("Request: HTTP GET /rental/ok/{rental_id}")
-    resp = request.app.state.single_ride_service.check_rental_status(rental_id)
+    resp = await request.app.state.single_ride_service.check_rental_status_async(rental_id)
     return JSONResponse(
         content=jsonable_encoder({"message": resp}),
         status_code=200
@@ -390,13 +548,210 @@ async def get_active_rental(
         ```
     """
     logger.debug("Request: HTTP GET /rental?user_id={user_id}")
-    resp = request.app.state.single_ride_service.get_active_rental_by_user(user_id)
+    resp = await request.app.state.single_ride_service.get_active_rental_by_user_async(user_id)
     
     return JSONResponse(
         content=jsonable_encoder({"message": resp}),
         status_code=200 if resp else 404
     )
 
+@api_router.get("/scooters")
+async def list_scooters(
+    request: Request,
+    after_id: int = Query(0, ge=0, description="UUID of the last scooter on the previous page"),
+    limit: int = Query(100, ge=1, le=database.DB_PAGE_MAX, description="Maximum number of scooters on the page")
+):
+    """
+    List scooters, one page at a time, ordered by UUID.
+    Pass the `next_after_id` of a page as `after_id` to get the next page.
+    Args:
+        request (Request): FastAPI request object.
+        after_id (int): UUID of the last scooter on the previous page. (Query parameter)
+        limit (int): Maximum number of scooters on the page. (Query parameter)
+    Returns:
+        dict: A dictionary containing the scooters and the cursor of the next page.
+    Example:
+        ```
+        curl -X GET http://localhost:8000/api/v1/scooters?limit=2 -> {"message": {"items": [...], "next_after_id": 2}}
+        curl -X GET http://localhost:8000/api/v1/scooters?after_id=2&limit=2 -> {"message": {"items": [...], "next_after_id": null}}
+        ```
+    """
+    logger.debug(f"Request: HTTP GET /scooters?after_id={after_id}&limit={limit}")
+    resp = await request.app.state.single_ride_service.list_scooters_async(after_id, limit)
+    return {"message": resp}
+
+
+
+@api_router.get("/users")
+async def list_users(
+    request: Request,
+    after_id: int = Query(0, ge=0, description="ID of the last user on the previous page"),
+    limit: int = Query(100, ge=1, le=database.DB_PAGE_MAX, description="Maximum number of users on the page")
+):
+    """
+    List users, one page at a time, ordered by ID.
+    Pass the `next_after_id` of a page as `after_id` to get the next page.
+    Args:
+        request (Request): FastAPI request object.
+        after_id (int): ID of the last user on the previous page. (Query parameter)
+        limit (int): Maximum number of users on the page. (Query parameter)
+    Returns:
+        dict: A dictionary containing the users and the cursor of the next page.
+    """
+    logger.debug(f"Request: HTTP GET /users?after_id={after_id}&limit={limit}")
+    resp = await request.app.state.single_ride_service.list_users_async(after_id, limit)
+    return {"message": resp}
+
+
+
+@api_router.get("/rentals")
+async def list_rentals(
+    request: Request,
+    after_id: int = Query(0, ge=0, description="ID of the last rental on the previous page"),
+    limit: int = Query(100, ge=1, le=database.DB_PAGE_MAX, description="Maximum number of rentals on the page"),
+    active: bool = Query(None, description="Only list active (true) or completed (false) rentals")
+):
+    """
+    List rentals, one page at a time, ordered by ID.
+    Pass the `next_after_id` of a page as `after_id` to get the next page.
+    Args:
+        request (Request): FastAPI request object.
+        after_id (int): ID of the last rental on the previous page. (Query parameter)
+        limit (int): Maximum number of rentals on the page. (Query parameter)
+        active (bool): Only list active or completed rentals. (Query parameter)
+    Returns:
+        dict: A dictionary containing the rentals and the cursor of the next page.
+    Example:
+        ```
+        curl -X GET http://localhost:8000/api/v1/rentals?active=true -> {"message": {"items": [...], "next_after_id": null}}
+        ```
+    """
+    logger.debug(f"Request: HTTP GET /rentals?after_id={after_id}&limit={limit}&active={active}")
+    resp = await request.app.state.single_ride_service.list_rentals_async(after_id, limit, active)
+    return JSONResponse(
+        content=jsonable_encoder({"message": resp}),
+        status_code=200
+    )
+
+
+
+@api_router.get("/pricing/estimate")
+async def estimate_prices(
+    minutes: list[float] = Query(..., description="Ride durations in minutes, repeat for several estimates"),
+    riders: int = Query(1, ge=1, description="Number of riders in the group, 1 for a single ride")
+):
+    """
+    Estimate the price per rider of rides of the given durations.
+    At most PRICING_ESTIMATE_MAX_RIDES durations can be estimated per request.
+    Args:
+        minutes (list): Ride durations in minutes. (Query parameter, repeated)
+        riders (int): Number of riders in the group. (Query parameter)
+    Returns:
+        dict: The estimated price per rider for each duration, in the order given.
+        400 if there are too many durations or a duration is negative or not a finite number.
+    Example:
+        ```
+        curl -X GET "http://localhost:8000/api/v1/pricing/estimate?minutes=10&minutes=30&riders=2" -> {"message": {"riders": 2, "estimates": [{"minutes": 10.0, "price": 100.0}, ...]}}
+        ```
+    """
+    logger.debug(f"Request: HTTP GET /pricing/estimate?minutes={minutes}&riders={riders}")
+    if len(minutes) > PRICING_ESTIMATE_MAX_RIDES:
+        return JSONResponse(content={"message": f"at most {PRICING_ESTIMATE_MAX_RIDES} durations can be estimated at once"}, status_code=400)
+    if not all(math.isfinite(duration) and duration >= 0 for duration in minutes):
+        return JSONResponse(content={"message": "durations must be finite, non-negative numbers"}, status_code=400)
+    prices = transaction.ride_prices(minutes, riders)
+    resp = {
+        "riders": riders,
+        "estimates": [{"minutes": duration, "price": float(price)} for duration, price in zip(minutes, prices)],
+    }
+    return JSONResponse(
+        content=jsonable_encoder({"message": resp}),
+        status_code=200
+    )
+
+
+
+@api_router.get("/pricing/recompute")
+async def recompute_prices(
+    day: date = Query(None, description="Day to recompute (UTC, YYYY-MM-DD), defaults to today")
+):
+    """
+    Recompute the prices of all rentals completed on a day and compare them with the prices charged.
+    Args:
+        day (date): The day. (Query parameter)
+    Returns:
+        dict: The revenue charged and recomputed, and the rentals whose prices differ.
+    Example:
+        ```
+        curl -X GET "http://localhost:8000/api/v1/pricing/recompute?day=2025-04-02" -> {"message": {"rentals": 812, "revenue": 98123.4, "mismatched": 1, ...}}
+        ```
+    """
+    logger.debug(f"Request: HTTP GET /pricing/recompute?day={day}")
+    resp = await asyncio.to_thread(transaction.recompute_prices, day)
+    return JSONResponse(
+        content=jsonable_encoder({"message": resp}),
+        status_code=200
+    )
+
+
+
+@api_router.get("/metrics")
+async def get_metrics(request: Request):
+    """
+    Get the runtime statistics of the db client and the unlock flow.
+    Args:
+        request (Request): FastAPI request object.
+    Returns:
+        dict: Per db method latency percentiles, row and error counts, and the pool, liveness,
+        prepared statement, cache, rental archiver, active-rental index and scooter write
+        buffer statistics, and the duration of each unlock stage, the idempotency key
+        statistics, the queue depth of the scooter command actors, the incident counts and
+        the weather cache and API latency statistics.
+    Example:
+        ```
+        curl -X GET http://localhost:8000/api/v1/metrics -> {"message": {"calls": {"get_user": {"calls": 152, "p99": 0.0021, ...}}, "pool": {...}, ...}}
+        ```
+    """
+    logger.debug("Request: HTTP GET /metrics")
+    db_client = request.app.state.db_client
+    resp = {
+        "calls": db_client.metrics(),
+        "pool": db_client.pool_stats(),
+        "liveness": db_client.liveness_stats(),
+        "statements": db_client.statement_stats(),
+        "cache": db_client.cache_stats(),
+        "archiver": db_client.archiver_stats(),
+        "rentals": db_client.rental_index_stats(),
+        "scooter_writes": db_client.scooter_write_stats(),
+        "unlock": request.app.state.single_ride_service.unlock_stats(),
+        "idempotency": idempotency.stats(),
+        "scooter_actors": scooter_commands.stats(),
+        "incidents": INCIDENT_LOG.stats(),
+        "weather": weather.stats(),
+    }
+    return JSONResponse(
+        content=jsonable_encoder({"message": resp}),
+        status_code=200
+    )
+
+
+
+@api_router.get("/metrics/prometheus")
+async def get_metrics_prometheus(request: Request):
+    """
+    Get the db method statistics in the Prometheus text exposition format, for scraping.
+    Args:
+        request (Request): FastAPI request object.
+    Returns:
+        Response: The metrics as text/plain.
+    Example:
+        ```
+        curl -X GET http://localhost:8000/api/v1/metrics/prometheus -> db_call_seconds_bucket{operation="get_user",le="5e-05"} 12 ...
+        ```
+    """
+    logger.debug("Request: HTTP GET /metrics/prometheus")
+    return Response(request.app.state.db_client.export_metrics(), media_type="text/plain; version=0.0.4")
+
 app.include_router(api_router, prefix="/api/v1")
 
 @app.get("/{full_path:path}")
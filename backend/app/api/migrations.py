@@ -0,0 +1,146 @@
+import os
+import re
+import hashlib
+import logging
+import mysql.connector
+from mysql.connector import errorcode
+
+
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MIGRATIONS_PATH = os.path.join(BASE_DIR, "resources/migrations")
+MIGRATION_FILE  = re.compile(r"^(\d+)_([\w-]+)\.sql$")
+
+# Errors raised by a statement whose change is already in place, e.g. when a migration
+# was interrupted after some of its statements had run. DDL commits implicitly in MySQL,
+# so a failed migration cannot be rolled back and is instead re-run from the start.
+ALREADY_APPLIED_ERRORS = {
+    errorcode.ER_DUP_KEYNAME,
+    errorcode.ER_DUP_FIELDNAME,
+    errorcode.ER_TABLE_EXISTS_ERROR,
+    errorcode.ER_CANT_DROP_FIELD_OR_KEY,
+}
+
+SCHEMA_VERSION_DDL = (
+    "CREATE TABLE IF NOT EXISTS schema_version ("
+    "version int NOT NULL PRIMARY KEY, "
+    "name varchar(255) NOT NULL, "
+    "checksum char(64) NOT NULL, "
+    "applied_at timestamp NULL DEFAULT NULL)"
+)
+
+logger = logging.getLogger(__name__)
+
+
+
+def discover(path: str=MIGRATIONS_PATH) -> list[tuple[int, str, str]]:
+    """
+    Find the migration files, ordered by version.
+    Migrations are SQL files named `<version>_<name>.sql`, e.g. `0001_rentals_active_indexes.sql`.
+    Args:
+        path (str): Directory containing the migration files.
+    Returns:
+        list: Tuples of (version, name, file path), lowest version first.
+
+    ## Errors
+        Raises ValueError if two files have the same version.
+    """
+    migrations = {}
+    for filename in sorted(os.listdir(path)):
+        match = MIGRATION_FILE.match(filename)
+        if match is None:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Duplicate migration version {version}: {filename}")
+        migrations[version] = (version, match.group(2), os.path.join(path, filename))
+    return [migrations[version] for version in sorted(migrations)]
+
+
+
+def _statements(sql: str) -> list[str]:
+    """
+    Internal function splitting a migration file into statements.
+    Comment lines are dropped and statements are separated by a semicolon at the end of a line.
+    """
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [statement.strip() for statement in re.split(r";\s*$", "\n".join(lines), flags=re.MULTILINE) if statement.strip()]
+
+
+
+def applied_versions(conn: object) -> dict[int, str]:
+    """
+    Get the applied migrations, creating the schema_version table if it does not exist.
+    Args:
+        conn (MySQLConnection): A database connection.
+    Returns:
+        dict: The checksum of every applied migration, keyed by version.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SCHEMA_VERSION_DDL)
+        cursor.execute("SELECT version, checksum FROM schema_version")
+        return {version: checksum for version, checksum in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+
+
+def migrate(conn: object, target: int=None, path: str=MIGRATIONS_PATH) -> list[int]:
+    """
+    Apply all pending migrations in order, up to and including the target version.
+    Each migration is recorded in the schema_version table once all of its statements
+    have run, so running migrate() again only applies newer migrations. A migration
+    which was modified after it was applied is logged but not re-run.
+    Args:
+        conn (MySQLConnection): A database connection.
+        target (int): Highest version to apply. All versions if None.
+        path (str): Directory containing the migration files.
+    Returns:
+        list: The versions applied by this call.
+    Example:
+        ```python
+        migrations.migrate(conn) -> [1, 2]
+        migrations.migrate(conn) -> []
+        ```
+
+    ## Errors
+        Raises mysql.connector.Error if a statement fails. Migrations applied before
+        the failing one stay applied.
+    """
+    applied = applied_versions(conn)
+    done = []
+
+    for version, name, file_path in discover(path):
+        if target is not None and version > target:
+            break
+        with open(file_path, "r") as f:
+            sql = f.read()
+        checksum = hashlib.sha256(sql.encode()).hexdigest()
+
+        if version in applied:
+            if applied[version] != checksum:
+                logger.warning(f"Migration {version} ({name}) was modified after it was applied")
+            continue
+
+        cursor = conn.cursor()
+        try:
+            for statement in _statements(sql):
+                try:
+                    cursor.execute(statement)
+                except mysql.connector.Error as e:
+                    if getattr(e, "errno", None) not in ALREADY_APPLIED_ERRORS:
+                        raise
+                    logger.debug(f"Migration {version}: skipping statement already applied: {e}")
+            cursor.execute(
+                "INSERT INTO schema_version (version, name, checksum, applied_at) VALUES (%s, %s, %s, UTC_TIMESTAMP())",
+                (version, name, checksum)
+            )
+            conn.commit()
+        finally:
+            cursor.close()
+
+        logger.info(f"Applied migration {version} ({name})")
+        done.append(version)
+
+    return done
@@ -3,11 +3,13 @@ import sys
 import json
 import time
 import logging
-from threading import Event
+from threading import Event, Lock
 import paho.mqtt.client as mqtt
 
 from tools.singleton import singleton
 from service.internal_service import internal_service
+from service import scooter_commands
+from tools.actor import mailbox_full
 
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -36,6 +38,10 @@ class mqtt_client:
     This class handles the connection to the MQTT broker, subscribes to topics,
     and publishes messages to the broker.
     This class is a singleton, meaning only one instance of it can exist at a time.
+    Each unlock or lock command waits for the response of its own scooter, so commands
+    for different scooters can be in flight at the same time. Abort alerts are handed to
+    the scooter's command actor, so they are serialized with its unlock and lock commands
+    and do not block the network thread.
 
     On first initialization, parameters must be provided.
     After that, the same instance will be used throughout the application meaning
@@ -83,12 +89,12 @@ class mqtt_client:
         self._logger = logging.getLogger(__name__)
         self._id = id
         self._status = 'disconnected'
-        self._response_event = Event()
+        self._waiters = {}
+        self._waiters_lock = Lock()
         self.input_topic  = MQTT_TOPIC_INPUT
         self.output_topic = MQTT_TOPIC_OUTPUT
         self._client = self._init_client(MQTT_HOST, MQTT_PORT)
         self._internal_service = internal_service()
-        self._message = None
         with open(SCOOTER_STATUS_CODES_PATH, 'r') as f:
             self._status_codes = json.load(f)
 
@@ -136,7 +142,7 @@ class mqtt_client:
         """
         Callback function for when a message is received from the broker.
         This function is called when a message is received from the broker.
-        It logs the message and sets the response event.
+        It logs the message and wakes the command waiting for a response from the scooter.
         Args:
             client (mqtt.Client): The MQTT client instance.
             userdata (object): User data passed to the callback.
@@ -147,10 +153,51 @@ class mqtt_client:
         self._logger.info(f"At {self.input_topic} - received message: {message}")
 
         if message["abort"] == True:
-            self._internal_service.session_aborted(message["uuid"], message)
-        else:
-            self._message = message
-            self._response_event.set()
+            try:
+                scooter_commands.submit(message["uuid"], self._internal_service.session_aborted, message["uuid"], message)
+            except mailbox_full as e:
+                # An abort must not be dropped, so it is handled here rather than queued.
+                self._logger.error(f"{e}, handling abort on the network thread")
+                self._internal_service.session_aborted(message["uuid"], message)
+            return
+
+        with self._waiters_lock:
+            waiter = self._waiters.pop(str(message.get("uuid")), None)
+        if waiter is None:
+            self._logger.warning(f"No command waiting for a response from scooter {message.get('uuid')}")
+            return
+        waiter.message = message
+        waiter.set()
+
+
+
+    def _expect_response(self : object, uuid : object) -> Event:
+        """
+        Internal function registering a waiter for the next response from a scooter.
+        Must be called before the command is published, so a fast response is not missed.
+        Args:
+            uuid (object): UUID of the scooter.
+        Returns:
+            Event: Set when the response arrives; the response is stored in its `message` attribute.
+        """
+        waiter = Event()
+        waiter.message = None
+        with self._waiters_lock:
+            replaced = self._waiters.get(str(uuid))
+            self._waiters[str(uuid)] = waiter
+        if replaced is not None:
+            self._logger.warning(f"Replaced a pending command waiting for scooter {uuid}")
+        return waiter
+
+
+
+    def _forget_response(self : object, uuid : object, waiter : Event) -> None:
+        """
+        Internal function removing a waiter which timed out.
+        """
+        with self._waiters_lock:
+            if self._waiters.get(str(uuid)) is waiter:
+                del self._waiters[str(uuid)]
 
 
 
@@ -196,11 +243,12 @@ class mqtt_client:
         return True
 
 
-    def scooter_unlock_single(self : object, scooter : dict) -> tuple[bool, int, str]:
+    def scooter_unlock_single(self : object, scooter : dict, coriders : list = None) -> tuple[bool, int, str]:
         """
         This function unlocks a scooter.
         Args:
             scooter (dict): The scooter to unlock.
+            coriders (list): User IDs of the group, if the scooter is unlocked for a group ride.
         Returns:
             tuple: 
              * [0]: _bool_. True if the unlock was successful, False otherwise.
@@ -211,8 +259,6 @@ class mqtt_client:
                 mqtt.scooter_unlock_single("1235") -> (False, "battery too low")
             ```
         """
-        self._response_event.clear()
-
         if scooter['status'] == 11:
             return False, 11, "scooter-occupied"
 
@@ -220,23 +266,25 @@ class mqtt_client:
             "id": self._id,
             "uuid": scooter['uuid'],
             "command": "unlock",
-            "coride": False,
-            "num_coriders": 0,
-            "coriders": [],
+            "coride": bool(coriders),
+            "num_coriders": len(coriders or []),
+            "coriders": list(coriders or []),
             "timestamp": time.time()
         }
 
+        waiter = self._expect_response(scooter['uuid'])
         self.send_message(message)
 
-        response = self._response_event.wait(timeout=15)
+        response = waiter.wait(timeout=15)
+        self._forget_response(scooter['uuid'], waiter)
 
         if response:
             try:
-                if int(self._message['id']) == int(self._id) and str(self._message['uuid']) == str(scooter['uuid']):
-                    battery   = int(self._message['battery'])
-                    status    = int(self._message['status'])
-                    # location  = str(self._message['location'])
-                    # timestamp = self._message['timestamp']
+                if int(waiter.message['id']) == int(self._id) and str(waiter.message['uuid']) == str(scooter['uuid']):
+                    battery   = int(waiter.message['battery'])
+                    status    = int(waiter.message['status'])
+                    # location  = str(waiter.message['location'])
+                    # timestamp = waiter.message['timestamp']
 
                     if battery > 15 and status == 0:
                         return True, status, ""
@@ -246,7 +294,7 @@ class mqtt_client:
                         return False, status, "scooter-inoperable"
             except Exception as e:
                 self._logger.error(f"Exception while parsing unlock response: {e}")
-                self._logger.error(f"Message content: {self._message}")
+                self._logger.error(f"Message content: {waiter.message}")
                 return False, 7, "scooter-inoperable"
         else:
             self._logger.error("Did not get response")
@@ -255,11 +303,12 @@ class mqtt_client:
 
 
 
-    def scooter_lock_single(self : object, scooter : dict) -> tuple[bool, str, int]:
+    def scooter_lock_single(self : object, scooter : dict, coriders : list = None) -> tuple[bool, str, int]:
         """
         This function locks a scooter.
         Args:
             scooter (dict): The scooter to lock.
+            coriders (list): User IDs of the group, if the scooter is locked at the end of a group ride.
         Returns:
             tuple: 
              * [0]: _bool_. True if the lock was successful, False otherwise.
@@ -271,29 +320,29 @@ class mqtt_client:
                 mqtt.scooter_lock_single("1235") -> (False, "invalid parking location")
             ```
         """
-        self._response_event.clear()  
-
         message = {
             "id": self._id,
             "uuid": scooter["uuid"],
             "command": "lock",
-            "coride": False,
-            "num_coriders": 0,
-            "coriders": [],
+            "coride": bool(coriders),
+            "num_coriders": len(coriders or []),
+            "coriders": list(coriders or []),
             "timestamp": time.time()
         }
 
+        waiter = self._expect_response(scooter["uuid"])
         self.send_message(message)
 
-        response = self._response_event.wait(timeout=30)
+        response = waiter.wait(timeout=30)
+        self._forget_response(scooter["uuid"], waiter)
 
         if response:
             try:
-                if int(self._message['id']) == int(self._id) and str(self._message['uuid']) == str(scooter["uuid"]):
-                    battery   = int(self._message['battery'])
-                    status    = int(self._message['status'])
-                    location  = str(self._message['location'])
-                    timestamp = self._message['timestamp']
+                if int(waiter.message['id']) == int(self._id) and str(waiter.message['uuid']) == str(scooter["uuid"]):
+                    battery   = int(waiter.message['battery'])
+                    status    = int(waiter.message['status'])
+                    location  = str(waiter.message['location'])
+                    timestamp = waiter.message['timestamp']
 
                     if status == 0 and self.location_is_valid(location):
                         return True, "lock successful", status
@@ -0,0 +1,247 @@
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from threading import Condition
+
+from mysql.connector import errors
+
+
+
+class connection_pool:
+    """
+    Bounded pool of database connections shared between threads.
+    Connections are checked out for the duration of a single call and returned
+    afterwards, so concurrent callers never share a connection or a cursor.
+    The pool opens `min_size` connections up front, grows on demand up to `max_size`,
+    and blocks callers for at most `timeout` seconds when all connections are in use.
+
+    #### Example:
+    ```python
+    pool = connection_pool(connect=lambda: mysql.connector.connect(**credentials), min_size=1, max_size=10)
+
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchone() -> (1,)
+
+    pool.stats() -> {"size": 1, "idle": 1, "in_use": 0, "exhausted": 0, ...}
+    ```
+    """
+
+    def __init__(self, connect, min_size: int=1, max_size: int=10, timeout: float=5.0) -> None:
+        """
+        Initialize the pool and open the minimum number of connections.
+        Args:
+            connect (callable): Factory returning a new, open connection.
+            min_size (int): Number of connections kept open at all times.
+            max_size (int): Upper bound on the number of open connections.
+            timeout (float): Seconds to wait for a free connection before giving up.
+        """
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError(f"invalid pool size: min={min_size}, max={max_size}")
+        self._logger = logging.getLogger(__name__)
+        self._connect = connect
+        self._min_size = min_size
+        self._max_size = max_size
+        self._timeout = timeout
+        self._idle = deque()
+        self._idle_for = {}
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+        self._cond = Condition()
+
+        self._checkouts = 0
+        self._exhausted = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+        for _ in range(min_size):
+            self._idle.append((self._open(), time.monotonic()))
+            self._size += 1
+
+
+
+    def _open(self: object) -> object:
+        """
+        Internal function opening a new connection through the factory.
+        Returns:
+            object: The new connection.
+        """
+        conn = self._connect()
+        self._logger.debug(f"Opened pooled connection ({self._size + 1}/{self._max_size})")
+        return conn
+
+
+
+    def _discard(self: object, conn: object) -> None:
+        """
+        Internal function closing a connection which should not be reused.
+        Args:
+            conn (object): The connection to close.
+        """
+        try:
+            conn.close()
+        except Exception as e:
+            self._logger.debug(f"Error closing pooled connection: {e}")
+
+
+
+    def acquire(self: object, timeout: float=None) -> object:
+        """
+        Check out a connection from the pool.
+        If no connection is idle and the pool is at its maximum size, the caller
+        blocks until a connection is returned or the timeout expires.
+        Args:
+            timeout (float): Seconds to wait, defaults to the pool timeout.
+        Returns:
+            object: An open connection owned by the caller until released.
+        ## Errors
+            Raises mysql.connector.errors.PoolError if the pool is exhausted or closed.
+        """
+        timeout = self._timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        create = False
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise errors.PoolError("connection pool is closed")
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    self._idle_for[id(conn)] = time.monotonic() - returned_at
+                    break
+                if self._size < self._max_size:
+                    self._size += 1
+                    create = True
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._exhausted += 1
+                    raise errors.PoolError(
+                        f"connection pool exhausted: {self._max_size} connections in use after {timeout}s"
+                    )
+                self._cond.wait(remaining)
+
+            self._in_use += 1
+            self._checkouts += 1
+            waited = time.monotonic() - started
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        if create:
+            try:
+                conn = self._open()
+                with self._cond:
+                    self._idle_for[id(conn)] = 0.0
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+
+        return conn
+
+
+
+    def release(self: object, conn: object, discard: bool=False) -> None:
+        """
+        Return a connection to the pool.
+        Args:
+            conn (object): The connection previously returned by acquire().
+            discard (bool): Close the connection instead of reusing it, e.g. after a connection error.
+        """
+        with self._cond:
+            self._in_use -= 1
+            self._idle_for.pop(id(conn), None)
+            if discard or self._closed:
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+                conn = None
+            self._cond.notify()
+
+        if conn is not None:
+            self._discard(conn)
+
+
+
+    def idle_seconds(self: object, conn: object) -> float:
+        """
+        Get how long a checked-out connection sat idle in the pool before it was acquired.
+        Callers use this to decide whether the connection needs a liveness check.
+        Args:
+            conn (object): A connection currently checked out of this pool.
+        Returns:
+            float: Seconds the connection was idle, 0.0 for newly opened connections.
+        """
+        with self._cond:
+            return self._idle_for.get(id(conn), 0.0)
+
+
+
+    @contextmanager
+    def connection(self: object, timeout: float=None):
+        """
+        Context manager checking out a connection and returning it afterwards.
+        Connections that fail with a connection-level error are discarded instead of returned.
+        Args:
+            timeout (float): Seconds to wait, defaults to the pool timeout.
+        Example:
+            ```python
+            with pool.connection() as conn:
+                conn.cursor().execute("SELECT 1")
+            ```
+        """
+        conn = self.acquire(timeout)
+        discard = False
+        try:
+            yield conn
+        except (errors.OperationalError, errors.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+
+
+    def stats(self: object) -> dict:
+        """
+        Get a snapshot of the pool metrics.
+        Returns:
+            dict: Pool size, idle and in-use connections, checkouts, exhausted count and wait times in seconds.
+        """
+        with self._cond:
+            return {
+                "min_size":   self._min_size,
+                "max_size":   self._max_size,
+                "size":       self._size,
+                "idle":       len(self._idle),
+                "in_use":     self._in_use,
+                "checkouts":  self._checkouts,
+                "exhausted":  self._exhausted,
+                "wait_total": self._wait_total,
+                "wait_avg":   self._wait_total / self._checkouts if self._checkouts else 0.0,
+                "wait_max":   self._wait_max,
+            }
+
+
+
+    def close(self: object) -> None:
+        """
+        Close all idle connections and refuse further checkouts.
+        Connections currently in use are closed when they are released.
+        """
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+
+        for conn in idle:
+            self._discard(conn)
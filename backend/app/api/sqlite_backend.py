@@ -0,0 +1,259 @@
+import os
+import re
+import sqlite3
+import logging
+import itertools
+import functools
+import mysql.connector
+from datetime import datetime
+from mysql.connector import errorcode
+
+
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SQLITE_SCHEMA_PATH = os.path.join(BASE_DIR, "resources/sqlite-schema.sql")
+SQLITE_SEED_PATH   = os.path.join(BASE_DIR, "resources/sqlite-seed.sql")
+
+# MySQL constructs used by the db queries, and their SQLite equivalents.
+# Applied in order, before the %s placeholders are replaced.
+TRANSLATIONS = [
+    (re.compile(r"NOW\(\) - INTERVAL %s SECOND"), "datetime('now', '-' || %s || ' seconds')"),
+    (re.compile(r"UTC_TIMESTAMP\(\)|NOW\(\)"), "CURRENT_TIMESTAMP"),
+    (re.compile(r"\s+FOR UPDATE\b"), ""),
+    (re.compile(r"\bINSERT IGNORE\b"), "INSERT OR IGNORE"),
+]
+
+# SQLite error messages with a MySQL error code, so callers can handle them by errno.
+ERROR_CODES = [
+    (re.compile(r"^index .* already exists"), errorcode.ER_DUP_KEYNAME),
+    (re.compile(r"^table .* already exists"), errorcode.ER_TABLE_EXISTS_ERROR),
+    (re.compile(r"^duplicate column name"), errorcode.ER_DUP_FIELDNAME),
+    (re.compile(r"^no such index"), errorcode.ER_CANT_DROP_FIELD_OR_KEY),
+]
+
+logger = logging.getLogger(__name__)
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("timestamp", lambda value: datetime.fromisoformat(value.decode()))
+
+
+
+@functools.lru_cache(maxsize=512)
+def translate(query: str) -> str:
+    """
+    Translate a MySQL query written for the db class to SQLite.
+    Args:
+        query (str): The MySQL query.
+    Returns:
+        str: The SQLite query.
+    Example:
+        ```python
+        translate("SELECT uuid FROM scooters WHERE uuid = %s FOR UPDATE") -> "SELECT uuid FROM scooters WHERE uuid = ?"
+        ```
+    """
+    for pattern, replacement in TRANSLATIONS:
+        query = pattern.sub(replacement, query)
+    return query.replace("%s", "?")
+
+
+
+def _translate_error(error: sqlite3.Error) -> mysql.connector.Error:
+    """
+    Internal function mapping a SQLite error to the mysql.connector error the db class handles.
+    Operational errors (e.g. a locked database) are mapped to DatabaseError rather than
+    OperationalError, so the connection pool does not discard the connection.
+    """
+    errno = next((code for pattern, code in ERROR_CODES if pattern.match(str(error))), None)
+    if isinstance(error, sqlite3.IntegrityError):
+        return mysql.connector.errors.IntegrityError(msg=str(error), errno=errno)
+    if isinstance(error, sqlite3.ProgrammingError):
+        return mysql.connector.errors.ProgrammingError(msg=str(error), errno=errno)
+    return mysql.connector.errors.DatabaseError(msg=str(error), errno=errno)
+
+
+
+class sqlite_cursor:
+    """
+    Cursor with the subset of the mysql.connector cursor API used by the db class.
+    """
+
+    def __init__(self, cursor: sqlite3.Cursor) -> None:
+        self._cursor = cursor
+
+
+    @property
+    def rowcount(self: object) -> int:
+        return self._cursor.rowcount
+
+
+    @property
+    def lastrowid(self: object) -> int:
+        return self._cursor.lastrowid
+
+
+    def execute(self: object, query: str, params: tuple=()) -> None:
+        try:
+            self._cursor.execute(translate(query), tuple(params))
+        except sqlite3.Error as e:
+            raise _translate_error(e) from e
+
+
+    def executemany(self: object, query: str, rows: list) -> None:
+        try:
+            self._cursor.executemany(translate(query), [tuple(row) for row in rows])
+        except sqlite3.Error as e:
+            raise _translate_error(e) from e
+
+
+    def fetchone(self: object) -> tuple:
+        return self._cursor.fetchone()
+
+
+    def fetchall(self: object) -> list[tuple]:
+        return self._cursor.fetchall()
+
+
+    def fetchmany(self: object, size: int) -> list[tuple]:
+        return self._cursor.fetchmany(size)
+
+
+    def close(self: object) -> None:
+        self._cursor.close()
+
+
+
+class sqlite_connection:
+    """
+    SQLite connection with the subset of the mysql.connector connection API used by the
+    db class and the connection pool, so the db queries run unchanged on SQLite.
+    Outside of start_transaction() every statement commits on its own, like an
+    autocommit MySQL connection. Transactions are started with BEGIN IMMEDIATE, which
+    takes the write lock up front and stands in for SELECT ... FOR UPDATE.
+
+    #### Example:
+    ```python
+    conn = sqlite_backend.connect("escooter.db")
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, name, funds FROM users WHERE id = %s", (1,))
+    cursor.fetchone() -> (1, "John Appleseed", 450.0)
+    ```
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, raw: sqlite3.Connection, shared: bool=False) -> None:
+        """
+        Wrap a SQLite connection.
+        Args:
+            raw (sqlite3.Connection): The connection, opened with isolation_level=None.
+            shared (bool): The connection is shared by every wrapper and is not closed by close().
+        """
+        self._raw = raw
+        self._shared = shared
+        self.connection_id = next(self._ids)
+        self.autocommit = True
+
+
+    def cursor(self: object, prepared: bool=False, buffered: bool=None) -> sqlite_cursor:
+        # SQLite caches compiled statements per connection, so prepared cursors need no special handling.
+        return sqlite_cursor(self._raw.cursor())
+
+
+    def ping(self: object, reconnect: bool=False, attempts: int=1, delay: int=0) -> None:
+        try:
+            self._raw.execute("SELECT 1")
+        except sqlite3.Error as e:
+            raise mysql.connector.errors.InterfaceError(msg=str(e)) from e
+
+
+    def start_transaction(self: object, isolation_level: str=None, **kwargs) -> None:
+        try:
+            self._raw.execute("BEGIN IMMEDIATE")
+        except sqlite3.Error as e:
+            raise _translate_error(e) from e
+
+
+    def commit(self: object) -> None:
+        if self._raw.in_transaction:
+            self._raw.commit()
+
+
+    def rollback(self: object) -> None:
+        if self._raw.in_transaction:
+            self._raw.rollback()
+
+
+    def close(self: object) -> None:
+        if self._shared:
+            self.rollback()
+        else:
+            self._raw.close()
+
+
+
+def _open(database: str, uri: bool=False) -> sqlite3.Connection:
+    """
+    Internal function opening a raw SQLite connection usable from any thread.
+    """
+    raw = sqlite3.connect(
+        database,
+        uri=uri,
+        timeout=30.0,
+        isolation_level=None,
+        check_same_thread=False,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+    )
+    raw.execute("PRAGMA foreign_keys = ON")
+    return raw
+
+
+
+def initialize(conn: sqlite_connection, seed: bool=True) -> None:
+    """
+    Create the schema if it does not exist, and load the sample users and scooters into an empty database.
+    Args:
+        conn (sqlite_connection): A connection to the database.
+        seed (bool): Load the sample data if the database has no users.
+    """
+    with open(SQLITE_SCHEMA_PATH, "r") as f:
+        conn._raw.executescript(f.read())
+    if seed and conn._raw.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0:
+        with open(SQLITE_SEED_PATH, "r") as f:
+            conn._raw.executescript(f.read())
+        logger.debug("Loaded sample data into the SQLite database")
+
+
+
+def connect(path: str) -> sqlite_connection:
+    """
+    Open a connection to a SQLite database file.
+    The database uses write-ahead logging, so readers are not blocked by a writer.
+    Args:
+        path (str): Path of the database file. It is created if it does not exist.
+    Returns:
+        sqlite_connection: The new connection.
+    """
+    raw = _open(path)
+    raw.execute("PRAGMA journal_mode = WAL")
+    raw.execute("PRAGMA synchronous = NORMAL")
+    return sqlite_connection(raw)
+
+
+
+def memory_database():
+    """
+    Create an in-memory SQLite database.
+    An in-memory database lives in a single connection, so every connection returned
+    by the factory wraps the same SQLite connection. The pool using it must hold at
+    most one connection, which serializes access the same way as the pool does for
+    MySQL connections.
+    Returns:
+        callable: Function without arguments returning a connection to the database.
+    Example:
+        ```python
+        connect = sqlite_backend.memory_database()
+        pool = connection_pool(connect=connect, min_size=1, max_size=1)
+        ```
+    """
+    raw = _open(":memory:")
+    return lambda: sqlite_connection(raw, shared=True)
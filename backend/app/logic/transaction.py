@@ -1,10 +1,16 @@
 import os
+import numpy as np
+from datetime import date, datetime, timedelta
 from api import database
 
 DISABLE_TRANSACTIONS = os.getenv("DISABLE_TRANSACTIONS", "False").lower() == "true"
 TRANSACTION_COST_UNLOCK = int(os.getenv('TRANSACTION_COST_UNLOCK', '10'))
 TRANSACTION_COST_PER_MINUTE = int(os.getenv('TRANSACTION_COST_PER_MINUTE', '10'))
 TRANSACTION_CORIDE_DISCOUNT_PER_EXTRA_PERSON = int(os.getenv('TRANSACTION_CORIDE_DISCOUNT_PER_EXTRA_PERSON', '10'))
+TRANSACTION_PRICE_TOLERANCE = float(os.getenv('TRANSACTION_PRICE_TOLERANCE', '1.0'))
+
+# A tariff is (unlock fee, price per minute, co-ride discount per extra rider).
+DEFAULT_TARIFF = (TRANSACTION_COST_UNLOCK, TRANSACTION_COST_PER_MINUTE, TRANSACTION_CORIDE_DISCOUNT_PER_EXTRA_PERSON)
 
 db = None
 
@@ -84,6 +90,56 @@ def _process_transaction(user: dict, price: float) -> tuple[bool, str, float]:
         return False, f"error processing transaction: {e}"
     
 
+def ride_prices(minutes, riders=1, tariffs=None) -> np.ndarray:
+    """
+    Price a batch of rides at once. Every argument is broadcast against the others, so a
+    single value applies to all rides.
+    The price per rider is the unlock fee plus the price per minute, minus the co-ride
+    discount for every rider beyond the first, rounded to 0.1 and never negative.
+    Args:
+        minutes (array-like): Duration of each ride in minutes.
+        riders (array-like): Number of riders of each ride's group, 1 for a single ride.
+        tariffs (array-like): One tariff for all rides, shape (3,), or one per ride, shape (n, 3).
+            Defaults to DEFAULT_TARIFF.
+    Returns:
+        np.ndarray: The price per rider of each ride.
+
+        __Example__
+    ```python
+        ride_prices([12.0, 30.0, 5.0], riders=[1, 3, 2]) ->
+        array([130. , 290. ,  50. ])
+
+        ride_prices([12.0, 30.0], tariffs=[(0, 5, 0), (20, 10, 0)]) ->
+        array([ 60., 320.])
+    ```
+
+    ## Errors
+        Raises ValueError if the tariffs are not triples or the arguments cannot be broadcast together.
+    """
+    minutes = np.asarray(minutes, dtype=np.float64)
+    riders  = np.asarray(riders, dtype=np.float64)
+    tariffs = np.asarray(DEFAULT_TARIFF if tariffs is None else tariffs, dtype=np.float64)
+    if tariffs.shape[-1:] != (3,):
+        raise ValueError(f"tariffs must have shape (3,) or (n, 3), got {tariffs.shape}")
+    prices = tariffs[..., 0] + minutes * tariffs[..., 1] - np.maximum(riders - 1, 0) * tariffs[..., 2]
+    return np.round(np.maximum(prices, 0.0), 1)
+
+
+
+def ride_price(minutes: float, riders: int=1, tariff: tuple=None) -> float:
+    """
+    Price a single ride, see ride_prices().
+    Args:
+        minutes (float): Duration of the ride in minutes.
+        riders (int): Number of riders of the group, 1 for a single ride.
+        tariff (tuple): The tariff, defaults to DEFAULT_TARIFF.
+    Returns:
+        float: The price per rider.
+    """
+    return float(ride_prices(minutes, riders, tariff))
+
+
+
 def pay_for_single_ride(user: dict, minutes: float) -> tuple[bool, str, float]:
     """
     Process a transaction for a single ride. Deducts the price from the user's balance.
@@ -91,20 +147,95 @@ def pay_for_single_ride(user: dict, minutes: float) -> tuple[bool, str, float]:
         user (dict): Object representing the user.
         minutes (float): Time of the ride in minutes.
     """
-    price = round(TRANSACTION_COST_UNLOCK + (minutes * TRANSACTION_COST_PER_MINUTE),1)
+    price = ride_price(minutes)
     return _process_transaction(user, price)
 
 
-def pay_for_coride_ride(users: list, minutes: float, num_coriders: int) -> tuple[bool, str]:
+def pay_for_coride_ride(users: list, minutes: float, num_coriders: int) -> tuple[bool, str, float]:
     """
     Process a transaction for a coride ride. Deducts the price from the users' balance.
+    Every rider pays the same price: the single ride price minus a discount per extra person.
+    The funds of all users are checked at once, and every user with insufficient funds is reported.
     Args:
         users (list): List of user objects.
         minutes (float): Time of the ride in minutes.
         num_coriders (int): Number of coriders.
+    Returns:
+        Tuple:
+         * [0]: _bool_. True if every user has sufficient funds, False otherwise.
+         * [1]: _str_. A message indicating the result of the transaction.
+         * [2]: _float_. The price per user.
+
+        __Example__
+    ```python
+        pay_for_coride_ride([user_1, user_2], 12.0, 1) ->
+        (True, "transaction successful", 120.0)
+
+        pay_for_coride_ride([user_1, user_2, user_3], 12.0, 2) ->
+        (False, "insufficient funds - user: Kari Nordmann, Ola Nordmann", 110.0)
+    ```
+    """
+    price = ride_price(minutes, num_coriders + 1)
+    if DISABLE_TRANSACTIONS:
+        return True, "transactions disabled", -1.0
+    try:
+        funds = np.fromiter((user['funds'] for user in users), dtype=np.float64, count=len(users))
+    except Exception as e:
+        return False, f"error processing transaction: {e}", price
+    insufficient = np.flatnonzero(funds < price)
+    if insufficient.size:
+        return False, f"insufficient funds - user: {', '.join(str(users[i]['name']) for i in insufficient)}", price
+    return True, "transaction successful", price
+
+
+
+def recompute_prices(day: date=None, tariff: tuple=None) -> dict:
     """
-    for user in users:
-        price = TRANSACTION_COST_UNLOCK + (minutes * TRANSACTION_COST_PER_MINUTE) - (num_coriders * TRANSACTION_CORIDE_DISCOUNT_PER_EXTRA_PERSON)
-        if _process_transaction(user, price)[0] == False:
-            return False, f"insufficient funds - user: {user['name']}"
-    return True, "transaction successful"
+    Recompute the prices of all rentals completed on a day (UTC) and compare them with
+    the prices charged. All rentals of the day, including archived ones, are priced in
+    one batch; group rides are priced with the co-ride discount of their group size.
+    Meant to run at the end of the day, e.g. to audit the charges or to preview a new tariff.
+    Nothing is changed in the database.
+    Args:
+        day (date): The day, defaults to today.
+        tariff (tuple): The tariff to price the rentals with, defaults to DEFAULT_TARIFF.
+    Returns:
+        dict: The number of rentals and group rentals, the revenue charged and recomputed, and
+        the rentals whose charged price differs from the recomputed one by more than
+        TRANSACTION_PRICE_TOLERANCE (at most 100 are listed).
+
+        __Example__
+    ```python
+        recompute_prices(date(2025, 4, 2)) ->
+        {"day": "2025-04-02", "rentals": 812, "group_rentals": 64, "revenue": 98123.4, "recomputed_revenue": 98120.1,
+         "mismatched": 1, "mismatches": [{"rental_id": 228, "charged": 0.0, "recomputed": 130.0}]}
+    ```
+    """
+    if db is None:
+        _init_db_client()
+    day = day or datetime.utcnow().date()
+    start = datetime.combine(day, datetime.min.time())
+    rentals = db.get_completed_rentals(start, start + timedelta(days=1))
+
+    ids     = np.fromiter((rental[0] for rental in rentals), dtype=np.int64, count=len(rentals))
+    started = np.array([rental[3] for rental in rentals], dtype="datetime64[s]")
+    ended   = np.array([rental[4] for rental in rentals], dtype="datetime64[s]")
+    charged = np.fromiter((rental[5] for rental in rentals), dtype=np.float64, count=len(rentals))
+    riders  = np.fromiter((rental[6] for rental in rentals), dtype=np.int64, count=len(rentals))
+
+    minutes = np.abs((ended - started) / np.timedelta64(1, "m"))
+    recomputed = ride_prices(minutes, riders, tariff)
+    mismatched = np.flatnonzero(np.abs(charged - recomputed) > TRANSACTION_PRICE_TOLERANCE)
+
+    return {
+        "day": day.isoformat(),
+        "rentals": len(rentals),
+        "group_rentals": int(np.count_nonzero(riders > 1)),
+        "revenue": round(float(charged.sum()), 1),
+        "recomputed_revenue": round(float(recomputed.sum()), 1),
+        "mismatched": int(mismatched.size),
+        "mismatches": [
+            {"rental_id": int(ids[i]), "charged": float(charged[i]), "recomputed": float(recomputed[i])}
+            for i in mismatched[:100]
+        ],
+    }
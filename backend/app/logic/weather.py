@@ -1,6 +1,17 @@
 import os
+import math
+import time
+import asyncio
 import logging
-import requests
+from threading import Lock
+from concurrent.futures import Future
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+from api import database
+from tools.cache import ttl_cache
+from tools.http_client import http_client
+from tools.periodic import periodic_task
 
 APP_VERSION                   = os.getenv("APP_VERSION", "0.1-SNAPSHOT")
 WEATHER_API_URL               = os.getenv("WEATHER_API_URL", None)
@@ -8,47 +19,449 @@ WEATHER_API_CONTENT_TYPE      = os.getenv("WEATHER_API_CONTENT_TYPE", "applicati
 WEATHER_API_USER_AGENT        = os.getenv("WEATHER_API_USER_AGENT", "application/json")
 WEATHER_API_CONTACT_INFO      = os.getenv("WEATHER_API_CONTACT_INFO", "jorgen.finsveen@ntnu.no")
 WEATHER_TEMPERATURE_THRESHOLD = int(os.getenv("WEATHER_TEMPERATURE_THRESHOLD", 0))
+WEATHER_API_TIMEOUT           = float(os.getenv("WEATHER_API_TIMEOUT", 3.0))
+WEATHER_API_CONNECT_TIMEOUT   = float(os.getenv("WEATHER_API_CONNECT_TIMEOUT", 1.0))
+WEATHER_API_RETRIES           = int(os.getenv("WEATHER_API_RETRIES", 2))
+WEATHER_API_BACKOFF           = float(os.getenv("WEATHER_API_BACKOFF", 0.2))
+WEATHER_API_POOL_SIZE         = int(os.getenv("WEATHER_API_POOL_SIZE", 10))
+WEATHER_API_SLOW_MS           = float(os.getenv("WEATHER_API_SLOW_MS", 1000.0))
 DISABLE_WEATHER = os.getenv("DISABLE_WEATHER", "False").lower() == "true"
 
+WEATHER_TILE_SIZE       = float(os.getenv("WEATHER_TILE_SIZE", 0.005))
+WEATHER_CACHE_SIZE      = int(os.getenv("WEATHER_CACHE_SIZE", 1024))
+WEATHER_CACHE_TTL       = float(os.getenv("WEATHER_CACHE_TTL", 600.0))
+WEATHER_CACHE_MIN_TTL   = float(os.getenv("WEATHER_CACHE_MIN_TTL", 60.0))
+WEATHER_CACHE_MAX_TTL   = float(os.getenv("WEATHER_CACHE_MAX_TTL", 3600.0))
+WEATHER_CACHE_STALE_TTL = float(os.getenv("WEATHER_CACHE_STALE_TTL", 900.0))
+
+WEATHER_PREFETCH_INTERVAL = float(os.getenv("WEATHER_PREFETCH_INTERVAL", 60.0))
+WEATHER_PREFETCH_AHEAD    = float(os.getenv("WEATHER_PREFETCH_AHEAD", 180.0))
+WEATHER_PREFETCH_BUDGET   = int(os.getenv("WEATHER_PREFETCH_BUDGET", 20))
+
 logger = logging.getLogger(__name__)
 
+# Keep-alive connections to the weather API, shared by all weather checks.
+WEATHER_CLIENT = http_client(
+    "weather",
+    headers={
+        "Content-Type": WEATHER_API_CONTENT_TYPE,
+        "User-Agent": f"{WEATHER_API_USER_AGENT}/{APP_VERSION} {WEATHER_API_CONTACT_INFO}"
+    },
+    connect_timeout=WEATHER_API_CONNECT_TIMEOUT,
+    read_timeout=WEATHER_API_TIMEOUT,
+    retries=WEATHER_API_RETRIES,
+    backoff=WEATHER_API_BACKOFF,
+    pool_size=WEATHER_API_POOL_SIZE,
+    slow_threshold=WEATHER_API_SLOW_MS / 1000,
+)
+
+# Forecasts per tile, as (weather, Last-Modified header, monotonic time the forecast is fresh until).
+# Entries are kept WEATHER_CACHE_STALE_TTL seconds past their freshness, to be revalidated
+# with If-Modified-Since or served if the API cannot be reached.
+WEATHER_CACHE = ttl_cache(max_size=WEATHER_CACHE_SIZE, ttl=WEATHER_CACHE_TTL + WEATHER_CACHE_STALE_TTL)
+
+_refreshing = {}
+_refreshing_lock = Lock()
+_counters = {"fresh": 0, "fetched": 0, "revalidated": 0, "stale": 0, "errors": 0, "joined": 0}
+_counters_lock = Lock()
+_prefetcher = None
+
 
 
-def _get_weather(latitude: float, longtiude: float) -> dict:
+def _get_weather(latitude: float, longtiude: float, last_modified: str=None) -> tuple[int, dict, dict]:
     """
     Internal function fecthing weather data from the specified weather forecast API.
     The API URL is set in the environment variable WEATHER_API_URL.
     API used for this project is the MET API from Norway. Using other APIs may require
     different parameters and headers and result in different JSON format.
+    The request is sent on the pooled WEATHER_CLIENT. It fails if no connection is made within
+    WEATHER_API_CONNECT_TIMEOUT seconds or the API stalls for WEATHER_API_TIMEOUT seconds, and is
+    retried up to WEATHER_API_RETRIES times on connection errors, timeouts and server errors.
 
     See:
         * <a href="https://api.met.no/weatherapi/documentation">api.met.no</a>
     Args:
         latitude (float): Latitude of the location.
         longtiude (float): Longitude of the location.
+        last_modified (str): Last-Modified header of the cached forecast. If set, the request
+            is conditional and the API answers 304 if the forecast has not changed.
     Returns:
-        dict: Weather data in JSON format.
+        tuple:
+            * [0]: (int) The response status code (200 or 304), or None if the request failed.
+            * [1]: (dict) Weather data in JSON format, or None unless the status code is 200.
+            * [2]: (dict) The response headers, or None if the request failed.
     """
     if WEATHER_API_URL is None:
         logger.error("API_URL is not set.")
-        return None
+        return None, None, None
     
     url = f"{WEATHER_API_URL}?lat={latitude}&lon={longtiude}"
-    headers = {
-        "Content-Type": WEATHER_API_CONTENT_TYPE,
-        "User-Agent": f"{WEATHER_API_USER_AGENT}/{APP_VERSION} {WEATHER_API_CONTACT_INFO}"
-    }
+    headers = None if last_modified is None else {"If-Modified-Since": last_modified}
 
     try: 
-        response = requests.get(url, headers=headers)
-        if response.status_code != 200:
-            logger.error(f"Invalid response code: {response.status_code}")
-            return None
-        else:
-            return response.json()
+        return _parse_response(WEATHER_CLIENT.get(url, headers=headers), last_modified)
     except Exception as e:
         logger.error(f"Error fetching weather data: {e}")
+        return None, None, None
+
+
+
+async def _get_weather_async(latitude: float, longtiude: float, last_modified: str=None) -> tuple[int, dict, dict]:
+    """
+    Internal awaitable variant of _get_weather(), sending the request on the asynchronous pool.
+    """
+    if WEATHER_API_URL is None:
+        logger.error("API_URL is not set.")
+        return None, None, None
+
+    url = f"{WEATHER_API_URL}?lat={latitude}&lon={longtiude}"
+    headers = None if last_modified is None else {"If-Modified-Since": last_modified}
+
+    try:
+        return _parse_response(await WEATHER_CLIENT.get_async(url, headers=headers), last_modified)
+    except Exception as e:
+        logger.error(f"Error fetching weather data: {e}")
+        return None, None, None
+
+
+
+def _parse_response(response: object, last_modified: str) -> tuple[int, dict, dict]:
+    """
+    Internal function converting a weather API response to the result of _get_weather().
+    """
+    if response.status_code == 304 and last_modified is not None:
+        return 304, None, response.headers
+    if response.status_code != 200:
+        logger.error(f"Invalid response code: {response.status_code}")
+        return None, None, None
+    else:
+        return 200, response.json(), response.headers
+
+
+
+def weather_tile(latitude: float, longitude: float) -> tuple[float, float]:
+    """
+    Get the weather tile containing a position. Forecasts are fetched and cached per tile,
+    so all positions within a tile share one forecast. Tiles are WEATHER_TILE_SIZE degrees
+    wide and identified by their center, rounded to the 4 decimals accepted by the MET API.
+    Args:
+        latitude (float): Latitude of the position.
+        longitude (float): Longitude of the position.
+    Returns:
+        tuple: (latitude, longitude) of the tile center.
+    Example:
+        ```python
+        weather_tile(63.41947, 10.40174) -> (63.4175, 10.4025)
+        ```
+    """
+    return (
+        round((math.floor(float(latitude) / WEATHER_TILE_SIZE) + 0.5) * WEATHER_TILE_SIZE, 4),
+        round((math.floor(float(longitude) / WEATHER_TILE_SIZE) + 0.5) * WEATHER_TILE_SIZE, 4),
+    )
+
+
+
+def get_weather(latitude: float, longitude: float) -> dict:
+    """
+    Get the forecast for a position, from the cache if the forecast of its tile is still fresh.
+    Forecasts are fresh until the Expires header of the response (between WEATHER_CACHE_MIN_TTL
+    and WEATHER_CACHE_MAX_TTL seconds, WEATHER_CACHE_TTL if the header is missing). An expired
+    forecast is revalidated with If-Modified-Since, and served for up to WEATHER_CACHE_STALE_TTL
+    seconds past its expiry if the API cannot be reached. Concurrent requests for the same
+    tile share one API request. At most WEATHER_CACHE_SIZE tiles are cached, least recently
+    used first out.
+    Args:
+        latitude (float): Latitude of the position.
+        longitude (float): Longitude of the position.
+    Returns:
+        dict: Weather data in JSON format, or None if no forecast could be fetched.
+    """
+    tile = weather_tile(latitude, longitude)
+    entry = WEATHER_CACHE.get(tile)
+    if entry is not None and entry[2] > time.monotonic():
+        _count("fresh")
+        return entry[0]
+    return refresh_tile(tile, entry)
+
+
+
+async def get_weather_async(latitude: float, longitude: float) -> dict:
+    """
+    Awaitable variant of get_weather(), fetching on the asynchronous pool instead of blocking the event loop.
+    """
+    tile = weather_tile(latitude, longitude)
+    entry = WEATHER_CACHE.get(tile)
+    if entry is not None and entry[2] > time.monotonic():
+        _count("fresh")
+        return entry[0]
+    return await refresh_tile_async(tile, entry)
+
+
+
+def refresh_tile(tile: tuple[float, float], entry: tuple=None) -> dict:
+    """
+    Fetch the forecast of a tile and cache it. If another thread is already fetching it,
+    wait for its result instead.
+    Args:
+        tile (tuple): The tile, see weather_tile().
+        entry (tuple): The cached entry of the tile, used to revalidate it, or None.
+    Returns:
+        dict: Weather data in JSON format, or None if no forecast could be fetched.
+    """
+    with _refreshing_lock:
+        refresh = _refreshing.get(tile)
+        if refresh is None:
+            refresh = _refreshing[tile] = Future()
+            owner = True
+        else:
+            owner = False
+    if not owner:
+        _count("joined")
+        return refresh.result()
+
+    try:
+        weather = _store(tile, entry, *_get_weather(tile[0], tile[1], None if entry is None else entry[1]))
+        refresh.set_result(weather)
+        return weather
+    except Exception as e:
+        logger.error(f"Error refreshing weather data: {e}")
+        refresh.set_result(None)
+        return None
+    finally:
+        with _refreshing_lock:
+            _refreshing.pop(tile, None)
+        if not refresh.done():
+            # The fetch was cancelled, e.g. with the request awaiting it.
+            refresh.set_result(None)
+
+
+
+async def refresh_tile_async(tile: tuple[float, float], entry: tuple=None) -> dict:
+    """
+    Awaitable variant of refresh_tile(). Shares in-flight fetches with refresh_tile().
+    """
+    with _refreshing_lock:
+        refresh = _refreshing.get(tile)
+        if refresh is None:
+            refresh = _refreshing[tile] = Future()
+            owner = True
+        else:
+            owner = False
+    if not owner:
+        _count("joined")
+        return await asyncio.wrap_future(refresh)
+
+    try:
+        weather = _store(tile, entry, *await _get_weather_async(tile[0], tile[1], None if entry is None else entry[1]))
+        refresh.set_result(weather)
+        return weather
+    except Exception as e:
+        logger.error(f"Error refreshing weather data: {e}")
+        refresh.set_result(None)
+        return None
+    finally:
+        with _refreshing_lock:
+            _refreshing.pop(tile, None)
+        if not refresh.done():
+            # The fetch was cancelled, e.g. with the request awaiting it.
+            refresh.set_result(None)
+
+
+
+def _store(tile: tuple[float, float], entry: tuple, status: int, weather: dict, headers: dict) -> dict:
+    """
+    Internal function caching the fetched or revalidated forecast of a tile.
+    Returns the cached forecast if the fetch failed and the tile has one.
+    """
+    if status == 304:
+        _count("revalidated")
+        weather = entry[0]
+    elif status == 200:
+        _count("fetched")
+    elif entry is not None:
+        _count("stale")
+        return entry[0]
+    else:
+        _count("errors")
         return None
+
+    ttl = _freshness(headers)
+    last_modified = headers.get("Last-Modified") or (None if entry is None else entry[1])
+    WEATHER_CACHE.set(tile, (weather, last_modified, time.monotonic() + ttl), ttl=ttl + WEATHER_CACHE_STALE_TTL)
+    return weather
+
+
+
+def _freshness(headers: dict) -> float:
+    """
+    Internal function computing how many seconds a response stays fresh from its Expires
+    and Date headers, bounded by WEATHER_CACHE_MIN_TTL and WEATHER_CACHE_MAX_TTL.
+    """
+    expires = _http_date(headers.get("Expires"))
+    if expires is None:
+        return WEATHER_CACHE_TTL
+    date = _http_date(headers.get("Date")) or datetime.now(timezone.utc)
+    return min(max((expires - date).total_seconds(), WEATHER_CACHE_MIN_TTL), WEATHER_CACHE_MAX_TTL)
+
+
+
+def _http_date(value: str) -> datetime:
+    """
+    Internal function parsing an HTTP date header, or returning None if it is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+
+
+def prefetch_tiles(budget: int=None, ahead: float=None) -> dict:
+    """
+    Refresh the forecasts of the tiles holding scooters before they expire, so the weather
+    check of an unlock is served from the cache. Tiles without a forecast come first, then
+    the ones expiring soonest, and among those the ones holding the most scooters.
+    Forecasts still fresh for more than `ahead` seconds are left alone, and at most `budget`
+    tiles are refreshed per call, so the API is never sent more than `budget` requests at once;
+    the remaining tiles are refreshed by later calls or on demand.
+    Args:
+        budget (int): Maximum number of API requests, defaults to WEATHER_PREFETCH_BUDGET.
+        ahead (float): Refresh forecasts expiring within this many seconds, defaults to WEATHER_PREFETCH_AHEAD.
+    Returns:
+        dict: Number of tiles holding scooters, tiles due for a refresh, tiles refreshed and tiles
+        whose refresh failed or which were left for later because of the budget.
+    Example:
+        ```python
+        prefetch_tiles() -> {"tiles": 38, "due": 6, "refreshed": 6, "failed": 0, "deferred": 0}
+        ```
+    """
+    budget = WEATHER_PREFETCH_BUDGET if budget is None else budget
+    ahead = WEATHER_PREFETCH_AHEAD if ahead is None else ahead
+
+    scooters = {}
+    for _, latitude, longitude, _ in database.db().get_all_scooters():
+        if latitude is not None and longitude is not None:
+            tile = weather_tile(latitude, longitude)
+            scooters[tile] = scooters.get(tile, 0) + 1
+    if len(scooters) > WEATHER_CACHE_SIZE:
+        logger.warning(f"{len(scooters)} weather tiles hold scooters, but only {WEATHER_CACHE_SIZE} are cached")
+
+    now = time.monotonic()
+    due = []
+    for tile, count in scooters.items():
+        cached = WEATHER_CACHE.peek(tile)
+        entry = None if cached is None else cached[0]
+        fresh_for = -math.inf if entry is None else entry[2] - now
+        if fresh_for < ahead:
+            due.append((fresh_for, -count, tile, entry))
+    due.sort(key=lambda item: item[:2])
+
+    refreshed = failed = 0
+    for _, _, tile, entry in due[:budget]:
+        if refresh_tile(tile, entry) is None:
+            failed += 1
+        else:
+            refreshed += 1
+    return {
+        "tiles":     len(scooters),
+        "due":       len(due),
+        "refreshed": refreshed,
+        "failed":    failed,
+        "deferred":  max(len(due) - budget, 0),
+    }
+
+
+
+def start_weather_prefetcher(interval: float=None) -> None:
+    """
+    Start the background job running prefetch_tiles() every WEATHER_PREFETCH_INTERVAL seconds.
+    Requires the db client to be initialized. The job is not started if the weather check is
+    disabled or WEATHER_API_URL is not set.
+    Args:
+        interval (float): Seconds between runs, defaults to WEATHER_PREFETCH_INTERVAL.
+            The job is not started if it is 0.
+    """
+    global _prefetcher
+    interval = WEATHER_PREFETCH_INTERVAL if interval is None else interval
+    if interval <= 0 or DISABLE_WEATHER or WEATHER_API_URL is None:
+        return
+    if _prefetcher is None:
+        _prefetcher = periodic_task("weather-prefetcher", interval, prefetch_tiles)
+    _prefetcher.start()
+
+
+
+def stop_weather_prefetcher(timeout: float=None) -> None:
+    """
+    Stop the background job started by start_weather_prefetcher(), if it is running.
+    Args:
+        timeout (float): Seconds to wait for the current run to finish.
+    """
+    if _prefetcher is not None:
+        _prefetcher.stop(timeout=timeout)
+
+
+
+def _current(weather: dict) -> dict:
+    """
+    Internal function returning the instant details of the latest timestep which has started,
+    since a cached forecast may have been fetched several timesteps ago.
+    """
+    timeseries = weather["properties"]["timeseries"]
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    current = timeseries[0]
+    for step in timeseries[1:]:
+        if step.get("time", "") > now:
+            break
+        current = step
+    return current["data"]["instant"]["details"]
+
+
+
+def _count(counter: str) -> None:
+    """
+    Internal function incrementing a cache counter.
+    """
+    with _counters_lock:
+        _counters[counter] += 1
+
+
+
+def cache_stats() -> dict:
+    """
+    Get the weather cache statistics.
+    Returns:
+        dict: Lookups served fresh from the cache, forecasts fetched, revalidated (304) and
+        served stale because the API could not be reached, lookups which failed, lookups which
+        waited for another request's fetch, and the statistics of the cache itself.
+    Example:
+        ```python
+        cache_stats() -> {"fresh": 4120, "fetched": 14, "revalidated": 31, "stale": 0, "errors": 0, "joined": 3, "cache": {...}}
+        ```
+    """
+    with _counters_lock:
+        stats = dict(_counters)
+    stats["cache"] = WEATHER_CACHE.stats()
+    return stats
+
+
+
+def stats() -> dict:
+    """
+    Get the weather statistics.
+    Returns:
+        dict: The cache statistics, see cache_stats(), the API client statistics, including
+        the latency percentiles of the requests, see http_client.stats(), and the prefetcher
+        job statistics (None if it has not been started).
+    """
+    return {
+        "cache":      cache_stats(),
+        "api":        WEATHER_CLIENT.stats(),
+        "prefetcher": None if _prefetcher is None else _prefetcher.stats(),
+    }
         
             
 
@@ -57,7 +470,7 @@ def is_weather_ok(latitude: float, longtitude: float) -> tuple[bool, str, str]:
     Check if the weather conditions are acceptable for scooter usage.
     Wether conditions are considered acceptable if the temperature is above the
     threshold set in the environment variable WEATHER_TEMPERATURE_THRESHOLD.
-    The temperature is fetched from the MET API.
+    The temperature is fetched from the MET API, see get_weather() for how forecasts are cached.
     Args:
         latitude (float): Latitude of the location.
         longtitude (float): Longtitude of the location.
@@ -75,12 +488,29 @@ def is_weather_ok(latitude: float, longtitude: float) -> tuple[bool, str, str]:
     if DISABLE_WEATHER:
         return True, "weather check disabled", ""
     
-    weather = _get_weather(latitude, longtitude)
+    return _check(get_weather(latitude, longtitude))
+
+
+
+async def is_weather_ok_async(latitude: float, longtitude: float) -> tuple[bool, str, str]:
+    """
+    Awaitable variant of is_weather_ok() for the HTTP handlers.
+    """
+    if DISABLE_WEATHER:
+        return True, "weather check disabled", ""
+
+    return _check(await get_weather_async(latitude, longtitude))
 
+
+
+def _check(weather: dict) -> tuple[bool, str, str]:
+    """
+    Internal function checking the conditions of a forecast, see is_weather_ok().
+    """
     if weather is None:
         return False, "error fetching weather data", "bad-weather"
 
-    stats       = weather["properties"]["timeseries"][0]["data"]["instant"]["details"]
+    stats       = _current(weather)
     temperature = float(stats["air_temperature"])
     humidity    = float(stats["relative_humidity"])
 
@@ -0,0 +1,10 @@
+-- Composite indexes for the active-rental lookups.
+-- (user_id, is_active) and (scooter_id, is_active) cover the COUNT(*) checks in
+-- user_has_active_rental(), scooter_has_active_rental() and claim_scooter(), and turn
+-- get_active_rental_by_user()/_by_scooter() into single-row index lookups instead of a
+-- scan over every rental the user or scooter ever had.
+-- (is_active, end_time) serves get_active_rentals() and the rental archiver.
+
+CREATE INDEX rentals_user_active ON rentals (user_id, is_active);
+CREATE INDEX rentals_scooter_active ON rentals (scooter_id, is_active);
+CREATE INDEX rentals_active_end ON rentals (is_active, end_time);
@@ -0,0 +1,5 @@
+-- Covering index for scooter lookups by status and position.
+-- Together with the primary key (uuid) it holds every scooter column, so queries
+-- filtering on status, optionally with a latitude range, are answered from the index.
+
+CREATE INDEX scooters_status_position ON scooters (status, latitude, longtitude);
@@ -0,0 +1,61 @@
+-- SQLite schema used by the sqlite and memory database backends (DB_BACKEND).
+-- Mirrors sql/database-export.sql. Applied on every start, so all statements are idempotent.
+
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    funds REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS scooters (
+    uuid INTEGER PRIMARY KEY AUTOINCREMENT,
+    latitude REAL NOT NULL,
+    longtitude REAL NOT NULL,
+    status INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS rentals (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE ON UPDATE CASCADE,
+    scooter_id INTEGER NOT NULL REFERENCES scooters (uuid) ON DELETE CASCADE ON UPDATE CASCADE,
+    is_active INTEGER NOT NULL,
+    start_time timestamp NULL DEFAULT NULL,
+    end_time timestamp NULL DEFAULT NULL,
+    total_price REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rentals_user_id ON rentals (user_id);
+CREATE INDEX IF NOT EXISTS rentals_scooter_id ON rentals (scooter_id);
+
+CREATE TABLE IF NOT EXISTS multisession (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    start_time timestamp NULL DEFAULT NULL,
+    end_time timestamp NULL DEFAULT NULL,
+    isActive INTEGER DEFAULT NULL,
+    longtitude REAL NOT NULL,
+    latitude REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS corider (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    scooter_id INTEGER NOT NULL REFERENCES scooters (uuid) ON DELETE CASCADE,
+    session_id INTEGER NOT NULL REFERENCES multisession (id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS corider_user_id ON corider (user_id);
+CREATE INDEX IF NOT EXISTS corider_scooter_id ON corider (scooter_id);
+CREATE INDEX IF NOT EXISTS corider_session_id ON corider (session_id);
+
+-- Unpartitioned counterpart of the MySQL rentals_archive table.
+CREATE TABLE IF NOT EXISTS rentals_archive (
+    id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    scooter_id INTEGER NOT NULL,
+    start_time timestamp NULL DEFAULT NULL,
+    end_time timestamp NOT NULL,
+    total_price REAL NOT NULL,
+    archived_at timestamp NOT NULL,
+    PRIMARY KEY (id, end_time)
+);
+CREATE INDEX IF NOT EXISTS rentals_archive_user_id ON rentals_archive (user_id, end_time);
+CREATE INDEX IF NOT EXISTS rentals_archive_scooter_id ON rentals_archive (scooter_id, end_time);
@@ -0,0 +1,15 @@
+-- Sample users and scooters loaded into an empty sqlite or memory database (DB_SQLITE_SEED).
+-- Same rows as the test database in sql/database-export.sql.
+
+INSERT INTO users (id, name, funds) VALUES
+(1, 'John Appleseed', 450.0),
+(2, 'Kari Nordmann', 600.0),
+(3, 'Albert Einstein', 75.5);
+
+INSERT INTO scooters (uuid, latitude, longtitude, status) VALUES
+(1, 63.4197, 10.4018, 0),
+(2, 63.4153, 10.3995, 0),
+(3, 63.4197, 10.4018, 1),
+(4, 63.4197, 10.4018, 2),
+(5, 63.4197, 10.4018, 3),
+(6, 63.4197, 10.4018, 11);
@@ -7,6 +7,7 @@ from datetime import datetime
 from api import database
 from logic import transaction
 from tools.singleton import singleton
+from tools.incident_log import INCIDENT_LOG
 
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -35,7 +36,7 @@ class internal_service:
             scooter_id (int): The ID of the scooter.
             payload (dict): The payload data from the scooter upon abort alert.
         """
-        self._logger.warning(f"Session aborted for scooter {scooter_id}: {self._status_codes[str(payload['status'])]}")
+        INCIDENT_LOG.report("session aborted", culprit="scooter", scooter_id=scooter_id, message=self._status_codes[str(payload['status'])], resp=f"status code: {payload['status']}")
 
         rental = self._parse_rental(self._db.get_active_rental_by_scooter(scooter_id))
         user   = self._parse_user(self._db.get_user(rental['user_id']))
@@ -61,7 +62,7 @@ class internal_service:
         """
         Handle the cause of the session abort.
         This function is called when the scooter session is aborted.
-        If the abort is due to distress, it will log the event and contact emergency services.
+        If the abort is due to distress, it will report a critical incident and contact emergency services.
         Args:
             status (int): The status code of the scooter.
             user (dict): The user data from the database.
@@ -71,14 +72,19 @@ class internal_service:
             lon (float): The longitude of the scooter location.
         """
         if self._status_codes[str(status)] == "distress":
-            self._logger.critical("Session aborted due to distress alert:")
-            self._logger.critical(f"\tUser: {user['name']}")
-            self._logger.critical(f"\tScooter: {scooter}")
-            self._logger.critical(f"\tTime: {datetime.fromtimestamp(time.time())}")
-            self._logger.critical(f"\tLocation:")
-            self._logger.critical(f"\t\tLatitude:  {lat}")
-            self._logger.critical(f"\t\tLongitude: {lon}")
-            self._logger.critical(f"Contacting emergency services...")
+            INCIDENT_LOG.report(
+                "session aborted due to distress alert",
+                culprit="scooter",
+                user_id=user["id"],
+                scooter_id=scooter,
+                message="contacting emergency services",
+                location={"lat": lat, "lon": lon},
+                rental_id=rental["rental_id"],
+                user_name=user["name"],
+                level=logging.CRITICAL
+            )
+            # Distress alerts are also kept on the application log.
+            self._logger.critical(f"Session aborted due to distress alert: user {user['name']}, scooter {scooter}, location {lat}, {lon}. Contacting emergency services...")
 
 
 
@@ -1,19 +1,391 @@
+import os
+import time
+import json
+import asyncio
 import logging
+from concurrent.futures import Future, wait
 
 from api import mqtt, database
 from tools.singleton import singleton
 from logic import transaction, weather
+from service import scooter_commands
+from tools.actor import mailbox_full
+from tools.incident_log import INCIDENT_LOG
 
 
 
+DISABLE_MQTT = os.getenv("DISABLE_MQTT", "False").lower() == "true"
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCOOTER_STATUS_CODES_PATH = os.path.join(BASE_DIR, "resources/scooter-status-codes.json")
+MULTI_RIDE_MAX_RIDERS   = int(os.getenv("MULTI_RIDE_MAX_RIDERS", 10))
+MULTI_RIDE_MQTT_TIMEOUT = float(os.getenv("MULTI_RIDE_MQTT_TIMEOUT", 20.0))
+MULTI_RIDE_MIN_FUNDS    = 100.0
+
+# Failed claims of claim_group() and the redirect of the error page to show.
+CLAIM_ERRORS = {
+    "scooter-not-found":   ("database: scooter not found", "scooter-not-found"),
+    "user-not-found":      ("database: user not found", "user-not-found"),
+    "user-occupied":       ("user has active rental", "user-occupied"),
+    "scooter-occupied":    ("scooter is already rented", "scooter-occupied"),
+    "scooter-unavailable": ("scooter is unavailable", "scooter-inoperable"),
+    "rental-error":        ("database error: rentals not started", "rental-error"),
+}
 
 @singleton
 class multi_ride_service:
     """
     This class handles the multi-ride service for the scooter.
     It is responsible for handling the multi-ride requests and responses.
+    In a group ride (co-ride) one leader unlocks a scooter for every rider of the group.
+    The riders are validated with one batched query, all rentals are started in a single
+    transaction and the unlock commands are sent to all scooters at the same time, each
+    on its scooter's command actor. If any scooter does not confirm the unlock within
+    MULTI_RIDE_MQTT_TIMEOUT seconds, the whole group is rolled back: the rentals are
+    removed and the scooters which did unlock are locked again.
+    When the leader ends the ride, all scooters are locked at the same time and every
+    rider pays the co-ride price.
     """
     def __init__(self):
         self._logger = logging.getLogger(__name__)
         self._db = database.db()
-        self._mqtt = mqtt.mqtt_client()
+        self._mqtt = None if DISABLE_MQTT else mqtt.mqtt_client()
+        with open(SCOOTER_STATUS_CODES_PATH, 'r') as f:
+            self._status_codes = json.load(f)
+
+
+
+    def unlock_group(self, leader_id: int, rides: list[tuple[int, int]]) -> tuple[bool, str, str, dict]:
+        """
+        Unlock a scooter for every rider of a group.
+        Args:
+            leader_id (int): The ID of the user leading the group. Must be one of the riders.
+            rides (list): Tuples of (user_id, scooter_id), one per rider.
+        Returns:
+            tuple:
+                * [0]: (bool) True if all scooters were unlocked, False otherwise.
+                * [1]: (str) A message indicating the result of the operation.
+                * [2]: (str) The redirect of the error page, "" on success.
+                * [3]: (dict) The group ride on success, otherwise None.
+        Example:
+        ```python
+            self.unlock_group(1, [(1, 2), (4, 3)]) -> (True, "group unlock successful", "", {
+                "session_id": 12,
+                "leader_id": 1,
+                "rides": [{"user_id": 1, "scooter_id": 2, "rental_id": 228}, {"user_id": 4, "scooter_id": 3, "rental_id": 229}]
+            })
+            self.unlock_group(1, [(1, 2), (5, 3)]) -> (False, "insufficient funds - user: 5", "insufficient-funds", None)
+        ```
+        """
+        self._db.ensure_connection()
+        rides = [(int(user_id), int(scooter_id)) for user_id, scooter_id in rides]
+        leader_id = int(leader_id)
+
+        invalid = self._validate_group(leader_id, rides)
+        if invalid is not None:
+            INCIDENT_LOG.report("group unlock failed", culprit="request", user_id=leader_id, message=invalid, rides=rides)
+            return False, invalid, "invalid-group", None
+
+        user_ids = [user_id for user_id, _ in rides]
+        riders = {rider[0]: rider for rider in self._db.get_riders(user_ids)}
+        for user_id in user_ids:
+            if user_id not in riders:
+                INCIDENT_LOG.report("group unlock failed", culprit="database", user_id=user_id, message="user error: user not found", function=f"get_riders({user_ids})", leader_id=leader_id)
+                return False, f"database: user {user_id} not found", "user-not-found", None
+            if riders[user_id][3] > 0:
+                INCIDENT_LOG.report("group unlock failed", culprit="database", user_id=user_id, message="rental error: user has active rental", function=f"get_riders({user_ids})", leader_id=leader_id)
+                return False, f"user {user_id} has active rental", "user-occupied", None
+            funds = transaction.validate_funds(self._parse_user(riders[user_id]), MULTI_RIDE_MIN_FUNDS)
+            if not funds[0]:
+                INCIDENT_LOG.report(
+                    "group unlock failed",
+                    culprit="transactions",
+                    user_id=user_id,
+                    message="transaction error: insufficient funds",
+                    function=f"validate_funds({user_id}, {MULTI_RIDE_MIN_FUNDS})",
+                    resp=funds[1],
+                    transaction={"price": MULTI_RIDE_MIN_FUNDS, "funds": riders[user_id][2]},
+                    leader_id=leader_id
+                )
+                return False, f"{funds[1]} - user: {user_id}", funds[2], None
+
+        scooters = {scooter[0]: self._parse_scooter(scooter) for scooter in self._db.get_scooters([scooter_id for _, scooter_id in rides])}
+        leader_scooter = scooters.get(next(scooter_id for user_id, scooter_id in rides if user_id == leader_id))
+        if leader_scooter is not None:
+            weather_req = self._check_weather(leader_scooter["latitude"], leader_scooter["longtitude"])
+            if not weather_req[0]:
+                INCIDENT_LOG.report(
+                    "group unlock failed",
+                    culprit="weather",
+                    user_id=leader_id,
+                    scooter_id=leader_scooter["uuid"],
+                    message="weather error: weather is not ok",
+                    resp=weather_req[1],
+                    location={"lat": leader_scooter["latitude"], "lon": leader_scooter["longtitude"]}
+                )
+                return False, weather_req[1], weather_req[2], None
+
+        claim, culprit, session_id, rental_ids = self._db.claim_group(leader_id, rides)
+        if claim:
+            message, redirect = CLAIM_ERRORS[claim]
+            INCIDENT_LOG.report("group unlock failed", culprit="database", user_id=leader_id, message=f"claim error: {claim} {culprit}", function=f"claim_group({leader_id}, {rides})")
+            return False, message if culprit is None else f"{message}: {culprit}", redirect, None
+
+        results, futures = self._fan_out(
+            {scooter_id: scooters[scooter_id] for _, scooter_id in rides},
+            "scooter_unlock_single",
+            user_ids
+        )
+        failed = {scooter_id: result for scooter_id, result in results.items() if result is None or not result[0]}
+
+        if failed:
+            self._db.release_group(session_id, rental_ids)
+            self._relock(futures, scooters, user_ids)
+            scooter_id, result = next(iter(failed.items()))
+            if result is None:
+                message, redirect = "timeout waiting for unlock confirmation", "scooter-inoperable"
+            else:
+                message, redirect = self._status_codes.get(str(result[1]), str(result[1])), result[2]
+            INCIDENT_LOG.report(
+                "group unlock failed",
+                culprit="mqtt",
+                user_id=leader_id,
+                scooter_id=scooter_id,
+                message="mqtt error: group unlock rolled back",
+                resp=message,
+                session_id=session_id,
+                failed=sorted(failed)
+            )
+            return False, f"scooter {scooter_id}: {message}", redirect, None
+
+        return True, "group unlock successful", "", {
+            "session_id": session_id,
+            "leader_id": leader_id,
+            "rides": [
+                {"user_id": user_id, "scooter_id": scooter_id, "rental_id": rental_id}
+                for (user_id, scooter_id), rental_id in zip(rides, rental_ids)
+            ]
+        }
+
+
+
+    def lock_group(self, session_id: int, user_id: int) -> tuple[bool, str, dict]:
+        """
+        End a group ride. The price is computed and the riders' funds are checked first; if a
+        rider cannot pay, no scooter is locked. Then all scooters are locked at the same time;
+        only if every scooter confirms the lock are the rentals ended, the riders charged the
+        checked price and the group closed. Otherwise the group stays active and the lock can be retried.
+        Args:
+            session_id (int): The ID of the group ride.
+            user_id (int): The ID of the user ending the ride. Must be the leader.
+        Returns:
+            tuple:
+                * [0]: (bool) True if the group ride was ended, False otherwise.
+                * [1]: (str) A message indicating the result of the operation.
+                * [2]: (dict) The completed group ride on success, otherwise None.
+        Example:
+        ```python
+            self.lock_group(12, 1) -> (True, "group lock successful", {"session_id": 12, "price": 120.0, "minutes": 12.0, "rides": [...]})
+            self.lock_group(12, 4) -> (False, "only the group leader can end the ride", None)
+        ```
+        """
+        self._db.ensure_connection()
+        session = self._db.get_group_session(session_id)
+        if session is None:
+            return False, "database: group ride not found", None
+        if not session[4]:
+            return False, "group ride is not active", None
+        if int(session[1]) != int(user_id):
+            return False, "only the group leader can end the ride", None
+
+        rides = self._db.get_group_rides(session_id)
+        if not rides or any(rental_id is None for _, _, rental_id in rides):
+            INCIDENT_LOG.report("group lock failed", culprit="database", user_id=user_id, message="rental error: rentals not found", function=f"get_group_rides({session_id})", session_id=session_id, level=logging.ERROR)
+            return False, "database: rentals of group ride not found", None
+
+        user_ids = [user_id for user_id, _, _ in rides]
+        scooters = {scooter[0]: self._parse_scooter(scooter) for scooter in self._db.get_scooters([scooter_id for _, scooter_id, _ in rides])}
+        if len(scooters) != len(rides):
+            return False, "database: scooter not found", None
+
+        # The riders are charged for the ride up to now, and their funds are checked before
+        # any scooter is locked: a group which cannot pay keeps riding instead of being
+        # locked with its rentals still running.
+        minutes = abs(time.time() - session[2].timestamp()) / 60.0
+        users = [self._parse_user(rider) for rider in self._db.get_riders(user_ids)]
+        price = transaction.pay_for_coride_ride(users, minutes, len(users) - 1)
+        if not price[0]:
+            INCIDENT_LOG.report(
+                "group lock failed",
+                culprit="transactions",
+                user_id=user_id,
+                message="transaction error: transaction failed",
+                resp=price[1],
+                transaction={"price": price[2], "funds": [user["funds"] for user in users]},
+                session_id=session_id
+            )
+            return False, price[1], None
+
+        results, _ = self._fan_out(scooters, "scooter_lock_single", user_ids)
+        failed = {scooter_id: result for scooter_id, result in results.items() if result is None or not result[0]}
+        if failed:
+            scooter_id, result = next(iter(failed.items()))
+            message = "timeout waiting for lock confirmation" if result is None else str(result[1])
+            INCIDENT_LOG.report(
+                "group lock failed",
+                culprit="mqtt",
+                user_id=user_id,
+                scooter_id=scooter_id,
+                message="mqtt error: group lock failed",
+                resp=message,
+                session_id=session_id,
+                failed=sorted(failed)
+            )
+            return False, f"scooter {scooter_id}: {message}", None
+
+        if not self._db.group_completed(session_id, rides, price[2]):
+            return False, "database error: group ride not completed", None
+        self._db.update_scooter_statuses([(scooter_id, result[2] if len(result) > 2 and result[2] is not None else 0) for scooter_id, result in results.items()])
+
+        return True, "group lock successful", {
+            "session_id": int(session_id),
+            "price": price[2],
+            "minutes": round(minutes, 1),
+            "rides": [
+                {"user_id": user_id, "scooter_id": scooter_id, "rental_id": rental_id}
+                for user_id, scooter_id, rental_id in rides
+            ]
+        }
+
+
+
+    async def unlock_group_async(self, leader_id: int, rides: list[tuple[int, int]]) -> tuple[bool, str, str, dict]:
+        """
+        Awaitable variant of unlock_group() for the HTTP handlers.
+        The group unlock waits on the database and on the MQTT confirmations of all
+        scooters, so it runs on a worker thread instead of the event loop.
+        """
+        return await asyncio.to_thread(self.unlock_group, leader_id, rides)
+
+
+
+    async def lock_group_async(self, session_id: int, user_id: int) -> tuple[bool, str, dict]:
+        """
+        Awaitable variant of lock_group() for the HTTP handlers.
+        """
+        return await asyncio.to_thread(self.lock_group, session_id, user_id)
+
+
+
+    def _validate_group(self, leader_id: int, rides: list[tuple[int, int]]) -> str:
+        """
+        Internal function checking the shape of a group before anything is looked up.
+        Returns:
+            str: The reason the group is invalid, or None if it is valid.
+        """
+        if len(rides) < 2:
+            return "a group ride needs at least two riders"
+        if len(rides) > MULTI_RIDE_MAX_RIDERS:
+            return f"a group ride can have at most {MULTI_RIDE_MAX_RIDERS} riders"
+        if len({user_id for user_id, _ in rides}) != len(rides):
+            return "every rider must have their own scooter"
+        if len({scooter_id for _, scooter_id in rides}) != len(rides):
+            return "a scooter can only be unlocked for one rider"
+        if leader_id not in {user_id for user_id, _ in rides}:
+            return "the group leader must be one of the riders"
+        return None
+
+
+
+    def _fan_out(self, scooters: dict, command: str, coriders: list) -> tuple[dict, dict]:
+        """
+        Internal function sending a command to several scooters at the same time.
+        Each command runs on its scooter's actor, so it is serialized with the other
+        commands for that scooter. All commands share one MULTI_RIDE_MQTT_TIMEOUT deadline.
+        Args:
+            scooters (dict): The parsed scooters by ID.
+            command (str): Name of the mqtt_client command, e.g. "scooter_unlock_single".
+            coriders (list): User IDs of the group, sent with each command.
+        Returns:
+            tuple:
+                * [0]: (dict) The result of the command per scooter ID, or None if the scooter
+                  did not answer in time, its mailbox was full or the command raised.
+                * [1]: (dict) The future of the command per scooter ID, for the commands sent.
+        """
+        if self._mqtt is None:
+            return {scooter_id: (True, "mqtt disabled", None) for scooter_id in scooters}, {}
+        func = getattr(self._mqtt, command)
+
+        futures = {}
+        for scooter_id, scooter in scooters.items():
+            try:
+                futures[scooter_id] = scooter_commands.submit(scooter_id, func, scooter, coriders)
+            except mailbox_full as e:
+                self._logger.warning(f"group command not sent: {e}")
+        wait(futures.values(), timeout=MULTI_RIDE_MQTT_TIMEOUT)
+
+        return {scooter_id: self._result(futures.get(scooter_id)) for scooter_id in scooters}, futures
+
+
+
+    def _result(self, future: Future) -> tuple:
+        """
+        Internal function getting the result of a completed command.
+        Returns:
+            tuple: The result, or None if the command was not sent, has not completed or raised.
+        """
+        if future is None or not future.done() or future.cancelled() or future.exception() is not None:
+            return None
+        return future.result()
+
+
+
+    def _relock(self, futures: dict, scooters: dict, coriders: list) -> None:
+        """
+        Internal function locking the scooters of a rolled back group unlock again.
+        Scooters which confirmed the unlock are locked now; scooters which had not
+        answered in time are locked if their unlock still succeeds later.
+        Args:
+            futures (dict): The unlock commands per scooter ID, as returned by _fan_out().
+            scooters (dict): The parsed scooters by ID.
+            coriders (list): User IDs of the group.
+        """
+        def relock(scooter_id: int, future: Future) -> None:
+            result = self._result(future)
+            if result is None or not result[0]:
+                return
+            try:
+                scooter_commands.submit(scooter_id, self._mqtt.scooter_lock_single, scooters[scooter_id], coriders)
+            except mailbox_full as e:
+                self._logger.error(f"scooter {scooter_id} is unlocked without a rental, relock not sent: {e}")
+
+        for scooter_id, future in futures.items():
+            future.add_done_callback(lambda future, scooter_id=scooter_id: relock(scooter_id, future))
+
+
+
+    def _check_weather(self, latitude: float, longtitude: float) -> tuple[bool, str, str]:
+        """
+        Internal function checking the weather at the group's location.
+        Unexpected errors, e.g. a malformed response, fail the check instead of the unlock.
+        """
+        try:
+            return weather.is_weather_ok(latitude, longtitude)
+        except Exception as e:
+            self._logger.error(f"Error checking the weather: {e}")
+            return False, "error fetching weather data", "bad-weather"
+
+
+
+    def _parse_user(self, user: tuple) -> dict:
+        """
+        Internal function parsing a user row, e.g. from db.get_riders().
+        """
+        return {"id": user[0], "name": user[1], "funds": user[2]}
+
+
+
+    def _parse_scooter(self, scooter: tuple) -> dict:
+        """
+        Internal function parsing a scooter row.
+        """
+        return {"uuid": scooter[0], "latitude": scooter[1], "longtitude": scooter[2], "status": scooter[3]}
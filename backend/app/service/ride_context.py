@@ -0,0 +1,105 @@
+import time
+from types import MappingProxyType
+
+
+
+class ride_context:
+    """
+    Immutable state of a single unlock or lock request.
+    The ride services are process-wide singletons serving many requests at once, so the
+    scooter, user and rental a request works on are kept in a context owned by that
+    request instead of on the service. Attributes cannot be reassigned and the parsed
+    rows are read-only mappings; evolve() returns a new context with some fields replaced.
+
+    #### Example:
+    ```python
+    ctx = ride_context(scooter_id=2, user_id=1)
+    ctx = ctx.evolve(scooter={"uuid": 2, "latitude": 63.4153, "longtitude": 10.3995, "status": 0})
+
+    ctx.scooter["uuid"] -> 2
+    ctx.scooter["status"] = 10  # TypeError
+    ctx.user = None             # AttributeError
+    ```
+    """
+
+    __slots__ = ("scooter_id", "user_id", "scooter", "user", "rental", "rental_id", "started")
+
+    def __init__(
+            self,
+            scooter_id: int,
+            user_id: int,
+            scooter: dict=None,
+            user: dict=None,
+            rental: dict=None,
+            rental_id: int=None,
+            started: float=None
+    ) -> None:
+        """
+        Create a context.
+        Args:
+            scooter_id (int): The ID of the scooter in the request.
+            user_id (int): The ID of the user in the request.
+            scooter (dict): The parsed scooter row, once loaded.
+            user (dict): The parsed user row, once loaded.
+            rental (dict): The parsed rental row, once loaded.
+            rental_id (int): The ID of the rental claimed or ended by the request.
+            started (float): time.perf_counter() when the request started, defaults to now.
+        """
+        values = {
+            "scooter_id": scooter_id,
+            "user_id":    user_id,
+            "scooter":    _freeze(scooter),
+            "user":       _freeze(user),
+            "rental":     _freeze(rental),
+            "rental_id":  rental_id,
+            "started":    time.perf_counter() if started is None else started,
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+
+
+    def __setattr__(self, name: str, value: object) -> None:
+        raise AttributeError(f"ride_context is immutable, use evolve() to change '{name}'")
+
+
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"ride_context is immutable, cannot delete '{name}'")
+
+
+
+    def __repr__(self) -> str:
+        return f"ride_context(scooter_id={self.scooter_id!r}, user_id={self.user_id!r}, rental_id={self.rental_id!r})"
+
+
+
+    def evolve(self: object, **changes) -> "ride_context":
+        """
+        Get a copy of the context with some fields replaced.
+        Args:
+            changes: The fields to replace, e.g. scooter=..., rental_id=...
+        Returns:
+            ride_context: The new context. This context is left unchanged.
+        """
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return ride_context(**values)
+
+
+
+    def elapsed_ms(self: object) -> float:
+        """
+        Get the milliseconds since the request started.
+        """
+        return (time.perf_counter() - self.started) * 1000
+
+
+
+def _freeze(row: dict) -> MappingProxyType:
+    """
+    Internal function returning a read-only view of a copy of a parsed row.
+    """
+    if row is None or isinstance(row, MappingProxyType):
+        return row
+    return MappingProxyType(dict(row))
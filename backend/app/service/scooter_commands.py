@@ -0,0 +1,37 @@
+import os
+
+from tools.actor import actor_pool, mailbox_full
+
+
+SCOOTER_ACTOR_WORKERS = int(os.getenv("SCOOTER_ACTOR_WORKERS", 64))
+SCOOTER_MAILBOX_SIZE  = int(os.getenv("SCOOTER_MAILBOX_SIZE", 8))
+
+# Unlock, lock and abort commands, serialized per scooter UUID and run in parallel across scooters.
+scooter_actors = actor_pool("scooter", workers=SCOOTER_ACTOR_WORKERS, mailbox_size=SCOOTER_MAILBOX_SIZE)
+
+
+
+def submit(scooter_id: object, func, *args):
+    """
+    Queue a command for a scooter on its actor.
+    UUIDs arrive as strings from the HTTP paths and as numbers from MQTT, so they are
+    normalized before being used as the actor key.
+    Args:
+        scooter_id (object): The UUID of the scooter.
+        func (callable): The command, e.g. single_ride_service.unlock_scooter.
+        args: Arguments of the command.
+    Returns:
+        Future: Resolves to the result of the command.
+
+    ## Errors
+        Raises mailbox_full if SCOOTER_MAILBOX_SIZE commands are already queued for the scooter.
+    """
+    return scooter_actors.submit(str(scooter_id).strip(), func, *args)
+
+
+
+def stats() -> dict:
+    """
+    Get the scooter actor statistics, including the queue depth of the busiest scooters.
+    """
+    return scooter_actors.stats()
@@ -1,12 +1,19 @@
 import os
 import time
 import json
+import asyncio
 import logging
 from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
 from api import mqtt, database
 from tools.singleton import singleton
 from logic import weather, transaction
+from service.ride_context import ride_context
+from service import scooter_commands
+from tools.actor import mailbox_full
+from tools.metrics import metrics_registry
+from tools.incident_log import INCIDENT_LOG
 
 
 
@@ -15,6 +22,14 @@ DISABLE_MQTT    = os.getenv("DISABLE_MQTT", "False").lower() == "true"
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SCOOTER_STATUS_CODES_PATH = os.path.join(BASE_DIR, "resources/scooter-status-codes.json")
 STATUS_REDIRECT_PATH = os.path.join(BASE_DIR, "resources/status-codes-redirect.json")
+UNLOCK_CHECK_TIMEOUT = float(os.getenv("UNLOCK_CHECK_TIMEOUT", 5.0))
+UNLOCK_CHECK_WORKERS = int(os.getenv("UNLOCK_CHECK_WORKERS", 16))
+
+# Runs the weather check of an unlock while the calling thread claims the scooter.
+UNLOCK_CHECK_EXECUTOR = ThreadPoolExecutor(max_workers=UNLOCK_CHECK_WORKERS, thread_name_prefix="unlock-check")
+
+# Duration of each unlock stage, see single_ride_service.unlock_stats().
+UNLOCK_METRICS = metrics_registry()
 
 @singleton
 class single_ride_service:
@@ -23,12 +38,16 @@ class single_ride_service:
     It checks if the user has sufficient funds, if the scooter is available, and if the
     weather is ok. It also performs the necessary database operations to start and end
     the rental as well as communicating with the MQTT broker to unlock and lock the scooter.
+    The service is shared by all requests, so it holds no per-request state: each unlock
+    and lock works on its own immutable ride_context, and any number of them can run
+    concurrently on worker threads.
     """
 
 
     def __init__(self):
         self._logger = logging.getLogger(__name__)
         self._db = self.get_db_client()
+        self._adb = database.async_db(self._db)
         self._mqtt = self.get_mqtt_client()
         with open(SCOOTER_STATUS_CODES_PATH, 'r') as f:
             self._status_codes = json.load(f)
@@ -103,7 +122,7 @@ class single_ride_service:
         _rental = self._db.get_active_rental_by_user(user_id)
 
         if _rental is None:
-            self._warn_logger(
+            INCIDENT_LOG.report(
                 title="get active rental failed",
                 culprit="database",
                 user_id=user_id,
@@ -145,7 +164,7 @@ class single_ride_service:
         _rental = self._db.get_rental_by_id(rental_id)
 
         if _rental is None:
-            self._warn_logger(
+            INCIDENT_LOG.report(
                 title="get rental info failed",
                 culprit="database",
                 user_id=rental_id,
@@ -166,7 +185,7 @@ class single_ride_service:
         _rental = self._db.get_rental_by_id(rental_id)
 
         if _rental is None:
-            self._warn_logger(
+            INCIDENT_LOG.report(
                 title="get rental info failed",
                 culprit="database",
                 user_id=rental_id,
@@ -179,7 +198,7 @@ class single_ride_service:
         _scooter = self._db.get_scooter(rental['scooter_id'])
 
         if _scooter is None:
-            self._warn_logger(
+            INCIDENT_LOG.report(
                 title="get scooter info failed",
                 culprit="database",
                 message="scooter error: scooter not found",
@@ -226,7 +245,7 @@ class single_ride_service:
         _rental = self._db.get_active_rental_by_user(user_id)
 
         if _rental is None:
-            self._warn_logger(
+            INCIDENT_LOG.report(
                 title="get active rental failed",
                 culprit="database",
                 user_id=user_id,
@@ -263,7 +282,7 @@ class single_ride_service:
         _user = self._db.get_user(user_id)
 
         if _user is None:
-            self._warn_logger(
+            INCIDENT_LOG.report(
                 title="get user info failed",
                 culprit="database",
                 user_id=user_id,
@@ -306,7 +325,7 @@ class single_ride_service:
         _scooter = self._db.get_scooter(scooter_id)
 
         if _scooter is None:
-            self._warn_logger(
+            INCIDENT_LOG.report(
                 title="get scooter info failed",
                 culprit="database",
                 scooter_id=scooter_id,
@@ -326,6 +345,13 @@ class single_ride_service:
         necessary database operations to start the rental as well as communicating with
         the MQTT broker to unlock the scooter. If all checks pass, the scooter
         is unlocked and the rental is started.
+        The state of the request is kept in a ride_context, so concurrent calls do not
+        interfere with each other.
+        The weather check runs concurrently with the database claim and funds check, under a
+        combined deadline of UNLOCK_CHECK_TIMEOUT seconds, so the checks take as long as the
+        slowest of them instead of their sum. If the claim or the funds check fails, the unlock
+        fails without waiting for the weather check. The duration of every stage is logged and recorded,
+        see unlock_stats(), and the durations so far are included in the incident of a failed unlock.
         Args:
             scooter_id (int): The ID of the scooter to unlock.
             user_id (int): The ID of the user unlocking the scooter.
@@ -335,133 +361,277 @@ class single_ride_service:
                 * [1]: (str) A message indicating the result of the operation.
         """
         self._db.ensure_connection()
+        ctx = ride_context(scooter_id, user_id)
+        timings = {}
+        deadline = time.monotonic() + UNLOCK_CHECK_TIMEOUT
+
+        # The weather check only needs the scooter's position, which is read from the
+        # scooter cache, so it can start before the scooter is claimed.
+        location = self._timed(timings, "locate", self._db.get_scooter, scooter_id)
+        weather_check = None
+        if location is not None:
+            ctx = ctx.evolve(scooter=self._parse_scooter(location))
+            if weather.DISABLE_WEATHER:
+                weather_check = Future()
+                weather_check.set_result(self._measured(weather.is_weather_ok, location[1], location[2]))
+            else:
+                weather_check = UNLOCK_CHECK_EXECUTOR.submit(self._measured, self._check_weather, location[1], location[2])
 
-        _scooter = self._db.get_scooter(scooter_id)
-        _user = self._db.get_user(user_id)
+        try:
+            return self._unlock(ctx, weather_check, timings, deadline)
+        finally:
+            if weather_check is not None:
+                weather_check.cancel()
+            self._report_timings(ctx, timings)
 
-        if _scooter is None:
-            self._warn_logger(
+
+
+    def _unlock(self, ctx: ride_context, weather_check: object, timings: dict, deadline: float) -> tuple[bool, str, str]:
+        """
+        Internal function running the checks and the unlock of unlock_scooter().
+        Args:
+            ctx (ride_context): The context of the unlock request.
+            weather_check (Future): The running weather check, resolving to its result and duration, or None if the scooter was not found.
+            timings (dict): Stage durations in seconds, filled in by this function.
+            deadline (float): time.monotonic() by which the checks must have completed.
+        Returns:
+            tuple: The result of unlock_scooter().
+        """
+        scooter_id, user_id = ctx.scooter_id, ctx.user_id
+
+        # Fail fast if the weather is already known to be bad.
+        if weather_check is not None and weather_check.done():
+            weather_req = self._await_check(weather_check, deadline, None, timings, "weather")
+            if not weather_req[0]:
+                return self._weather_failed(ctx, weather_req, timings)
+
+        claim, _scooter, _user, rental_id = self._timed(timings, "claim", self._db.claim_scooter, user_id, scooter_id)
+
+        if claim == "scooter-not-found":
+            INCIDENT_LOG.report(
                 title="single scooter unlock failed",
                 culprit="database",
                 scooter_id=scooter_id,
                 message="scooter error: scooter not found",
-                function=f"get_scooter({scooter_id})"
+                function=f"claim_scooter({user_id}, {scooter_id})",
+                timings=dict(timings)
             )   
             return False, "database: scooter not found", "scooter-not-found"
-        if _user is None:
-            self._warn_logger(
+        if claim == "user-not-found":
+            INCIDENT_LOG.report(
                 title="single scooter unlock failed",
                 culprit="database",
                 user_id=user_id,
                 message="user error: user not found",
-                function=f"get_user({user_id})"
+                function=f"claim_scooter({user_id}, {scooter_id})",
+                timings=dict(timings)
             )
             return False, "database: user not found", "user-not-found"
-
-        user_has_active_rental = self._db.user_has_active_rental(user_id)
-        sctr_has_active_rental = self._db.scooter_has_active_rental(scooter_id)
-
-        if user_has_active_rental:
-            self._warn_logger(
+        if claim == "user-occupied":
+            INCIDENT_LOG.report(
                 title="single scooter unlock failed",
                 culprit="database",
                 user_id=user_id,
                 scooter_id=scooter_id,
                 message="rental error: user has active rental",
-                function=f"user_has_active_rental({user_id})"
+                function=f"claim_scooter({user_id}, {scooter_id})",
+                timings=dict(timings)
             )
             return False, "user has active rental", "user-occupied"
-        
-        if sctr_has_active_rental:
-            self._warn_logger(
+        if claim == "scooter-occupied":
+            INCIDENT_LOG.report(
                 title="single scooter unlock failed",
                 culprit="database",
                 user_id=user_id,
                 scooter_id=scooter_id,
                 message="rental error: scooter has active rental",
-                function=f"scooter_has_active_rental({scooter_id})"
+                function=f"claim_scooter({user_id}, {scooter_id})",
+                timings=dict(timings)
             )
             return False, "scooter is already rented", "scooter-occupied"
-        
+        if claim == "rental-error":
+            INCIDENT_LOG.report(
+                title="single scooter unlock failed",
+                culprit="database",
+                user_id=user_id,
+                scooter_id=scooter_id,
+                message="rental error: rental not started",
+                function=f"claim_scooter({user_id}, {scooter_id})",
+                timings=dict(timings)
+            )
+            return False, "database error: rental not started", "rental-error"
 
-        self.scooter = self._parse_scooter(_scooter)
-        self.user    = self._parse_user(_user)
+        ctx = ctx.evolve(scooter=self._parse_scooter(_scooter), user=self._parse_user(_user), rental_id=rental_id)
 
-        if self.scooter["status"] != 0:
-            parse_code = self.parse_status(self.scooter["status"])
-            self._warn_logger(
+        if claim == "scooter-unavailable":
+            parse_code = self.parse_status(ctx.scooter["status"])
+            INCIDENT_LOG.report(
                 title="single scooter unlock failed",
                 culprit="scooter",
-                user_id=self.user["id"],
-                scooter_id=self.scooter["uuid"],
+                user_id=ctx.user["id"],
+                scooter_id=ctx.scooter["uuid"],
                 message=f"scooter error: {parse_code[0]}",
-                function=f"self._db.get_scooter({scooter_id})",
-                resp=f"status code: {self.scooter['status']}",
+                function=f"claim_scooter({user_id}, {scooter_id})",
+                resp=f"status code: {ctx.scooter['status']}",
+                timings=dict(timings)
             )
             return False, parse_code[0], parse_code[1]
 
 
-        weather_req = weather.is_weather_ok(self.scooter["latitude"], self.scooter["longtitude"])
-        balance_req = transaction.validate_funds(self.user, 100.0)
+        balance_req = self._timed(timings, "funds", transaction.validate_funds, ctx.user, 100.0)
 
-
-        if not weather_req[0]:
-            self._warn_logger(
-                title="single scooter unlock failed",
-                culprit="weather",
-                user_id=self.user["id"],
-                scooter_id=self.scooter["uuid"],
-                message="weather error: weather is not ok",
-                function=f"is_weather_ok({self.scooter['latitude']}, {self.scooter['longtitude']})",
-                resp=weather_req[1],
-                location={"lat": self.scooter["latitude"], "lon": self.scooter["longtitude"]}
-            )
-            return False, weather_req[1], weather_req[2]
-        
         if not balance_req[0]:
-            self._warn_logger(
+            self._db.release_claim(ctx.rental_id)
+            INCIDENT_LOG.report(
                 title="single scooter unlock failed",
                 culprit="transactions",
-                user_id=self.user["id"],
-                scooter_id=self.scooter["uuid"],
+                user_id=ctx.user["id"],
+                scooter_id=ctx.scooter["uuid"],
                 message="transaction error: insufficient funds",
-                function=f"validate_funds({self.user['id']}, 100.0)",
+                function=f"validate_funds({ctx.user['id']}, 100.0)",
                 resp=balance_req[1],
-                transaction={"price": 100.0, "funds": self.user["funds"]}
+                transaction={"price": 100.0, "funds": ctx.user["funds"]},
+                timings=dict(timings)
             )
             return False, balance_req[1], balance_req[2]
 
+        weather_req = self._await_check(weather_check, deadline, (False, "weather check timed out", "bad-weather"), timings, "weather")
+
+        if not weather_req[0]:
+            self._db.release_claim(ctx.rental_id)
+            return self._weather_failed(ctx, weather_req, timings)
 
-        mqtt_unlock = (True, "mqtt disabled", None) if DISABLE_MQTT else self._mqtt.scooter_unlock_single(self.scooter)
-        if (mqtt_unlock[0]):
-            rental_started = self._db.rental_started(self.user["id"], self.scooter["uuid"])
-        else:
-            rental_started = False
 
-        if mqtt_unlock[0] and rental_started:
-            return True, "unlock successful", ""
-        elif not mqtt_unlock[0]:
+        mqtt_unlock = self._timed(timings, "mqtt", lambda: (True, "mqtt disabled", None) if DISABLE_MQTT else self._mqtt.scooter_unlock_single(ctx.scooter))
+
+        if not mqtt_unlock[0]:
+            self._db.release_claim(ctx.rental_id)
             parsed_status = self.parse_status(mqtt_unlock[1])
-            self._warn_logger(
+            INCIDENT_LOG.report(
                 title="single scooter unlock failed",
                 culprit="mqtt",
-                user_id=self.user["id"],
-                scooter_id=self.scooter["uuid"],
+                user_id=ctx.user["id"],
+                scooter_id=ctx.scooter["uuid"],
                 message="mqtt error: scooter unlock failed",
-                function=f"scooter_unlock_single({self.scooter['uuid']})",
-                resp=f"satus code: {mqtt_unlock[1]} - {parsed_status[0]}"
+                function=f"scooter_unlock_single({ctx.scooter['uuid']})",
+                resp=f"satus code: {mqtt_unlock[1]} - {parsed_status[0]}",
+                timings=dict(timings)
             )
             return False, parsed_status[0], parsed_status[1]
-        else:
-            self._warn_logger(
-                title="single scooter unlock failed",
-                cuplrit="database",
-                scooter_id=self.scooter["uuid"],
-                user_id=self.user["id"],
-                message="rental error: rental not started",
-                function=f"rental_started({self.user['id']}, {self.scooter['uuid']})",
-            )
-            return False, "database error: rental not started", "rental-error"
+
+        return True, "unlock successful", ""
+
+
+
+    def _check_weather(self, latitude: float, longtitude: float) -> tuple[bool, str, str]:
+        """
+        Internal function running the weather check of an unlock on a worker thread.
+        Unexpected errors, e.g. a malformed response, fail the check instead of the unlock.
+        """
+        try:
+            return weather.is_weather_ok(latitude, longtitude)
+        except Exception as e:
+            self._logger.error(f"Error checking the weather: {e}")
+            return False, "error fetching weather data", "bad-weather"
+
+
+
+    def _await_check(self, check: object, deadline: float, timeout_result: tuple, timings: dict, stage: str) -> tuple:
+        """
+        Internal function waiting for a concurrent check until the deadline.
+        The duration measured by the check is stored as a stage of the timings on the calling
+        thread, so the worker never writes to the timings.
+        Args:
+            check (Future): The check started with _measured(), or None if it was not started.
+            deadline (float): time.monotonic() by which the check must have completed.
+            timeout_result (tuple): Result to use if the check did not complete in time.
+            timings (dict): Stage durations in seconds.
+            stage (str): The stage of the check.
+        Returns:
+            tuple: The result of the check.
+        """
+        if check is None:
+            return timeout_result
+        try:
+            result, timings[stage] = check.result(timeout=max(0.0, deadline - time.monotonic()))
+            return result
+        except FutureTimeoutError:
+            check.cancel()
+            return timeout_result
+
+
+
+    def _weather_failed(self, ctx: ride_context, weather_req: tuple, timings: dict) -> tuple[bool, str, str]:
+        """
+        Internal function logging a failed weather check of an unlock, with the stage durations so far.
+        The context must hold the scooter.
+        Returns:
+            tuple: The result of unlock_scooter().
+        """
+        INCIDENT_LOG.report(
+            title="single scooter unlock failed",
+            culprit="weather",
+            user_id=ctx.user_id,
+            scooter_id=ctx.scooter_id,
+            message="weather error: weather is not ok",
+            function=f"is_weather_ok({ctx.scooter['latitude']}, {ctx.scooter['longtitude']})",
+            resp=weather_req[1],
+            location={"lat": ctx.scooter["latitude"], "lon": ctx.scooter["longtitude"]},
+            timings=dict(timings)
+        )
+        return False, weather_req[1], weather_req[2]
+
+
+
+    def _timed(self, timings: dict, stage: str, func, *args) -> object:
+        """
+        Internal function calling a function and storing its duration in seconds as a stage of the timings.
+        """
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            timings[stage] = time.perf_counter() - start
+
+
+
+    def _measured(self, func, *args) -> tuple[object, float]:
+        """
+        Internal function calling a function on a worker thread.
+        Returns:
+            tuple: The result of the function and its duration in seconds.
+        """
+        start = time.perf_counter()
+        result = func(*args)
+        return result, time.perf_counter() - start
+
+
+
+    def _report_timings(self, ctx: ride_context, timings: dict) -> None:
+        """
+        Internal function logging the stage durations of an unlock and recording them in UNLOCK_METRICS.
+        """
+        total = ctx.elapsed_ms() / 1000
+        snapshot = dict(timings)
+        for stage, seconds in list(snapshot.items()) + [("total", total)]:
+            UNLOCK_METRICS.observe(stage, seconds)
+        stages = ", ".join(f"{stage} {seconds * 1000:.1f} ms" for stage, seconds in snapshot.items())
+        self._logger.debug(f"unlock_scooter({ctx.scooter_id}, {ctx.user_id}) took {total * 1000:.1f} ms ({stages})")
+
+
+
+    def unlock_stats(self) -> dict:
+        """
+        Get the duration statistics of the unlock stages.
+        Returns:
+            dict: Per stage (locate, claim, funds, weather, mqtt and total) the number of
+            unlocks and the mean, min, max, p50, p95 and p99 duration in seconds.
+        Example:
+        ```python
+            self.unlock_stats()["weather"] -> {"calls": 120, "p50": 0.084, "p99": 0.41, ...}
+        ```
+        """
+        return UNLOCK_METRICS.snapshot()
         
 
 
@@ -473,6 +643,7 @@ class single_ride_service:
         the necessary database operations to end the rental and charge user as well as 
         communicating with the MQTT broker to lock the scooter. If all checks pass, the scooter
         is locked and the rental is ended.
+        Like unlock_scooter(), the state of the request is kept in a ride_context.
         Args:
             scooter_id (int): The ID of the scooter to lock.
             user_id (int): The ID of the user locking the scooter.
@@ -482,13 +653,14 @@ class single_ride_service:
                 * [1]: (str) A message indicating the result of the operation.
         """
         self._db.ensure_connection()
+        ctx = ride_context(scooter_id, user_id)
 
         _scooter = self._db.get_scooter(scooter_id)
         _user    = self._db.get_user(user_id)
         _rental  = self._db.get_active_rental_by_user(user_id)
 
         if _scooter is None:
-            self._warn_logger(
+            INCIDENT_LOG.report(
                 title="single scooter lock failed",
                 culprit="database",
                 scooter_id=scooter_id,
@@ -497,7 +669,7 @@ class single_ride_service:
             )   
             return False, "database: scooter not found", None
         if _user is None:
-            self._warn_logger(
+            INCIDENT_LOG.report(
                 title="single scooter lock failed",
                 culprit="database",
                 user_id=user_id,
@@ -506,7 +678,7 @@ class single_ride_service:
             )
             return False, "database: user not found", None
         if _rental is None:
-            self._warn_logger(
+            INCIDENT_LOG.report(
                 title="single scooter lock failed",
                 culprit="database",
                 user_id=user_id,
@@ -515,159 +687,286 @@ class single_ride_service:
             )
             return False, "database: rental not found", None
         
-        self.scooter = self._parse_scooter(_scooter)
-        self.user    = self._parse_user(_user)
-        self.rental  = self._parse_rental(_rental)
-        time_start = self.rental["start_time"].timestamp()
+        rental = self._parse_rental(_rental)
+        ctx = ctx.evolve(scooter=self._parse_scooter(_scooter), user=self._parse_user(_user), rental=rental, rental_id=rental["rental_id"])
+        time_start = ctx.rental["start_time"].timestamp()
         time_end   = datetime.fromtimestamp(time.time()).timestamp()
         time_diff  = abs((time_end - time_start) / 60.0)
-        mqtt_lock = (True, "mqtt disabled", 0) if DISABLE_MQTT else self._mqtt.scooter_lock_single(self.scooter)
-        price = transaction.pay_for_single_ride(self.user, time_diff)
-        db_req_payment = self._db.charge_user(self.user["id"], price[2])
+        mqtt_lock = (True, "mqtt disabled", 0) if DISABLE_MQTT else self._mqtt.scooter_lock_single(ctx.scooter)
+        price = transaction.pay_for_single_ride(ctx.user, time_diff)
+        db_req_payment = self._db.charge_user(ctx.user["id"], price[2])
 
 
         if not price[0]:
-            self._warn_logger(
+            INCIDENT_LOG.report(
                 title="single scooter lock failed",
                 culprit="transactions",
-                user_id=self.user["id"],
-                scooter_id=self.scooter["uuid"],
+                user_id=ctx.user["id"],
+                scooter_id=ctx.scooter["uuid"],
                 message="transaction error: transaction failed",
-                function=f"pay_for_single_ride({self.user['id']}, {time_diff})",
+                function=f"pay_for_single_ride({ctx.user['id']}, {time_diff})",
                 time={"start": time_start, "end": time_end, "diff": time_diff},
-                transaction={"price": price[2], "funds": self.user["funds"]},
+                transaction={"price": price[2], "funds": ctx.user["funds"]},
                 resp=mqtt_lock[1]
             )
             return False, price[1], None
         
         if not mqtt_lock[0]:
-            self._warn_logger(
+            INCIDENT_LOG.report(
                 title="single scooter lock failed",
                 culprit="mqtt",
-                user_id=self.user["id"],
-                scooter_id=self.scooter["uuid"],
+                user_id=ctx.user["id"],
+                scooter_id=ctx.scooter["uuid"],
                 message="mqtt error: scooter lock failed",
-                function=f"scooter_lock_single({self.scooter['uuid']})",
+                function=f"scooter_lock_single({ctx.scooter['uuid']})",
                 resp=mqtt_lock[1]
             )
             return False, mqtt_lock[1], None
 
 
-        rental_ended = self._db.rental_completed(self.user["id"], price[2], self.scooter["latitude"], self.scooter["longtitude"], mqtt_lock[2])
+        rental_ended = self._db.rental_completed(ctx.user["id"], price[2], ctx.scooter["latitude"], ctx.scooter["longtitude"], mqtt_lock[2])
 
 
         if rental_ended and db_req_payment:
-            return True, mqtt_lock[1], self.rental
+            return True, mqtt_lock[1], dict(ctx.rental)
         elif not rental_ended:
-            self._warn_logger(
+            INCIDENT_LOG.report(
                 title="single scooter lock failed",
                 culprit="database",
-                user_id=self.user["id"],
-                scooter_id=self.scooter["uuid"],
+                user_id=ctx.user["id"],
+                scooter_id=ctx.scooter["uuid"],
                 message="rental error: rental not completed",
-                function=f"rental_completed({self.user['id']}, {price[2]}, {self.scooter['latitude']}, {self.scooter['longtitude']}, {mqtt_lock[2]})",
+                function=f"rental_completed({ctx.user['id']}, {price[2]}, {ctx.scooter['latitude']}, {ctx.scooter['longtitude']}, {mqtt_lock[2]})",
             )
             return False, "database error: rental not completed", None
         else:
-            self._warn_logger(
+            INCIDENT_LOG.report(
                 title="single scooter lock failed",
                 culprit="database",
-                user_id=self.user["id"],
-                scooter_id=self.scooter["uuid"],
+                user_id=ctx.user["id"],
+                scooter_id=ctx.scooter["uuid"],
                 message="transaction error: transaction failed",
-                function=f"charge_user({self.user['id']}, {price[2]})"
+                function=f"charge_user({ctx.user['id']}, {price[2]})"
             )
             return False, "database error: transaction failed", None
 
 
 
-    def _warn_logger(
-            self: object, 
-            title: str, 
-            culprit: str=None,
-            user_id: int=None,
-            scooter_id: int=None,
-            message: str=None,
-            resp: str=None,
-            time: dict=None,
-            transaction: dict=None,
-            function: str=None,
-            location: dict=None
-    ):
+    async def get_active_rental_by_user_async(self, user_id: int) -> dict:
         """
-        Log a custom warning message of an incident. Just insert the parameters you want
-        to include in the log, and this function will take care of the rest.
-        
-        Args:
-            title (str): The title of the incident.
-            culprit (str): Component responsible of the incident.
-            user_id (int): ID of the user involved in the incident.
-            scooter_id (int): ID of the scooter involved in the incident.
-            message (str): A message describing the incident.
-            resp (str): The response from the component responsible for the incident.
-            time (dict): A dictionary containing the start, end, and time-diff if related to rentals.
-            transaction (dict): A dictionary containing the price and funds if related to transactions.
-            function (str): The function that caused the incident.
-            location (dict): A dictionary containing the latitude and longitude of the scooter.
+        Awaitable variant of get_active_rental_by_user() for the HTTP handlers.
+        The database lookup runs on the async database client and does not block the event loop.
+        """
+        _rental = await self._adb.get_active_rental_by_user(user_id)
 
-        Example:
-        ```python
-            user_id = 1
-            scooter_id = 1
+        if _rental is None:
+            INCIDENT_LOG.report(
+                title="get active rental failed",
+                culprit="database",
+                user_id=user_id,
+                message="rental error: rental not found",
+                function=f"get_active_rental_by_user({user_id})"
+            )
+        return _rental
 
-            time_start, time_end, time_diff = self._parse_time(self.rental["start_time"])
-            transaction_resp = transaction.pay_for_single_ride(self.user, time_diff)
 
-            price = transaction_resp[2]
 
-            self._warn_logger(
-                title="single scooter lock failed",
-                culprit="transactions",
+    async def get_rental_info_async(self, rental_id: int) -> dict:
+        """
+        Awaitable variant of get_rental_info() for the HTTP handlers.
+        The database lookup runs on the async database client and does not block the event loop.
+        """
+        _rental = await self._adb.get_rental_by_id(rental_id)
+
+        if _rental is None:
+            INCIDENT_LOG.report(
+                title="get rental info failed",
+                culprit="database",
+                user_id=rental_id,
+                message="rental error: rental not found",
+                function=f"get_rental_by_id({rental_id})"
+            )
+        return _rental
+
+
+
+    async def check_rental_status_async(self, rental_id: int) -> tuple[bool, str]:
+        """
+        Awaitable variant of check_rental_status() for the HTTP handlers.
+        The database lookups run on the async database client and do not block the event loop.
+        """
+        _rental = await self._adb.get_rental_by_id(rental_id)
+
+        if _rental is None:
+            INCIDENT_LOG.report(
+                title="get rental info failed",
+                culprit="database",
+                user_id=rental_id,
+                message="rental error: rental not found",
+                function=f"get_rental_by_id({rental_id})"
+            )
+            return False, "scooter-inoperable"
+
+        rental = self._parse_rental(_rental)
+        _scooter = await self._adb.get_scooter(rental['scooter_id'])
+
+        if _scooter is None:
+            INCIDENT_LOG.report(
+                title="get scooter info failed",
+                culprit="database",
+                message="scooter error: scooter not found",
+                function=f"get_scooter({rental['scooter_id']})"
+            )
+            return False, "scooter-inoperable"
+
+        scooter = self._parse_scooter(_scooter)
+        if scooter['status'] == 0:
+            return True, "ok"
+        else:
+            return False, self.parse_status(scooter['status'])[0]
+
+
+
+    async def get_user_info_async(self, user_id: int) -> dict:
+        """
+        Awaitable variant of get_user_info() for the HTTP handlers.
+        The database lookup runs on the async database client and does not block the event loop.
+        """
+        _user = await self._adb.get_user(user_id)
+
+        if _user is None:
+            INCIDENT_LOG.report(
+                title="get user info failed",
+                culprit="database",
                 user_id=user_id,
+                message="user error: user not found",
+                function=f"get_user({user_id})"
+            )
+            return None
+        return self._parse_user(_user)
+
+
+
+    async def get_scooter_info_async(self, scooter_id: int) -> dict:
+        """
+        Awaitable variant of get_scooter_info() for the HTTP handlers.
+        The database lookup runs on the async database client and does not block the event loop.
+        """
+        _scooter = await self._adb.get_scooter(scooter_id)
+
+        if _scooter is None:
+            INCIDENT_LOG.report(
+                title="get scooter info failed",
+                culprit="database",
                 scooter_id=scooter_id,
-                message="transaction error: transaction failed",
-                resp=transaction_resp[1],
-                time={"start": time_start, "end": time_end, "diff": time_diff},
-                transaction={"price": price, "funds": self.user["funds"]},
-                function=f"pay_for_single_ride({self.user}, {time_diff})",
-                location={"lat": self.scooter["latitude"], "lon": self.scooter["longtitude"]}
+                message="scooter error: scooter not found",
+                function=f"get_scooter({scooter_id})"
             )
+            return None
+        return self._parse_scooter(_scooter)
+
+
+
+    async def list_scooters_async(self, after_id: int=0, limit: int=100) -> dict:
+        """
+        Get a page of scooters for the HTTP list endpoint, using keyset pagination.
+        Args:
+            after_id (int): UUID of the last scooter on the previous page, 0 for the first page.
+            limit (int): Maximum number of scooters on the page.
+        Returns:
+            dict: The parsed scooters and the `after_id` of the next page, or None on the last page.
+
+        Example:
+        ```python
+            await self.list_scooters_async(0, 2) -> {
+                "items": [{"uuid": 1, ...}, {"uuid": 2, ...}],
+                "next_after_id": 2
+            }
         ```
         """
-        if culprit is not None:
-            self._logger.warning(f"{title} - {culprit}")
-        elif title is not None:
-            self._logger.warning(title)
-        else:
-            self._logger.warning("unknown error")
-
-
-        if user_id is not None:
-            self._logger.warning(f"\tuser-id: \t{user_id}")
-        if scooter_id is not None:
-            self._logger.warning(f"\tscooter-id: \t{scooter_id}")
-        if resp is not None:
-            self._logger.warning(f"\tresponse: \t{resp}")
-        if time is not None:
-            start_time_tmp = datetime.fromtimestamp(time["start"])
-            end_time_tmp   = datetime.fromtimestamp(time["end"])
-            self._logger.warning(f"\ttime:")
-            self._logger.warning(f"\t\tstart: {time['start']} \t {start_time_tmp}")
-            self._logger.warning(f"\t\tend: {time['end']} \t {end_time_tmp}")
-            self._logger.warning(f"\t\tdiff: {time['diff']}")
-        if transaction is not None:
-            self._logger.warning(f"\tprice: \t{transaction['price']}")
-            self._logger.warning(f"\tuser-funds: \t{transaction['funds']}")
-        if message is not None:
-            self._logger.warning(f"\tmessage: \t{message}")
-        if function is not None:
-            self._logger.warning(f"\tfunction: \t{function}")
-        if location is not None:
-            self._logger.warning(f"\tlocation:")
-            self._logger.warning(f"\t\tlatitude: {location['lat']}")
-            self._logger.warning(f"\t\tlongtitude: {location['lon']}")
+        _scooters = await self._adb.get_scooters_page(after_id, limit)
+        return self._page([self._parse_scooter(s) for s in _scooters], "uuid", limit)
+
+
+
+    async def list_users_async(self, after_id: int=0, limit: int=100) -> dict:
+        """
+        Get a page of users for the HTTP list endpoint, using keyset pagination.
+        Args:
+            after_id (int): ID of the last user on the previous page, 0 for the first page.
+            limit (int): Maximum number of users on the page.
+        Returns:
+            dict: The parsed users and the `after_id` of the next page, or None on the last page.
+        """
+        _users = await self._adb.get_users_page(after_id, limit)
+        return self._page([self._parse_user(u) for u in _users], "id", limit)
+
+
+
+    async def list_rentals_async(self, after_id: int=0, limit: int=100, active: bool=None) -> dict:
+        """
+        Get a page of rentals for the HTTP list endpoint, using keyset pagination.
+        Args:
+            after_id (int): ID of the last rental on the previous page, 0 for the first page.
+            limit (int): Maximum number of rentals on the page.
+            active (bool): Only list active (True) or completed (False) rentals. All rentals if None.
+        Returns:
+            dict: The parsed rentals and the `after_id` of the next page, or None on the last page.
+        """
+        _rentals = await self._adb.get_rentals_page(after_id, limit, active)
+        rentals = []
+        for _rental in _rentals:
+            rental = self._parse_rental(_rental)
+            rental["end_time"] = _rental[5]
+            rentals.append(rental)
+        return self._page(rentals, "rental_id", limit)
+
+
+
+    def _page(self, items: list, key: str, limit: int) -> dict:
+        """
+        Wrap a page of parsed rows with the cursor for the next page.
+        A page shorter than the limit is the last one. The database clamps the limit to
+        DB_PAGE_MAX, so a full page is compared with the clamped limit.
+        """
+        return {
+            "items": items,
+            "next_after_id": items[-1][key] if items and len(items) >= min(limit, database.DB_PAGE_MAX) else None
+        }
+
+
+
+    async def unlock_scooter_async(self, scooter_id: int, user_id: int) -> tuple[bool, str, str]:
+        """
+        Awaitable variant of unlock_scooter() for the HTTP handlers.
+        The unlock flow also waits on the weather API and on the MQTT confirmation from the
+        scooter, so it runs on the scooter's command actor instead of the event loop. Commands
+        for the same scooter run one at a time; if too many are queued the unlock is refused.
+        """
+        try:
+            future = scooter_commands.submit(scooter_id, self.unlock_scooter, scooter_id, user_id)
+        except mailbox_full as e:
+            self._logger.warning(f"unlock refused: {e}")
+            return False, "scooter is busy, try again", "scooter-occupied"
+        return await asyncio.wrap_future(future)
+
+
+
+    async def lock_scooter_async(self, scooter_id: int, user_id: int) -> tuple[bool, str, dict]:
+        """
+        Awaitable variant of lock_scooter() for the HTTP handlers.
+        The lock flow also waits on the MQTT confirmation from the scooter, so it runs on
+        the scooter's command actor instead of the event loop, after any queued command for
+        the same scooter. If too many are queued the lock is refused.
+        """
+        try:
+            future = scooter_commands.submit(scooter_id, self.lock_scooter, scooter_id, user_id)
+        except mailbox_full as e:
+            self._logger.warning(f"lock refused: {e}")
+            return False, "scooter is busy, try again", None
+        return await asyncio.wrap_future(future)
+
 
-    
 
     def _parse_scooter(self, scooter: dict) -> dict:
         """
@@ -0,0 +1,182 @@
+import logging
+from threading import Lock
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+
+class mailbox_full(Exception):
+    """
+    Raised when a command is submitted to an actor whose mailbox is full.
+    """
+
+
+
+class actor_pool:
+    """
+    Keyed actors: commands submitted for the same key run one at a time, in submission
+    order, while commands for different keys run in parallel on a shared thread pool.
+    An actor exists only while it has commands: its mailbox is created by the first
+    command and removed once it is empty, so idle keys cost nothing. Each mailbox holds
+    at most `mailbox_size` commands (including the running one); more are rejected
+    with mailbox_full instead of queueing without bound.
+    Commands must not submit to and wait for their own key, as that would deadlock.
+
+    #### Example:
+    ```python
+    actors = actor_pool("scooter", workers=64, mailbox_size=8)
+
+    future = actors.submit("2", service.unlock_scooter, 2, 1)   # runs now
+    actors.submit("2", service.lock_scooter, 2, 1)              # runs after the unlock
+    actors.submit("3", service.unlock_scooter, 3, 4)            # runs in parallel
+    future.result() -> (True, "unlock successful", "")
+
+    actors.depth("2") -> 1
+    actors.stats() -> {"actors": 1, "queued": 1, "submitted": 3, "rejected": 0, "depths": {"2": 1}, ...}
+    ```
+    """
+
+    def __init__(self, name: str, workers: int=32, mailbox_size: int=16) -> None:
+        """
+        Initialize the actors.
+        Args:
+            name (str): Name of the actors, used for the worker thread names and in logs.
+            workers (int): Maximum number of commands running at the same time, across all keys.
+            mailbox_size (int): Maximum number of commands per key, including the running one.
+        """
+        self.name = name
+        self.mailbox_size = mailbox_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-actor")
+        self._workers = workers
+        self._mailboxes = {}
+        self._lock = Lock()
+        self._logger = logging.getLogger(__name__)
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "max_depth": 0}
+
+
+
+    def submit(self: object, key: object, func, *args, **kwargs) -> Future:
+        """
+        Queue a command for a key.
+        Args:
+            key (object): The key, e.g. a scooter UUID. Equal keys share an actor.
+            func (callable): The command.
+            args: Arguments of the command.
+            kwargs: Keyword arguments of the command.
+        Returns:
+            Future: Resolves to the result of the command, or its exception.
+
+        ## Errors
+            Raises mailbox_full if the key already has `mailbox_size` commands.
+        """
+        future = Future()
+        with self._lock:
+            mailbox = self._mailboxes.get(key)
+            if mailbox is not None and len(mailbox) >= self.mailbox_size:
+                self._counters["rejected"] += 1
+                raise mailbox_full(f"{self.name} {key} has {len(mailbox)} commands queued")
+            self._counters["submitted"] += 1
+            if mailbox is None:
+                mailbox = self._mailboxes[key] = deque()
+                start = True
+            else:
+                start = False
+            mailbox.append((future, func, args, kwargs))
+            self._counters["max_depth"] = max(self._counters["max_depth"], len(mailbox))
+        if start:
+            self._executor.submit(self._drain, key, mailbox)
+        return future
+
+
+
+    def call(self: object, key: object, func, *args, **kwargs) -> object:
+        """
+        Run a command for a key and wait for its result, see submit().
+        Returns:
+            object: The result of the command.
+
+        ## Errors
+            Raises mailbox_full if the mailbox is full, and re-raises the exception of the command.
+        """
+        return self.submit(key, func, *args, **kwargs).result()
+
+
+
+    def _drain(self: object, key: object, mailbox: deque) -> None:
+        """
+        Internal function running the commands of one actor until its mailbox is empty.
+        A command stays in the mailbox while it runs, so it counts towards the mailbox size.
+        """
+        while True:
+            with self._lock:
+                future, func, args, kwargs = mailbox[0]
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(func(*args, **kwargs))
+                    self._count("completed")
+                except BaseException as e:
+                    self._logger.error(f"{self.name} {key}: command {getattr(func, '__name__', func)} failed: {e}")
+                    future.set_exception(e)
+                    self._count("failed")
+            with self._lock:
+                mailbox.popleft()
+                if not mailbox:
+                    del self._mailboxes[key]
+                    return
+
+
+
+    def _count(self: object, counter: str) -> None:
+        """
+        Internal function incrementing a counter.
+        """
+        with self._lock:
+            self._counters[counter] += 1
+
+
+
+    def depth(self: object, key: object) -> int:
+        """
+        Get the number of commands of a key, including the running one.
+        Args:
+            key (object): The key.
+        Returns:
+            int: The queue depth, 0 if the key has no actor.
+        """
+        with self._lock:
+            mailbox = self._mailboxes.get(key)
+            return 0 if mailbox is None else len(mailbox)
+
+
+
+    def stats(self: object, top: int=20) -> dict:
+        """
+        Get the actor statistics.
+        Args:
+            top (int): Number of deepest mailboxes to include.
+        Returns:
+            dict: Active actors, queued commands, commands submitted, completed, failed and rejected,
+            the deepest mailbox seen, and the depth of the `top` deepest current mailboxes.
+        """
+        with self._lock:
+            depths = {key: len(mailbox) for key, mailbox in self._mailboxes.items()}
+            stats = dict(self._counters)
+        deepest = sorted(depths.items(), key=lambda item: item[1], reverse=True)[:top]
+        return {
+            "workers":      self._workers,
+            "mailbox_size": self.mailbox_size,
+            "actors":       len(depths),
+            "queued":       sum(depths.values()),
+            **stats,
+            "depths":       {str(key): depth for key, depth in deepest},
+        }
+
+
+
+    def shutdown(self: object, wait: bool=True) -> None:
+        """
+        Stop accepting commands and stop the worker threads once the queued commands have run.
+        Args:
+            wait (bool): Wait for the queued commands to complete.
+        """
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,190 @@
+import time
+from threading import Lock
+from collections import OrderedDict
+
+
+
+class ttl_cache:
+    """
+    Thread-safe, size-bounded cache with per-entry expiry.
+    Entries expire `ttl` seconds after they were stored, and the least recently used
+    entry is evicted when the cache holds `max_size` entries. Hits, misses, evictions
+    and invalidations are counted and exposed through stats().
+
+    #### Example:
+    ```python
+    cache = ttl_cache(max_size=1000, ttl=10.0)
+
+    cache.get_or_load("1", lambda: db.get_scooter(1)) -> (1, 63.4197, 10.4018, 0)  # miss, loaded
+    cache.get_or_load("1", lambda: db.get_scooter(1)) -> (1, 63.4197, 10.4018, 0)  # hit
+    cache.invalidate("1")
+    cache.stats() -> {"size": 0, "hits": 1, "misses": 1, "hit_ratio": 0.5, ...}
+    ```
+    """
+
+    def __init__(self, max_size: int=1024, ttl: float=60.0) -> None:
+        """
+        Initialize an empty cache.
+        Args:
+            max_size (int): Maximum number of entries.
+            ttl (float): Default time to live of an entry in seconds.
+        """
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+
+    def get(self: object, key: object, default: object=None) -> object:
+        """
+        Get a cached value.
+        Args:
+            key (object): The cache key.
+            default (object): Returned if the key is missing or expired.
+        Returns:
+            object: The cached value, or the default.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self._misses += 1
+            return default
+
+
+
+    def peek(self: object, key: object) -> tuple[object, float]:
+        """
+        Get a value and its remaining time to live without counting a hit or miss.
+        Expired entries are returned as well, which allows serving stale data while
+        a refresh is in progress.
+        Args:
+            key (object): The cache key.
+        Returns:
+            tuple: (value, seconds until expiry, negative if expired), or None if the key is missing.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            return entry[0], entry[1] - time.monotonic()
+
+
+
+    def set(self: object, key: object, value: object, ttl: float=None) -> None:
+        """
+        Store a value, evicting the least recently used entry if the cache is full.
+        Args:
+            key (object): The cache key.
+            value (object): The value to store.
+            ttl (float): Time to live in seconds, defaults to the cache TTL.
+        """
+        with self._lock:
+            self._store(key, value, ttl)
+
+
+
+    def _store(self: object, key: object, value: object, ttl: float) -> None:
+        """
+        Internal function storing a value. The lock must be held by the caller.
+        """
+        expires = time.monotonic() + (self._ttl if ttl is None else ttl)
+        self._entries[key] = (value, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+
+
+    def get_or_load(self: object, key: object, loader, ttl: float=None) -> object:
+        """
+        Read-through lookup: return the cached value, or call the loader and cache its result.
+        None results are not cached. If the key is invalidated while the loader runs, the
+        loaded value is returned but not cached, since it may predate the invalidating write.
+        Args:
+            key (object): The cache key.
+            loader (callable): Function without arguments loading the value on a miss.
+            ttl (float): Time to live in seconds, defaults to the cache TTL.
+        Returns:
+            object: The cached or loaded value.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+            self._misses += 1
+            generation = self._generations.get(key, 0)
+
+        value = loader()
+
+        if value is not None:
+            with self._lock:
+                if self._generations.get(key, 0) == generation:
+                    self._store(key, value, ttl)
+        return value
+
+
+
+    def invalidate(self: object, key: object) -> None:
+        """
+        Remove a key from the cache, e.g. after the underlying data was written.
+        Args:
+            key (object): The cache key.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generations[key] = self._generations.get(key, 0) + 1
+            self._invalidations += 1
+            if len(self._generations) > 4 * self._max_size:
+                # Loads in flight for dropped keys may store one stale value until it expires.
+                self._generations.clear()
+
+
+
+    def clear(self: object) -> None:
+        """
+        Remove all entries from the cache.
+        """
+        with self._lock:
+            for key in self._entries:
+                self._generations[key] = self._generations.get(key, 0) + 1
+            self._entries.clear()
+
+
+
+    def stats(self: object) -> dict:
+        """
+        Get the cache statistics.
+        Returns:
+            dict: Size, capacity, hits, misses, hit ratio, evictions and invalidations.
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size":          len(self._entries),
+                "max_size":      self._max_size,
+                "hits":          self._hits,
+                "misses":        self._misses,
+                "hit_ratio":     self._hits / lookups if lookups else 0.0,
+                "evictions":     self._evictions,
+                "invalidations": self._invalidations,
+            }
@@ -0,0 +1,245 @@
+import time
+import random
+import asyncio
+import logging
+import httpx
+import requests
+from threading import Lock
+from requests.adapters import HTTPAdapter
+
+from tools.metrics import metrics_registry
+
+
+# Responses worth retrying: rate limited or a temporary server-side failure.
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+
+class http_client:
+    """
+    Pooled HTTP client with connect and read timeouts, limited retries and latency metrics.
+    Synchronous requests share a requests.Session and asynchronous requests an
+    httpx.AsyncClient, so connections are kept alive and reused instead of paying a
+    TCP and TLS handshake per request. Both pools hold at most `pool_size` connections.
+    Requests failing with a connection error, a timeout or one of RETRY_STATUSES are
+    retried up to `retries` times, after a random delay of up to `backoff` * 2^attempt
+    seconds (full jitter), so clients failing together do not retry together.
+    Responses are requested gzip-compressed and decompressed transparently.
+    The latency of every request (including its retries) and of every attempt is
+    recorded per method, see stats(); requests slower than `slow_threshold` are logged.
+
+    #### Example:
+    ```python
+    client = http_client("weather", headers={"User-Agent": "escooter/0.1"}, connect_timeout=1.0, read_timeout=3.0)
+
+    response = client.get("https://api.met.no/weatherapi/locationforecast/2.0/compact?lat=63.4175&lon=10.4025")
+    response = await client.get_async("https://api.met.no/weatherapi/locationforecast/2.0/compact?lat=63.4175&lon=10.4025")
+    response.status_code -> 200
+
+    client.stats() -> {"requests": 2, "attempts": 2, "retries": 0, "failures": 0, "latency": {"get": {"calls": 1, "p50": 0.084, ...}, ...}}
+    ```
+    """
+
+    def __init__(
+            self,
+            name: str,
+            headers: dict=None,
+            connect_timeout: float=1.0,
+            read_timeout: float=3.0,
+            retries: int=2,
+            backoff: float=0.2,
+            pool_size: int=10,
+            slow_threshold: float=None
+    ) -> None:
+        """
+        Initialize the client. The asynchronous pool is created on the first asynchronous request.
+        Args:
+            name (str): Name of the client, used in logs.
+            headers (dict): Headers sent with every request.
+            connect_timeout (float): Seconds to wait for a connection to be established.
+            read_timeout (float): Seconds to wait for the server between bytes of the response.
+            retries (int): Maximum number of retries of a failed request.
+            backoff (float): Base of the exponential retry delay in seconds.
+            pool_size (int): Maximum number of pooled connections per host.
+            slow_threshold (float): Log requests taking at least this many seconds. Disabled if None.
+        """
+        self.name = name
+        self._headers = {"Accept-Encoding": "gzip, deflate", **(headers or {})}
+        self._timeout = (connect_timeout, read_timeout)
+        self._retries = retries
+        self._backoff = backoff
+        self._pool_size = pool_size
+        self._logger = logging.getLogger(__name__)
+        self._metrics = metrics_registry(slow_threshold=slow_threshold, logger=self._logger)
+        self._counters = {"requests": 0, "attempts": 0, "retries": 0, "failures": 0}
+        self._counters_lock = Lock()
+
+        self._session = requests.Session()
+        self._session.headers.update(self._headers)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+        self._async_client = None
+        self._async_loop = None
+
+
+
+    def get(self: object, url: str, headers: dict=None) -> requests.Response:
+        """
+        Send a GET request on the synchronous pool, retrying it if it fails.
+        Args:
+            url (str): The URL.
+            headers (dict): Headers sent with this request in addition to the client headers.
+        Returns:
+            requests.Response: The response. After the last retry this may be a response with one of RETRY_STATUSES.
+
+        ## Errors
+            Raises the requests exception of the last attempt if no response was received.
+        """
+        start = time.perf_counter()
+        self._count("requests")
+        attempt = 0
+        try:
+            while True:
+                attempt_start = time.perf_counter()
+                try:
+                    response = self._session.get(url, headers=headers, timeout=self._timeout)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    self._observe("get_attempt", attempt_start, failed=True)
+                    if attempt >= self._retries:
+                        raise
+                    self._logger.debug(f"{self.name}: GET {url} failed, retrying: {e}")
+                else:
+                    self._observe("get_attempt", attempt_start, failed=response.status_code in RETRY_STATUSES)
+                    if response.status_code not in RETRY_STATUSES or attempt >= self._retries:
+                        self._observe("get", start, failed=response.status_code >= 400, detail=url)
+                        return response
+                    self._logger.debug(f"{self.name}: GET {url} returned {response.status_code}, retrying")
+                    response.close()
+                time.sleep(self._retry_delay(attempt))
+                attempt += 1
+        except Exception:
+            self._count("failures")
+            self._observe("get", start, failed=True, detail=url)
+            raise
+
+
+
+    async def get_async(self: object, url: str, headers: dict=None) -> httpx.Response:
+        """
+        Awaitable variant of get() sending the request on the asynchronous pool.
+        Args:
+            url (str): The URL.
+            headers (dict): Headers sent with this request in addition to the client headers.
+        Returns:
+            httpx.Response: The response. After the last retry this may be a response with one of RETRY_STATUSES.
+
+        ## Errors
+            Raises the httpx exception of the last attempt if no response was received.
+        """
+        client = self._get_async_client()
+        start = time.perf_counter()
+        self._count("requests")
+        attempt = 0
+        try:
+            while True:
+                attempt_start = time.perf_counter()
+                try:
+                    response = await client.get(url, headers=headers)
+                except httpx.TransportError as e:
+                    self._observe("get_async_attempt", attempt_start, failed=True)
+                    if attempt >= self._retries:
+                        raise
+                    self._logger.debug(f"{self.name}: GET {url} failed, retrying: {e}")
+                else:
+                    self._observe("get_async_attempt", attempt_start, failed=response.status_code in RETRY_STATUSES)
+                    if response.status_code not in RETRY_STATUSES or attempt >= self._retries:
+                        self._observe("get_async", start, failed=response.status_code >= 400, detail=url)
+                        return response
+                    self._logger.debug(f"{self.name}: GET {url} returned {response.status_code}, retrying")
+                await asyncio.sleep(self._retry_delay(attempt))
+                attempt += 1
+        except Exception:
+            self._count("failures")
+            self._observe("get_async", start, failed=True, detail=url)
+            raise
+
+
+
+    def _get_async_client(self: object) -> httpx.AsyncClient:
+        """
+        Internal function returning the asynchronous pool of the running event loop.
+        An httpx client is bound to the loop it was first used on, so a new one is
+        created if the client is used from another loop.
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = httpx.AsyncClient(
+                headers=self._headers,
+                timeout=httpx.Timeout(self._timeout[1], connect=self._timeout[0]),
+                limits=httpx.Limits(max_connections=self._pool_size, max_keepalive_connections=self._pool_size),
+            )
+            self._async_loop = loop
+        return self._async_client
+
+
+
+    def _retry_delay(self: object, attempt: int) -> float:
+        """
+        Internal function returning the delay before a retry, counting the retry.
+        """
+        self._count("retries")
+        return random.uniform(0, self._backoff * 2 ** attempt)
+
+
+
+    def _observe(self: object, name: str, start: float, failed: bool, detail: str=None) -> None:
+        """
+        Internal function recording the latency of a request or an attempt.
+        """
+        self._metrics.observe(name, time.perf_counter() - start, errors=1 if failed else 0, detail=detail and f" {detail}")
+        if name.endswith("_attempt"):
+            self._count("attempts")
+
+
+
+    def _count(self: object, counter: str) -> None:
+        """
+        Internal function incrementing a counter.
+        """
+        with self._counters_lock:
+            self._counters[counter] += 1
+
+
+
+    def stats(self: object) -> dict:
+        """
+        Get the client statistics.
+        Returns:
+            dict: Requests sent, attempts (including retries), retries and requests which failed
+            without a response, and per method ("get", "get_async", and their attempts) the
+            number of calls, calls with errors, slow calls and the latency percentiles.
+        """
+        with self._counters_lock:
+            counters = dict(self._counters)
+        return {**counters, "pool_size": self._pool_size, "latency": self._metrics.snapshot()}
+
+
+
+    def close(self: object) -> None:
+        """
+        Close the pooled connections of the synchronous pool.
+        """
+        self._session.close()
+
+
+
+    async def aclose(self: object) -> None:
+        """
+        Close the pooled connections of both pools.
+        """
+        self.close()
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
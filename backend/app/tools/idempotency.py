@@ -0,0 +1,121 @@
+import asyncio
+
+from tools.cache import ttl_cache
+
+
+
+class idempotency_conflict(Exception):
+    """
+    Raised when an idempotency key is reused for a different request.
+    """
+
+
+
+class idempotency_store:
+    """
+    Bounded, expiring store of request outcomes keyed by client-supplied idempotency keys.
+    The first request with a key runs; its outcome is kept for `ttl` seconds (at most
+    `max_size` keys, least recently used evicted first) and returned to every later request
+    with the same key without running it again. A request arriving while the first one is
+    still running waits for its outcome instead of running concurrently.
+    Requests are identified by a fingerprint (e.g. endpoint and parameters), so a key reused
+    for a different request is rejected instead of returning an unrelated outcome.
+    Outcomes are only stored if the request returns; if it raises, waiting duplicates get
+    the exception and the key can be retried.
+    Must be used from a single event loop.
+
+    #### Example:
+    ```python
+    store = idempotency_store(max_size=10000, ttl=86400)
+
+    result, replayed = await store.run("7f1c...", ("unlock", "2", "1"), lambda: service.unlock_scooter_async(2, 1))
+    result, replayed = await store.run("7f1c...", ("unlock", "2", "1"), lambda: service.unlock_scooter_async(2, 1))
+    replayed -> True  # the unlock ran once
+    ```
+    """
+
+    def __init__(self, max_size: int=10000, ttl: float=86400.0) -> None:
+        """
+        Initialize an empty store.
+        Args:
+            max_size (int): Maximum number of stored outcomes.
+            ttl (float): Seconds an outcome is kept.
+        """
+        self._outcomes = ttl_cache(max_size=max_size, ttl=ttl)
+        self._inflight = {}
+        self._counters = {"executed": 0, "replayed": 0, "joined": 0, "conflicts": 0, "failed": 0}
+
+
+
+    async def run(self: object, key: str, fingerprint: tuple, func) -> tuple[object, bool]:
+        """
+        Run a request once per idempotency key.
+        Args:
+            key (str): The idempotency key sent by the client.
+            fingerprint (tuple): Identifies the request, e.g. (endpoint, scooter_id, user_id).
+            func (callable): Function without arguments returning an awaitable with the outcome.
+        Returns:
+            tuple:
+                * [0]: (object) The outcome of the request.
+                * [1]: (bool) True if the outcome was stored or produced by an earlier request with the key.
+
+        ## Errors
+            Raises idempotency_conflict if the key was used for a request with another fingerprint.
+            Re-raises the exception of the request, also in duplicates waiting for it.
+        """
+        stored = self._outcomes.get(key)
+        if stored is not None:
+            self._check(key, fingerprint, stored[0])
+            self._counters["replayed"] += 1
+            return stored[1], True
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self._check(key, fingerprint, inflight[0])
+            self._counters["joined"] += 1
+            return await asyncio.shield(inflight[1]), True
+
+        # The request runs as its own task, so it completes and its outcome is stored
+        # even if the client that sent it disconnects.
+        task = asyncio.ensure_future(func())
+        self._inflight[key] = (fingerprint, task)
+        self._counters["executed"] += 1
+        task.add_done_callback(lambda task: self._finish(key, fingerprint, task))
+        return await asyncio.shield(task), False
+
+
+
+    def _finish(self: object, key: str, fingerprint: tuple, task: asyncio.Task) -> None:
+        """
+        Internal function storing the outcome of a completed request.
+        """
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            self._counters["failed"] += 1
+        else:
+            self._outcomes.set(key, (fingerprint, task.result()))
+
+
+
+    def _check(self: object, key: str, fingerprint: tuple, stored: tuple) -> None:
+        """
+        Internal function rejecting a key reused for a different request.
+        """
+        if stored != fingerprint:
+            self._counters["conflicts"] += 1
+            raise idempotency_conflict(f"Idempotency key {key!r} was used for a different request")
+
+
+
+    def stats(self: object) -> dict:
+        """
+        Get the store statistics.
+        Returns:
+            dict: Requests executed, replayed from a stored outcome, joined while in flight,
+            rejected as conflicts and failed, the number in flight, and the outcome cache statistics.
+        Example:
+            ```python
+            store.stats() -> {"executed": 120, "replayed": 7, "joined": 2, "conflicts": 0, "failed": 0, "in_flight": 1, "outcomes": {...}}
+            ```
+        """
+        return {**self._counters, "in_flight": len(self._inflight), "outcomes": self._outcomes.stats()}
@@ -0,0 +1,252 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+from threading import Lock
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+
+
+
+INCIDENT_LOG_PATH  = os.getenv("INCIDENT_LOG_PATH", None)
+INCIDENT_LOG_QUEUE = int(os.getenv("INCIDENT_LOG_QUEUE", 10000))
+
+# Typed fields of an incident record, and the type each is converted to when written.
+INCIDENT_FIELDS = {
+    "culprit": str, "user_id": int, "scooter_id": int, "rental_id": int, "session_id": int,
+    "message": str, "resp": str, "function": str, "timings": dict,
+}
+
+
+
+class incident_formatter(logging.Formatter):
+    """
+    Formats incident records as one JSON object per line.
+    Runs on the writer thread, so the fields are converted to their types here rather
+    than by the thread reporting the incident.
+
+    #### Example:
+    ```
+    {"time": "2025-04-02T10:03:11.201+00:00", "level": "WARNING", "incident": "single scooter unlock failed", "culprit": "transactions", "user_id": 1, "scooter_id": 2, "transaction": {"price": 100.0, "funds": 12.5}}
+    ```
+    """
+
+    def format(self: object, record: logging.LogRecord) -> str:
+        entry = {
+            "time":     datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level":    record.levelname,
+            "incident": record.getMessage(),
+        }
+        for name, value in getattr(record, "incident", {}).items():
+            if value is not None:
+                entry[name] = _typed(INCIDENT_FIELDS.get(name), value)
+        return json.dumps(entry, default=str)
+
+
+
+class incident_counter(logging.Handler):
+    """
+    Aggregates incident records by incident and culprit. Runs on the writer thread.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._counts = {}
+        self._counts_lock = Lock()
+
+
+    def emit(self: object, record: logging.LogRecord) -> None:
+        culprit = getattr(record, "incident", {}).get("culprit")
+        key = record.getMessage() if culprit is None else f"{record.getMessage()} - {culprit}"
+        with self._counts_lock:
+            count = self._counts.setdefault(key, {"count": 0, "last": None})
+            count["count"] += 1
+            count["last"] = record.created
+
+
+    def snapshot(self: object) -> dict:
+        with self._counts_lock:
+            return {key: dict(count) for key, count in self._counts.items()}
+
+
+
+class _incident_queue_handler(QueueHandler):
+    """
+    Queue handler which drops records instead of blocking or raising when the queue is full.
+    """
+
+    def __init__(self, records: queue.Queue) -> None:
+        super().__init__(records)
+        self.dropped = 0
+
+
+    def prepare(self: object, record: logging.LogRecord) -> logging.LogRecord:
+        # The record stays in this process and is formatted by the writer thread.
+        return record
+
+
+    def enqueue(self: object, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+
+class incident_log:
+    """
+    Structured, non-blocking log of incidents such as failed unlocks and locks.
+    Each incident is one record with typed fields (user, scooter, culprit, timings,
+    transaction, ...). Reporting an incident only puts the record on a bounded queue;
+    a background writer formats it as a JSON line and writes it to INCIDENT_LOG_PATH
+    (stderr if not set) and aggregates the incidents by type, see stats(). If the
+    queue is full, records are dropped and counted rather than blocking the caller.
+    The writer starts with the first incident and is stopped, after writing the queued
+    records, when the process exits.
+
+    #### Example:
+    ```python
+    incidents = incident_log("incidents")
+    incidents.report(
+        "single scooter unlock failed",
+        culprit="transactions",
+        user_id=1,
+        scooter_id=2,
+        message="transaction error: insufficient funds",
+        transaction={"price": 100.0, "funds": 12.5}
+    )
+    incidents.stats() -> {"written": 1, "dropped": 0, "queued": 0, "incidents": {"single scooter unlock failed - transactions": {"count": 1, ...}}}
+    ```
+    """
+
+    def __init__(self, name: str, path: str=None, queue_size: int=INCIDENT_LOG_QUEUE) -> None:
+        """
+        Initialize the incident log. Nothing is written until the first incident.
+        Args:
+            name (str): Name of the logger the incidents are reported on.
+            path (str): File the JSON lines are appended to, stderr if None.
+            queue_size (int): Maximum number of incidents waiting to be written.
+        """
+        self._path = path
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._handler = _incident_queue_handler(self._queue)
+        self._counter = incident_counter()
+        self._listener = None
+        self._start_lock = Lock()
+        self._logger = logging.getLogger(name)
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self._logger.addHandler(self._handler)
+
+
+
+    def report(
+            self: object,
+            title: str,
+            culprit: str=None,
+            user_id: int=None,
+            scooter_id: int=None,
+            message: str=None,
+            resp: str=None,
+            time: dict=None,
+            transaction: dict=None,
+            function: str=None,
+            location: dict=None,
+            level: int=logging.WARNING,
+            **fields
+    ) -> None:
+        """
+        Report an incident. Just insert the parameters you want to include in the record.
+        Args:
+            title (str): The title of the incident.
+            culprit (str): Component responsible of the incident.
+            user_id (int): ID of the user involved in the incident.
+            scooter_id (int): ID of the scooter involved in the incident.
+            message (str): A message describing the incident.
+            resp (str): The response from the component responsible for the incident.
+            time (dict): The start, end and diff of the rental, if related to rentals.
+            transaction (dict): The price and funds, if related to transactions.
+            function (str): The function that caused the incident.
+            location (dict): The latitude and longitude of the scooter.
+            level (int): The log level, e.g. logging.CRITICAL for distress alerts.
+            fields: Further fields, e.g. rental_id=228 or timings={"claim": 0.004}.
+        """
+        if not self._logger.isEnabledFor(level):
+            return
+        if self._listener is None:
+            self._start()
+        # The record is built and queued directly: Logger.log() would also look up the
+        # caller's stack frame, which costs more than the rest of the call.
+        record = logging.LogRecord(self._logger.name, level, "", 0, title, None, None)
+        record.incident = {
+            "culprit": culprit, "user_id": user_id, "scooter_id": scooter_id, "message": message,
+            "resp": resp, "time": time, "transaction": transaction, "function": function,
+            "location": location, **fields,
+        }
+        self._handler.enqueue(record)
+
+
+
+    def _start(self: object) -> None:
+        """
+        Internal function starting the writer thread.
+        """
+        with self._start_lock:
+            if self._listener is not None:
+                return
+            writer = logging.StreamHandler(sys.stderr) if self._path is None else WatchedFileHandler(self._path)
+            writer.setFormatter(incident_formatter())
+            self._listener = QueueListener(self._queue, writer, self._counter)
+            self._listener.start()
+            atexit.register(self.stop)
+
+
+
+    def stop(self: object) -> None:
+        """
+        Write the queued incidents and stop the writer thread. Incidents reported later start it again.
+        """
+        with self._start_lock:
+            if self._listener is None:
+                return
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                handler.flush()
+            self._listener = None
+
+
+
+    def stats(self: object) -> dict:
+        """
+        Get the incident statistics.
+        Returns:
+            dict: Incidents written, dropped because the queue was full and waiting to be
+            written, and the count and last time (epoch seconds) per incident and culprit.
+        """
+        incidents = self._counter.snapshot()
+        return {
+            "written":   sum(count["count"] for count in incidents.values()),
+            "dropped":   self._handler.dropped,
+            "queued":    self._queue.qsize(),
+            "incidents": incidents,
+        }
+
+
+
+def _typed(kind: type, value: object) -> object:
+    """
+    Internal function converting a field to its type, keeping the value if it does not convert.
+    """
+    if kind is None or isinstance(value, kind):
+        return value
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        return value
+
+
+
+# Incidents of the ride services.
+INCIDENT_LOG = incident_log("incidents", path=INCIDENT_LOG_PATH)
@@ -0,0 +1,443 @@
+import math
+import time
+import bisect
+import logging
+import functools
+import threading
+import types
+from contextlib import contextmanager
+
+
+# Latency bucket upper bounds in seconds: 50 us to about 2 minutes, 25% apart, so a
+# percentile read from the buckets is off by at most 25% of the true value.
+DEFAULT_BOUNDS = tuple(0.00005 * 1.25 ** i for i in range(67))
+
+
+
+class histogram:
+    """
+    Thread-safe latency histogram with exponentially growing buckets.
+    Keeps a count per bucket instead of the samples, so memory use is constant and
+    percentiles are estimated by interpolating within the bucket holding the rank.
+
+    #### Example:
+    ```python
+    h = histogram()
+    for seconds in (0.001, 0.002, 0.004, 0.100):
+        h.observe(seconds)
+    h.percentile(50) -> 0.0019
+    h.snapshot() -> {"count": 4, "mean": 0.0268, "p50": 0.0019, "p95": 0.0897, "p99": 0.0979, "max": 0.1, ...}
+    ```
+    """
+
+    def __init__(self, bounds: tuple=DEFAULT_BOUNDS) -> None:
+        """
+        Initialize an empty histogram.
+        Args:
+            bounds (tuple): Increasing bucket upper bounds. Larger values go into an overflow bucket.
+        """
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._min = math.inf
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+
+
+    def observe(self: object, value: float) -> None:
+        """
+        Record a value.
+        Args:
+            value (float): The value, e.g. a latency in seconds.
+        """
+        index = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += value
+            self._min = min(self._min, value)
+            self._max = max(self._max, value)
+
+
+
+    def percentile(self: object, p: float) -> float:
+        """
+        Estimate a percentile.
+        Args:
+            p (float): The percentile, 0 to 100.
+        Returns:
+            float: The estimated value, or None if nothing has been recorded.
+        """
+        with self._lock:
+            return self._percentile(p)
+
+
+
+    def _percentile(self: object, p: float) -> float:
+        """
+        Internal function estimating a percentile. The lock must be held by the caller.
+        """
+        if self._count == 0:
+            return None
+        rank = p / 100 * self._count
+        seen = 0
+        for index, count in enumerate(self._counts):
+            if count and seen + count >= rank:
+                low = self._bounds[index - 1] if index > 0 else 0.0
+                high = self._bounds[index] if index < len(self._bounds) else self._max
+                value = low + (high - low) * (rank - seen) / count
+                return min(max(value, self._min), self._max)
+            seen += count
+        return self._max
+
+
+
+    def snapshot(self: object) -> dict:
+        """
+        Get a summary of the recorded values.
+        Returns:
+            dict: Count, sum, mean, minimum, maximum and the 50th, 95th and 99th percentiles.
+        """
+        with self._lock:
+            return {
+                "count": self._count,
+                "sum":   self._sum,
+                "mean":  self._sum / self._count if self._count else None,
+                "min":   self._min if self._count else None,
+                "max":   self._max if self._count else None,
+                "p50":   self._percentile(50),
+                "p95":   self._percentile(95),
+                "p99":   self._percentile(99),
+            }
+
+
+
+    def buckets(self: object) -> list[tuple[float, int]]:
+        """
+        Get the cumulative bucket counts, as used by the Prometheus text format.
+        Returns:
+            list: Tuples of (upper bound, number of values at or below it), ending with (inf, count).
+        """
+        with self._lock:
+            result, total = [], 0
+            for bound, count in zip(self._bounds + (math.inf,), self._counts):
+                total += count
+                result.append((bound, total))
+            return result
+
+
+
+class _call:
+    """
+    Internal record of a tracked operation in progress.
+    """
+
+    __slots__ = ("rows", "errors", "record")
+
+    def __init__(self) -> None:
+        self.rows = 0
+        self.errors = 0
+        self.record = True
+
+
+
+class metrics_registry:
+    """
+    Collects latency histograms, row counts and error counts per operation name.
+    Operations are measured with track() or the instrument() class decorator. Code
+    running inside a tracked operation reports rows and errors with add_rows() and
+    add_error(); nested operations roll their rows and errors up into the caller.
+    Operations slower than `slow_threshold` seconds are logged as warnings.
+
+    #### Example:
+    ```python
+    registry = metrics_registry(slow_threshold=0.1)
+
+    with registry.track("get_user", detail="(1,)"):
+        row = fetch_user(1)
+        registry.add_rows(1)
+
+    registry.snapshot() -> {"get_user": {"calls": 1, "errors": 0, "rows": 1, "p50": 0.0004, ...}}
+    registry.export_prometheus("db_call") -> "# TYPE db_call_seconds histogram\\n..."
+    ```
+    """
+
+    def __init__(self, slow_threshold: float=None, logger: logging.Logger=None) -> None:
+        """
+        Initialize an empty registry.
+        Args:
+            slow_threshold (float): Log operations taking at least this many seconds. Disabled if None.
+            logger (logging.Logger): Logger for slow operations, defaults to this module's logger.
+        """
+        self.slow_threshold = slow_threshold
+        self._logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._operations = {}
+
+
+
+    def _operation(self: object, name: str) -> dict:
+        """
+        Internal function returning the statistics of an operation, creating them on first use.
+        """
+        operation = self._operations.get(name)
+        if operation is None:
+            with self._lock:
+                operation = self._operations.setdefault(name, {"histogram": histogram(), "errors": 0, "rows": 0, "slow": 0})
+        return operation
+
+
+
+    def _stack(self: object) -> list:
+        """
+        Internal function returning the stack of operations tracked on the current thread.
+        """
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+
+
+    def add_rows(self: object, rows: int) -> None:
+        """
+        Add rows read or written to the operation tracked on the current thread, if any.
+        Args:
+            rows (int): Number of rows.
+        """
+        stack = self._stack()
+        if stack and rows > 0:
+            stack[-1].rows += rows
+
+
+
+    def add_error(self: object) -> None:
+        """
+        Count an error in the operation tracked on the current thread, if any.
+        Use it for errors which are handled and therefore do not propagate out of the operation.
+        """
+        stack = self._stack()
+        if stack:
+            stack[-1].errors += 1
+
+
+
+    def observe(self: object, name: str, seconds: float, rows: int=0, errors: int=0, detail: str=None) -> None:
+        """
+        Record one execution of an operation.
+        Args:
+            name (str): Name of the operation.
+            seconds (float): Duration in seconds.
+            rows (int): Rows read or written.
+            errors (int): Errors encountered.
+            detail (str): Details included in the slow operation log, e.g. the arguments.
+                May be a function returning the details, which is only called for slow operations.
+        """
+        operation = self._operation(name)
+        operation["histogram"].observe(seconds)
+        slow = self.slow_threshold is not None and seconds >= self.slow_threshold
+        with self._lock:
+            operation["rows"] += rows
+            operation["errors"] += 1 if errors else 0
+            operation["slow"] += 1 if slow else 0
+        if slow:
+            detail = detail() if callable(detail) else detail
+            self._logger.warning(f"Slow operation {name}{detail or ''}: {seconds * 1000:.1f} ms, {rows} rows")
+
+
+
+    @contextmanager
+    def track(self: object, name: str, detail: str=None):
+        """
+        Context manager measuring an operation.
+        An exception leaving the block is counted as an error and re-raised.
+        The block may set `record` on the yielded call to False to discard the measurement.
+        Args:
+            name (str): Name of the operation.
+            detail (str): Details included in the slow operation log.
+        """
+        call = self._begin()
+        start = time.perf_counter()
+        try:
+            yield call
+        except BaseException:
+            call.errors += 1
+            raise
+        finally:
+            self._end(call, name, time.perf_counter() - start, detail)
+
+
+
+    def _begin(self: object) -> _call:
+        """
+        Internal function pushing a new operation onto the current thread's stack.
+        """
+        call = _call()
+        self._stack().append(call)
+        return call
+
+
+
+    def _end(self: object, call: _call, name: str, seconds: float, detail: str) -> None:
+        """
+        Internal function popping an operation, rolling its rows and errors up into the caller and recording it.
+        """
+        stack = self._stack()
+        stack.pop()
+        if stack:
+            stack[-1].rows += call.rows
+            stack[-1].errors += call.errors
+        if call.record:
+            self.observe(name, seconds, rows=call.rows, errors=call.errors, detail=detail)
+
+
+
+    def snapshot(self: object) -> dict:
+        """
+        Get the statistics of every operation.
+        Returns:
+            dict: Per operation the number of calls, calls with errors, slow calls, rows,
+            and the latency summary in seconds (mean, min, max, p50, p95, p99).
+        """
+        with self._lock:
+            operations = dict(self._operations)
+        result = {}
+        for name, operation in sorted(operations.items()):
+            latency = operation["histogram"].snapshot()
+            result[name] = {
+                "calls":  latency.pop("count"),
+                "errors": operation["errors"],
+                "slow":   operation["slow"],
+                "rows":   operation["rows"],
+                **latency,
+            }
+        return result
+
+
+
+    def export_prometheus(self: object, prefix: str) -> str:
+        """
+        Export the statistics in the Prometheus text exposition format.
+        Args:
+            prefix (str): Metric name prefix, e.g. "db_call".
+        Returns:
+            str: Latency histograms and row, error and slow call counters, labelled by operation.
+        """
+        with self._lock:
+            operations = dict(self._operations)
+        lines = [
+            f"# HELP {prefix}_seconds Duration of each call in seconds.",
+            f"# TYPE {prefix}_seconds histogram",
+        ]
+        for name, operation in sorted(operations.items()):
+            for bound, count in operation["histogram"].buckets():
+                le = "+Inf" if bound == math.inf else f"{bound:.6g}"
+                lines.append(f'{prefix}_seconds_bucket{{operation="{name}",le="{le}"}} {count}')
+            latency = operation["histogram"].snapshot()
+            lines.append(f'{prefix}_seconds_sum{{operation="{name}"}} {latency["sum"]}')
+            lines.append(f'{prefix}_seconds_count{{operation="{name}"}} {latency["count"]}')
+        for counter, help in (("rows", "Rows read or written."), ("errors", "Calls which encountered an error."), ("slow", "Calls above the slow threshold.")):
+            lines.append(f"# HELP {prefix}_{counter}_total {help}")
+            lines.append(f"# TYPE {prefix}_{counter}_total counter")
+            for name, operation in sorted(operations.items()):
+                lines.append(f'{prefix}_{counter}_total{{operation="{name}"}} {operation[counter]}')
+        return "\n".join(lines) + "\n"
+
+
+
+    def reset(self: object) -> None:
+        """
+        Remove all recorded statistics.
+        """
+        with self._lock:
+            self._operations = {}
+
+
+
+def instrument(registry: metrics_registry, exclude: tuple=()):
+    """
+    Class decorator measuring every public method of a class with a metrics registry.
+    Methods are tracked under their name. Methods returning a generator are measured
+    until the generator is exhausted or closed, and count one row per yielded item.
+    Args:
+        registry (metrics_registry): The registry to record into.
+        exclude (tuple): Names of public methods not to measure.
+
+    Usage:
+    ```python
+        registry = metrics_registry(slow_threshold=0.1)
+
+        @instrument(registry, exclude=("close",))
+        class MyClass:
+            def get_user(self, user_id):
+                ...
+
+        registry.snapshot()["get_user"] -> {"calls": 12, "p99": 0.0021, ...}
+    ```
+    """
+    def decorate(cls):
+        for name, method in list(vars(cls).items()):
+            if name.startswith("_") or name in exclude or not isinstance(method, types.FunctionType):
+                continue
+            setattr(cls, name, _instrumented(registry, name, method))
+        return cls
+    return decorate
+
+
+
+def _instrumented(registry: metrics_registry, name: str, method):
+    """
+    Internal function wrapping a single method for instrument().
+    """
+    # track() inlined, as this runs on every call of every instrumented method.
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        detail = lambda: _detail(args[1:], kwargs)
+        call = registry._begin()
+        start = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+            if isinstance(result, types.GeneratorType):
+                # Measured while it is consumed instead.
+                call.record = False
+                return _tracked_generator(registry, name, detail, result)
+            return result
+        except BaseException:
+            call.errors += 1
+            raise
+        finally:
+            registry._end(call, name, time.perf_counter() - start, detail)
+    return wrapper
+
+
+
+def _tracked_generator(registry: metrics_registry, name: str, detail: str, generator):
+    """
+    Internal generator measuring the iteration of a generator returned by an instrumented method.
+    The consumer runs between the items, possibly tracking operations of its own, so the
+    iteration is measured directly rather than pushed onto the thread's operation stack.
+    """
+    start = time.perf_counter()
+    rows = errors = 0
+    try:
+        for item in generator:
+            rows += 1
+            yield item
+    except Exception:
+        errors += 1
+        raise
+    finally:
+        registry.observe(name, time.perf_counter() - start, rows=rows, errors=errors, detail=detail)
+
+
+
+def _detail(args: tuple, kwargs: dict) -> str:
+    """
+    Internal function formatting call arguments for the slow operation log, truncated to 200 characters.
+    """
+    parts = [repr(arg) for arg in args] + [f"{key}={value!r}" for key, value in kwargs.items()]
+    detail = f"({', '.join(parts)})"
+    return detail if len(detail) <= 200 else detail[:197] + "...)"
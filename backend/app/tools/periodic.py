@@ -0,0 +1,142 @@
+import time
+import logging
+from threading import Thread, Event, Lock
+
+
+
+class periodic_task:
+    """
+    Runs a function repeatedly on a background daemon thread.
+    The function is called every `interval` seconds (measured from the end of the
+    previous run) until stop() is called. Exceptions are logged and counted, and
+    do not stop the task. trigger() wakes the task up for an immediate run.
+
+    #### Example:
+    ```python
+    task = periodic_task("rental-archiver", 300.0, db.archive_inactive_rentals)
+    task.start()
+    ...
+    task.stats() -> {"name": "rental-archiver", "runs": 12, "failures": 0, "last_duration": 0.042, ...}
+    task.stop()
+    ```
+    """
+
+    def __init__(self, name: str, interval: float, func, initial_delay: float=0.0) -> None:
+        """
+        Initialize the task. The task does not run until start() is called.
+        Args:
+            name (str): Name of the task, used for the thread name and in logs.
+            interval (float): Seconds between the end of one run and the start of the next.
+            func (callable): Function without arguments to run.
+            initial_delay (float): Seconds to wait before the first run.
+        """
+        self._logger = logging.getLogger(__name__)
+        self.name = name
+        self._interval = interval
+        self._func = func
+        self._initial_delay = initial_delay
+        self._stop = Event()
+        self._wake = Event()
+        self._thread = None
+        self._lock = Lock()
+        self._runs = 0
+        self._failures = 0
+        self._last_duration = None
+        self._last_result = None
+        self._last_error = None
+
+
+
+    def start(self: object) -> None:
+        """
+        Start the background thread. Calling start() on a running task has no effect.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self._loop, name=self.name, daemon=True)
+        self._thread.start()
+        self._logger.debug(f"Started periodic task {self.name} (interval: {self._interval}s)")
+
+
+
+    def stop(self: object, timeout: float=None) -> None:
+        """
+        Stop the task after the current run, if any, has finished.
+        Args:
+            timeout (float): Seconds to wait for the thread to exit.
+        """
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._logger.debug(f"Stopped periodic task {self.name}")
+
+
+
+    def trigger(self: object) -> None:
+        """
+        Wake the task up to run immediately instead of waiting for the interval to pass.
+        """
+        self._wake.set()
+
+
+
+    def run_once(self: object) -> object:
+        """
+        Run the function once on the calling thread and record the outcome.
+        Returns:
+            object: The return value of the function, or None if it raised.
+        """
+        start = time.perf_counter()
+        try:
+            result = self._func()
+            error = None
+        except Exception as e:
+            result = None
+            error = e
+            self._logger.error(f"Periodic task {self.name} failed: {e}")
+
+        with self._lock:
+            self._runs += 1
+            self._last_duration = time.perf_counter() - start
+            self._last_result = result
+            self._last_error = None if error is None else str(error)
+            if error is not None:
+                self._failures += 1
+        return result
+
+
+
+    def _loop(self: object) -> None:
+        """
+        Internal function running the task until it is stopped.
+        """
+        if self._initial_delay > 0:
+            self._wake.wait(self._initial_delay)
+            self._wake.clear()
+
+        while not self._stop.is_set():
+            self.run_once()
+            self._wake.wait(self._interval)
+            self._wake.clear()
+
+
+
+    def stats(self: object) -> dict:
+        """
+        Get the task statistics.
+        Returns:
+            dict: Number of runs and failures, and the duration, result and error of the last run.
+        """
+        with self._lock:
+            return {
+                "name":          self.name,
+                "interval":      self._interval,
+                "running":       self._thread is not None and self._thread.is_alive(),
+                "runs":          self._runs,
+                "failures":      self._failures,
+                "last_duration": self._last_duration,
+                "last_result":   self._last_result,
+                "last_error":    self._last_error,
+            }
@@ -0,0 +1,231 @@
+from threading import Lock
+
+
+
+class rental_index:
+    """
+    In-memory index of the active rentals by user ID and by scooter ID.
+    Entries are full rental rows (id, user_id, scooter_id, is_active, start_time, end_time,
+    total_price), so lookups return exactly what the rentals table would. The index is
+    loaded from the active rentals with load() and kept up to date by add() and remove()
+    as rentals start and end. reconcile() compares it with a fresh read of the active
+    rentals and corrects any difference, leaving alone the users and scooters changed
+    since the read started. All methods are thread-safe.
+
+    #### Example:
+    ```python
+    index = rental_index()
+    index.load(db.get_active_rentals())
+
+    index.add((228, 1, 2, 1, datetime(2025, 4, 2, 10, 3, 11), None, 0.0))
+    index.by_user(1) -> (228, 1, 2, 1, datetime(2025, 4, 2, 10, 3, 11), None, 0.0)
+    index.by_scooter(2) -> (228, 1, 2, 1, datetime(2025, 4, 2, 10, 3, 11), None, 0.0)
+
+    version = index.version()
+    index.reconcile(db.get_active_rentals(), since=version) -> 0
+    index.remove(228)
+    ```
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize an empty index.
+        """
+        self._by_id = {}
+        self._by_user = {}
+        self._by_scooter = {}
+        self._version = 0
+        self._changed = {}
+        self._lock = Lock()
+        self._counters = {"added": 0, "removed": 0, "reconciled": 0, "corrected": 0}
+
+
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._by_id)
+
+
+
+    def load(self: object, rentals: list[tuple]) -> int:
+        """
+        Replace the content of the index.
+        Args:
+            rentals (list): The active rental rows.
+        Returns:
+            int: The number of indexed rentals.
+        """
+        with self._lock:
+            self._by_id.clear()
+            self._by_user.clear()
+            self._by_scooter.clear()
+            self._changed.clear()
+            for rental in rentals:
+                self._put(rental)
+            return len(self._by_id)
+
+
+
+    def add(self: object, rental: tuple) -> None:
+        """
+        Index a rental which has started, replacing any rental of the same user or scooter.
+        Args:
+            rental (tuple): The rental row.
+        """
+        with self._lock:
+            self._put(rental)
+            self._counters["added"] += 1
+
+
+
+    def remove(self: object, rental_id: int) -> tuple:
+        """
+        Remove a rental which has ended or was undone.
+        Args:
+            rental_id (int): The ID of the rental.
+        Returns:
+            tuple: The removed rental row, or None if it was not indexed.
+        """
+        with self._lock:
+            rental = self._by_id.get(_key(rental_id))
+            if rental is None:
+                return None
+            self._drop(rental)
+            self._counters["removed"] += 1
+            return rental
+
+
+
+    def by_user(self: object, user_id: int) -> tuple:
+        """
+        Get the active rental of a user.
+        Args:
+            user_id (int): The ID of the user.
+        Returns:
+            tuple: The rental row, or None if the user has no active rental.
+        """
+        with self._lock:
+            return self._by_user.get(_key(user_id))
+
+
+
+    def by_scooter(self: object, scooter_id: int) -> tuple:
+        """
+        Get the active rental of a scooter.
+        Args:
+            scooter_id (int): The ID of the scooter.
+        Returns:
+            tuple: The rental row, or None if the scooter has no active rental.
+        """
+        with self._lock:
+            return self._by_scooter.get(_key(scooter_id))
+
+
+
+    def version(self: object) -> int:
+        """
+        Get the number of changes made to the index so far, see reconcile().
+        """
+        with self._lock:
+            return self._version
+
+
+
+    def reconcile(self: object, rentals: list[tuple], since: int) -> int:
+        """
+        Correct the index to match the active rentals read from the database.
+        Users and scooters changed after `since` are skipped, since the read may predate the change.
+        Args:
+            rentals (list): The active rental rows.
+            since (int): version() taken before the rentals were read.
+        Returns:
+            int: The number of corrected rentals.
+        """
+        expected = {_key(rental[0]): rental for rental in rentals}
+        with self._lock:
+            stale = [
+                rental for rental_id, rental in self._by_id.items()
+                if expected.get(rental_id) != rental and not self._changed_since(rental, since)
+            ]
+            missing = [
+                rental for rental_id, rental in expected.items()
+                if self._by_id.get(rental_id) != rental and not self._changed_since(rental, since)
+            ]
+            for rental in stale:
+                self._drop(rental)
+            for rental in missing:
+                self._put(rental)
+            self._changed = {key: version for key, version in self._changed.items() if version > since}
+            self._counters["reconciled"] += 1
+            self._counters["corrected"] += len(stale) + len(missing)
+            return len(stale) + len(missing)
+
+
+
+    def _put(self: object, rental: tuple) -> None:
+        """
+        Internal function indexing a rental. The lock must be held.
+        """
+        for old in (self._by_user.get(_key(rental[1])), self._by_scooter.get(_key(rental[2]))):
+            if old is not None:
+                self._drop(old)
+        self._by_id[_key(rental[0])] = rental
+        self._by_user[_key(rental[1])] = rental
+        self._by_scooter[_key(rental[2])] = rental
+        self._touch(rental)
+
+
+
+    def _drop(self: object, rental: tuple) -> None:
+        """
+        Internal function removing a rental from the index. The lock must be held.
+        """
+        self._by_id.pop(_key(rental[0]), None)
+        if self._by_user.get(_key(rental[1])) is rental:
+            del self._by_user[_key(rental[1])]
+        if self._by_scooter.get(_key(rental[2])) is rental:
+            del self._by_scooter[_key(rental[2])]
+        self._touch(rental)
+
+
+
+    def _touch(self: object, rental: tuple) -> None:
+        """
+        Internal function recording a change to the user and scooter of a rental. The lock must be held.
+        """
+        self._version += 1
+        self._changed[("user", _key(rental[1]))] = self._version
+        self._changed[("scooter", _key(rental[2]))] = self._version
+
+
+
+    def _changed_since(self: object, rental: tuple, since: int) -> bool:
+        """
+        Internal function checking if the user or scooter of a rental changed after a version. The lock must be held.
+        """
+        return (
+            self._changed.get(("user", _key(rental[1])), 0) > since
+            or self._changed.get(("scooter", _key(rental[2])), 0) > since
+        )
+
+
+
+    def stats(self: object) -> dict:
+        """
+        Get the index statistics.
+        Returns:
+            dict: Indexed rentals, rentals added and removed, reconciliations and rentals they corrected.
+        """
+        with self._lock:
+            return {"active": len(self._by_id), **self._counters}
+
+
+
+def _key(value: object) -> int:
+    """
+    Internal function converting an ID to the int used as key, or None if it is not an integer.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
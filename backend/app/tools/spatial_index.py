@@ -0,0 +1,272 @@
+import math
+from threading import RLock
+
+
+EARTH_RADIUS_M   = 6371000.0
+METERS_PER_DEGREE = 111320.0
+
+
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Great-circle distance between two coordinates.
+    Args:
+        lat1 (float): Latitude of the first point.
+        lon1 (float): Longitude of the first point.
+        lat2 (float): Latitude of the second point.
+        lon2 (float): Longitude of the second point.
+    Returns:
+        float: Distance in meters.
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+
+class grid_index:
+    """
+    In-memory uniform grid index over point positions, e.g. scooters.
+    The plane is divided into cells of `cell_size` x `cell_size` degrees, and each
+    entry is stored in the cell containing its position. Radius and k-nearest queries
+    only visit the cells around the query point, so their cost depends on the local
+    density rather than on the total number of entries.
+    Entries can be inserted, moved and removed incrementally. All methods are thread-safe.
+
+    #### Example:
+    ```python
+    index = grid_index(cell_size=0.0025)
+    index.upsert(1, 63.4197, 10.4018, 0)
+    index.upsert(2, 63.4153, 10.3995, 0)
+
+    index.within_radius(63.4190, 10.4020, 500) -> [(1, 63.4197, 10.4018, 0, 79.2)]
+    index.nearest(63.4190, 10.4020, k=1) -> [(1, 63.4197, 10.4018, 0, 79.2)]
+    ```
+    """
+
+    def __init__(self, cell_size: float=0.0025) -> None:
+        """
+        Initialize an empty index.
+        Args:
+            cell_size (float): Side length of a grid cell in degrees.
+        """
+        self._cell_size = cell_size
+        self._cells = {}
+        self._entries = {}
+        self._bounds = None
+        self._lock = RLock()
+
+
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+
+    def _cell(self: object, lat: float, lon: float) -> tuple[int, int]:
+        """
+        Internal function returning the grid cell containing a position.
+        """
+        return (math.floor(lat / self._cell_size), math.floor(lon / self._cell_size))
+
+
+
+    def upsert(self: object, key: object, lat: float, lon: float, status: int) -> None:
+        """
+        Insert an entry or move an existing one to a new position and status.
+        Args:
+            key (object): Identifier of the entry, e.g. the scooter UUID.
+            lat (float): Latitude.
+            lon (float): Longitude.
+            status (int): Status code used for filtering.
+        """
+        cell = self._cell(lat, lon)
+        with self._lock:
+            old = self._entries.get(key)
+            if old is not None and old[3] != cell:
+                self._remove_from_cell(key, old[3])
+            self._entries[key] = (lat, lon, status, cell)
+            self._cells.setdefault(cell, set()).add(key)
+            if self._bounds is None:
+                self._bounds = (cell[0], cell[0], cell[1], cell[1])
+            else:
+                row_min, row_max, col_min, col_max = self._bounds
+                self._bounds = (min(row_min, cell[0]), max(row_max, cell[0]), min(col_min, cell[1]), max(col_max, cell[1]))
+
+
+
+    def set_status(self: object, key: object, status: int) -> bool:
+        """
+        Change the status of an entry without moving it.
+        Args:
+            key (object): Identifier of the entry.
+            status (int): The new status code.
+        Returns:
+            bool: True if the entry exists, False otherwise.
+        """
+        with self._lock:
+            old = self._entries.get(key)
+            if old is None:
+                return False
+            self._entries[key] = (old[0], old[1], status, old[3])
+            return True
+
+
+
+    def remove(self: object, key: object) -> bool:
+        """
+        Remove an entry from the index.
+        Args:
+            key (object): Identifier of the entry.
+        Returns:
+            bool: True if the entry existed, False otherwise.
+        """
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is None:
+                return False
+            self._remove_from_cell(key, old[3])
+            return True
+
+
+
+    def _remove_from_cell(self: object, key: object, cell: tuple[int, int]) -> None:
+        """
+        Internal function removing a key from a cell, dropping the cell when it becomes empty.
+        """
+        keys = self._cells.get(cell)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._cells[cell]
+
+
+
+    def clear(self: object) -> None:
+        """
+        Remove all entries from the index.
+        """
+        with self._lock:
+            self._cells.clear()
+            self._entries.clear()
+            self._bounds = None
+
+
+
+    def get(self: object, key: object) -> tuple[float, float, int]:
+        """
+        Get the indexed position and status of an entry.
+        Args:
+            key (object): Identifier of the entry.
+        Returns:
+            tuple: (latitude, longitude, status), or None if the entry is not indexed.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else entry[:3]
+
+
+
+    def _scan(self: object, lat: float, lon: float, rows: range, cols: range, status: int, found: list) -> None:
+        """
+        Internal function appending (distance, key, lat, lon, status) for every entry in the
+        given cell ranges that matches the status filter.
+        """
+        for row in rows:
+            for col in cols:
+                keys = self._cells.get((row, col))
+                if not keys:
+                    continue
+                for key in keys:
+                    e_lat, e_lon, e_status, _ = self._entries[key]
+                    if status is None or e_status == status:
+                        found.append((haversine(lat, lon, e_lat, e_lon), key, e_lat, e_lon, e_status))
+
+
+
+    def within_radius(self: object, lat: float, lon: float, radius: float, status: int=None) -> list[tuple]:
+        """
+        Find all entries within a radius of a position, nearest first.
+        Args:
+            lat (float): Latitude of the query point.
+            lon (float): Longitude of the query point.
+            radius (float): Search radius in meters.
+            status (int): Only return entries with this status. All entries if None.
+        Returns:
+            list: Tuples of (key, latitude, longitude, status, distance in meters).
+        """
+        d_lat = radius / METERS_PER_DEGREE
+        d_lon = radius / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+        row_min, col_min = self._cell(lat - d_lat, lon - d_lon)
+        row_max, col_max = self._cell(lat + d_lat, lon + d_lon)
+
+        found = []
+        with self._lock:
+            self._scan(lat, lon, range(row_min, row_max + 1), range(col_min, col_max + 1), status, found)
+
+        found = sorted(entry for entry in found if entry[0] <= radius)
+        return [(key, e_lat, e_lon, e_status, dist) for dist, key, e_lat, e_lon, e_status in found]
+
+
+
+    def nearest(self: object, lat: float, lon: float, k: int=1, status: int=None, max_radius: float=None) -> list[tuple]:
+        """
+        Find the k entries nearest to a position.
+        Cells are visited in rings of growing size around the query point until the k-th
+        nearest entry is known to be closer than anything in the unvisited rings.
+        Args:
+            lat (float): Latitude of the query point.
+            lon (float): Longitude of the query point.
+            k (int): Number of entries to return.
+            status (int): Only return entries with this status. All entries if None.
+            max_radius (float): Ignore entries farther away than this many meters.
+        Returns:
+            list: Up to k tuples of (key, latitude, longitude, status, distance in meters), nearest first.
+        """
+        if k <= 0:
+            return []
+
+        center_row, center_col = self._cell(lat, lon)
+        # Any entry within ring * ring_width meters lies in one of rings 0..ring.
+        ring_width = self._cell_size * METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6)
+        found = []
+
+        with self._lock:
+            if not self._cells:
+                return []
+            # The bounds only grow, so they may be wider than needed after removals.
+            row_min, row_max, col_min, col_max = self._bounds
+            max_ring = max(
+                abs(center_row - row_min), abs(center_row - row_max),
+                abs(center_col - col_min), abs(center_col - col_max),
+            )
+            if max_radius is not None:
+                max_ring = min(max_ring, int(max_radius / ring_width) + 1)
+
+            ring = 0
+            while ring <= max_ring:
+                if ring == 0:
+                    self._scan(lat, lon, range(center_row, center_row + 1), range(center_col, center_col + 1), status, found)
+                else:
+                    top, bottom = center_row - ring, center_row + ring
+                    cols_all = range(center_col - ring, center_col + ring + 1)
+                    self._scan(lat, lon, range(top, top + 1), cols_all, status, found)
+                    self._scan(lat, lon, range(bottom, bottom + 1), cols_all, status, found)
+                    sides = range(top + 1, bottom)
+                    self._scan(lat, lon, sides, range(center_col - ring, center_col - ring + 1), status, found)
+                    self._scan(lat, lon, sides, range(center_col + ring, center_col + ring + 1), status, found)
+
+                if len(found) >= k:
+                    found.sort()
+                    del found[k:]
+                    if found[-1][0] <= ring * ring_width:
+                        break
+                ring += 1
+
+        found.sort()
+        if max_radius is not None:
+            found = [entry for entry in found if entry[0] <= max_radius]
+        return [(key, e_lat, e_lon, e_status, dist) for dist, key, e_lat, e_lon, e_status in found[:k]]
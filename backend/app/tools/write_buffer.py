@@ -0,0 +1,156 @@
+from threading import Lock
+
+
+
+class write_buffer:
+    """
+    Thread-safe write-behind buffer coalescing updates per key.
+    Each key holds the latest value of every field written to it, so a burst of updates
+    to the same key is written once. flush() hands all pending updates to the `write`
+    function as one batch; while the batch is being written it stays readable through
+    get(), and if the write fails it is put back under any newer updates.
+    Flushes are serialized, so batches reach the database in the order they were drained.
+
+    #### Example:
+    ```python
+    buffer = write_buffer(write=lambda batch: db.write_scooters(batch))
+
+    buffer.put(1, {"status": 10})
+    buffer.put(1, {"latitude": 63.4197, "longitude": 10.4018})
+    buffer.get(1) -> {"status": 10, "latitude": 63.4197, "longitude": 10.4018}
+    buffer.flush() -> 1   # one row written for two updates
+    buffer.stats() -> {"pending": 0, "updates": 2, "coalesced": 1, "written": 1, ...}
+    ```
+    """
+
+    def __init__(self, write) -> None:
+        """
+        Initialize an empty buffer.
+        Args:
+            write (callable): Function taking a dict of {key: {field: value}} and writing it.
+                It must raise an exception if the batch was not written.
+        """
+        self._write = write
+        self._pending = {}
+        self._inflight = {}
+        self._lock = Lock()
+        self._flush_lock = Lock()
+        self._updates = 0
+        self._coalesced = 0
+        self._written = 0
+        self._flushes = 0
+        self._failures = 0
+        self._last_flush_size = 0
+
+
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+
+
+    def put(self: object, key: object, fields: dict) -> int:
+        """
+        Buffer an update, merging it into the pending update of the key.
+        Args:
+            key (object): The key, e.g. a scooter ID.
+            fields (dict): The updated fields and their values.
+        Returns:
+            int: The number of keys with pending updates.
+        """
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = dict(fields)
+            else:
+                pending.update(fields)
+                self._coalesced += 1
+            self._updates += 1
+            return len(self._pending)
+
+
+
+    def get(self: object, key: object) -> dict:
+        """
+        Get the fields of a key which are pending or being written.
+        Args:
+            key (object): The key.
+        Returns:
+            dict: The latest value of every buffered field, or None if nothing is buffered for the key.
+        """
+        with self._lock:
+            pending, inflight = self._pending.get(key), self._inflight.get(key)
+            if inflight is None:
+                return None if pending is None else dict(pending)
+            return {**inflight, **(pending or {})}
+
+
+
+    def snapshot(self: object) -> dict:
+        """
+        Get the fields of every key which are pending or being written, like get() for all keys at once.
+        Returns:
+            dict: The buffered fields per key.
+        """
+        with self._lock:
+            if not self._inflight:
+                return {key: dict(fields) for key, fields in self._pending.items()}
+            merged = {key: dict(fields) for key, fields in self._inflight.items()}
+            for key, fields in self._pending.items():
+                merged.setdefault(key, {}).update(fields)
+            return merged
+
+
+
+    def flush(self: object) -> int:
+        """
+        Write all pending updates as one batch.
+        Waits for a flush in progress on another thread to finish first.
+        Returns:
+            int: The number of keys written.
+
+        ## Errors
+            Re-raises the exception of the write function. The batch is kept and written by the next flush.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+            if not batch:
+                return 0
+            try:
+                self._write(batch)
+            except Exception:
+                with self._lock:
+                    for key, fields in batch.items():
+                        self._pending[key] = {**fields, **self._pending.get(key, {})}
+                    self._inflight = {}
+                    self._failures += 1
+                raise
+            with self._lock:
+                self._inflight = {}
+                self._flushes += 1
+                self._written += len(batch)
+                self._last_flush_size = len(batch)
+            return len(batch)
+
+
+
+    def stats(self: object) -> dict:
+        """
+        Get the buffer statistics.
+        Returns:
+            dict: Pending keys, updates received, updates coalesced into a pending update,
+            rows written, flushes, failed flushes and the size of the last flush.
+        """
+        with self._lock:
+            return {
+                "pending":         len(self._pending),
+                "updates":         self._updates,
+                "coalesced":       self._coalesced,
+                "written":         self._written,
+                "flushes":         self._flushes,
+                "failures":        self._failures,
+                "last_flush_size": self._last_flush_size,
+            }
@@ -0,0 +1,99 @@
+"""
+Compares the throughput of the hot db lookups and updates with and without
+prepared statements against a local MySQL/MariaDB database.
+
+Each round runs the statements issued during one unlock/lock cycle
+(get_scooter, get_user, active rental lookups and the scooter update) from a
+number of threads sharing the connection pool. The scooter update writes
+back the scooter's current position and status, so the data is unchanged.
+
+Usage:
+```
+DB_HOST=localhost DB_USER=user DB_PASSWORD=password DB_NAME=database \
+    python backend/benchmarks/prepared_statements.py --user 1 --scooter 2 --seconds 10 --threads 4
+```
+"""
+import os
+import sys
+import time
+import argparse
+from threading import Thread
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from api import database
+
+
+DB_CONFIG = {
+    'host':     os.getenv('DB_HOST', 'localhost'),
+    'user':     os.getenv('DB_USER', 'user'),
+    'password': os.getenv('DB_PASSWORD', 'password'),
+    'database': os.getenv('DB_NAME', 'database'),
+    'port':     int(os.getenv('DB_PORT', 3306)),
+}
+
+STATEMENTS_PER_ROUND = 7
+
+
+
+def run_round(db, user_id: int, scooter_id: int, scooter: tuple) -> None:
+    """
+    Issue the statements of one unlock/lock cycle.
+    """
+    db.get_scooter(scooter_id)
+    db.get_user(user_id)
+    db.user_has_active_rental(user_id)
+    db.scooter_has_active_rental(scooter_id)
+    db.get_active_rental_by_user(user_id)
+    db.get_active_rental_by_scooter(scooter_id)
+    db._update_scooter_info(scooter_id, scooter[1], scooter[2], scooter[3])
+
+
+
+def measure(name: str, db, user_id: int, scooter_id: int, seconds: float, threads: int) -> float:
+    """
+    Run rounds from several threads for a fixed time and print the statement throughput.
+    Returns:
+        float: Statements per second.
+    """
+    scooter = db.get_scooter(scooter_id)
+    rounds = [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def worker(index: int) -> None:
+        while time.perf_counter() < deadline:
+            run_round(db, user_id, scooter_id, scooter)
+            rounds[index] += 1
+
+    workers = [Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    throughput = sum(rounds) * STATEMENTS_PER_ROUND / elapsed
+    print(f"{name:<12} threads={threads:<3} statements={sum(rounds) * STATEMENTS_PER_ROUND:<8} {throughput:10.1f} statements/s")
+    return throughput
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark prepared vs. unprepared statements.")
+    parser.add_argument("--user", type=int, required=True, help="ID of an existing user")
+    parser.add_argument("--scooter", type=int, required=True, help="ID of an existing scooter")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Duration per variant (default: 10)")
+    parser.add_argument("--threads", type=int, default=4, help="Concurrent threads (default: 4)")
+    args = parser.parse_args()
+
+    db = database.db(DB_CONFIG)
+
+    db.set_prepared_statements(False)
+    unprepared = measure("unprepared", db, args.user, args.scooter, args.seconds, args.threads)
+
+    db.set_prepared_statements(True)
+    prepared = measure("prepared", db, args.user, args.scooter, args.seconds, args.threads)
+
+    print(f"speedup: {prepared / unprepared:.2f}x  {db.statement_stats()}")
+    db.close()
@@ -0,0 +1,105 @@
+"""
+Compares pricing rides one at a time with scalar Python math against pricing the
+whole batch with the vectorized engine (transaction.ride_prices), and times the
+end-of-day recomputation (transaction.recompute_prices) over a day of rentals.
+
+The scalar path is the formula pay_for_single_ride and pay_for_coride_ride used
+before the engine; both paths must agree to the rounding step of 0.1.
+The recomputation runs offline on the in-memory SQLite backend.
+
+Usage:
+```
+python backend/benchmarks/pricing.py --rides 1000000 --rentals 20000
+```
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DB_BACKEND", "memory")
+os.environ.setdefault("DB_SQLITE_SEED", "False")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+import numpy as np
+
+from api import database
+from logic import transaction
+
+
+CENTER = (63.4305, 10.3951)
+
+
+
+def scalar_prices(minutes: list, riders: list) -> list[float]:
+    """
+    Price the rides one at a time, like the scalar transaction functions.
+    """
+    unlock, per_minute, discount = transaction.DEFAULT_TARIFF
+    return [round(max(unlock + m * per_minute - (r - 1) * discount, 0.0), 1) for m, r in zip(minutes, riders)]
+
+
+
+def seed_rentals(db, count: int, day: datetime) -> None:
+    """
+    Insert `count` completed rentals on `day`, a tenth of them in groups of three.
+    """
+    rng = random.Random(7)
+    db.add_user("rider", 1e9)
+    db.add_scooters([(CENTER[0], CENTER[1], 0)])
+    user_id, scooter_id = db.get_all_users()[0][0], db.get_all_scooters()[0][0]
+    rows = []
+    for _ in range(count):
+        start = day + timedelta(seconds=rng.uniform(0, 80000))
+        minutes = rng.uniform(1, 60)
+        rows.append((user_id, scooter_id, start, start + timedelta(minutes=minutes), transaction.ride_price(minutes)))
+
+    def insert(cursor):
+        cursor.executemany(
+            "INSERT INTO rentals (user_id, scooter_id, is_active, start_time, end_time, total_price) VALUES (%s, %s, 0, %s, %s, %s)",
+            rows
+        )
+    db._run(insert, commit=True)
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the vectorized pricing engine.")
+    parser.add_argument("--rides", type=int, default=1000000, help="Rides to price (default: 1000000)")
+    parser.add_argument("--rentals", type=int, default=20000, help="Rentals to recompute (default: 20000)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    minutes = rng.uniform(0, 120, args.rides)
+    riders = rng.integers(1, 6, args.rides)
+    minutes_list, riders_list = minutes.tolist(), riders.tolist()
+    print(f"rides: {args.rides}\n")
+
+    start = time.perf_counter()
+    scalar = scalar_prices(minutes_list, riders_list)
+    scalar_time = time.perf_counter() - start
+    print(f"scalar:     {scalar_time * 1000:9.1f} ms  {args.rides / scalar_time:12.0f} rides/s")
+
+    start = time.perf_counter()
+    vectorized = transaction.ride_prices(minutes, riders)
+    vector_time = time.perf_counter() - start
+    print(f"vectorized: {vector_time * 1000:9.1f} ms  {args.rides / vector_time:12.0f} rides/s")
+
+    difference = np.abs(np.asarray(scalar) - vectorized)
+    print(f"\nspeedup: {scalar_time / vector_time:.1f}x  max difference: {difference.max():.2f}  differing: {np.count_nonzero(difference > 1e-9)}")
+    if difference.max() > 0.1 + 1e-9:
+        print("FAIL scalar and vectorized prices differ by more than the rounding step")
+        sys.exit(1)
+
+    if args.rentals:
+        db = database.db({})
+        day = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+        seed_rentals(db, args.rentals, day)
+        start = time.perf_counter()
+        summary = transaction.recompute_prices(day.date())
+        elapsed = time.perf_counter() - start
+        print(f"\nrecompute:  {elapsed * 1000:9.1f} ms  for {summary['rentals']} rentals, {summary['mismatched']} mismatched")
+        db.close()
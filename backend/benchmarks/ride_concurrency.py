@@ -0,0 +1,137 @@
+"""
+Concurrency stress test of single_ride_service unlock/lock cycles.
+
+Many threads run unlock/lock cycles on the shared service at the same time:
+
+* In the "pairs" phase every thread has its own user and scooter. Every cycle must
+  succeed, and the rental returned by each lock must belong to the calling thread's
+  user and scooter; anything else is cross-talk between requests.
+* In the "contention" phase all threads try to unlock the same scooters. For each
+  scooter exactly one unlock may succeed.
+
+Afterwards the rentals table must hold no active rentals and one completed rental per
+successful cycle. Runs offline on the in-memory SQLite backend with MQTT and the
+weather check disabled, and exits with status 1 if any check fails.
+
+Usage:
+```
+python backend/benchmarks/ride_concurrency.py --threads 32 --cycles 50
+```
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("DB_BACKEND", "memory")
+os.environ.setdefault("DB_SQLITE_SEED", "False")
+os.environ.setdefault("DISABLE_MQTT", "True")
+os.environ.setdefault("DISABLE_WEATHER", "True")
+# The losing unlocks of the contention phase are reported as incidents.
+os.environ.setdefault("INCIDENT_LOG_PATH", os.devnull)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from api import database
+from service import single_ride_service
+
+
+CENTER = (63.4305, 10.3951)
+
+
+
+def run_pairs(service, pairs: list, cycles: int, barrier: threading.Barrier) -> list[str]:
+    """
+    Run unlock/lock cycles on one thread's own user and scooter.
+    Returns:
+        list: Descriptions of the failed checks.
+    """
+    user_id, scooter_id = pairs
+    errors = []
+    barrier.wait()
+    for cycle in range(cycles):
+        unlocked = service.unlock_scooter(scooter_id, user_id)
+        if not unlocked[0]:
+            errors.append(f"user {user_id} scooter {scooter_id} cycle {cycle}: unlock failed: {unlocked}")
+            continue
+        locked = service.lock_scooter(scooter_id, user_id)
+        if not locked[0]:
+            errors.append(f"user {user_id} scooter {scooter_id} cycle {cycle}: lock failed: {locked}")
+            continue
+        rental = locked[2]
+        if rental["user_id"] != user_id or rental["scooter_id"] != scooter_id:
+            errors.append(f"user {user_id} scooter {scooter_id} cycle {cycle}: got the rental of user {rental['user_id']} scooter {rental['scooter_id']}")
+    return errors
+
+
+
+def run_contention(service, user_id: int, scooter_ids: list, barrier: threading.Barrier) -> list:
+    """
+    Try to unlock each of the shared scooters at the same time as the other threads.
+    The winner locks the scooter again once every thread has tried.
+    Returns:
+        list: The scooters this thread unlocked.
+    """
+    won = []
+    for scooter_id in scooter_ids:
+        barrier.wait()
+        unlocked = service.unlock_scooter(scooter_id, user_id)[0]
+        barrier.wait()
+        if unlocked:
+            won.append(scooter_id)
+            service.lock_scooter(scooter_id, user_id)
+    return won
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stress test concurrent single ride unlock/lock cycles.")
+    parser.add_argument("--threads", type=int, default=32, help="Concurrent threads (default: 32)")
+    parser.add_argument("--cycles", type=int, default=50, help="Unlock/lock cycles per thread (default: 50)")
+    parser.add_argument("--contended", type=int, default=20, help="Scooters competed for in the contention phase (default: 20)")
+    args = parser.parse_args()
+
+    # Switch threads often, so the requests interleave as much as possible.
+    sys.setswitchinterval(1e-5)
+
+    db = database.db({})
+    for i in range(args.threads):
+        db.add_user(f"user-{i}", 1e9)
+    db.add_scooters([(CENTER[0] + i * 1e-4, CENTER[1], 0) for i in range(args.threads + args.contended)])
+    user_ids = [user[0] for user in db.get_all_users()]
+    scooter_ids = [scooter[0] for scooter in db.get_all_scooters()]
+    own_scooters, shared_scooters = scooter_ids[:args.threads], scooter_ids[args.threads:]
+
+    service = single_ride_service.single_ride_service()
+    failures = []
+
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        barrier = threading.Barrier(args.threads)
+        start = time.perf_counter()
+        results = list(executor.map(lambda pair: run_pairs(service, pair, args.cycles, barrier), zip(user_ids, own_scooters)))
+        elapsed = time.perf_counter() - start
+        failures.extend(error for errors in results for error in errors)
+        print(f"pairs:      {args.threads} threads x {args.cycles} cycles in {elapsed:.2f} s ({args.threads * args.cycles / elapsed:.0f} cycles/s), {len(failures)} failures")
+
+        barrier = threading.Barrier(args.threads)
+        winners = list(executor.map(lambda user_id: run_contention(service, user_id, shared_scooters, barrier), user_ids))
+        unlocks = {scooter_id: sum(scooter_id in won for won in winners) for scooter_id in shared_scooters}
+        contended = [f"scooter {scooter_id} was unlocked {count} times" for scooter_id, count in unlocks.items() if count != 1]
+        failures.extend(contended)
+        print(f"contention: {args.threads} threads x {len(shared_scooters)} scooters, {len(contended)} scooters not unlocked exactly once")
+
+    active = db.get_active_rentals()
+    completed = len(db.get_all_rentals()) - len(active)
+    expected = args.threads * args.cycles - sum("cycle" in failure for failure in failures) + sum(unlocks.values())
+    if active:
+        failures.append(f"{len(active)} rentals are still active")
+    if completed != expected:
+        failures.append(f"{completed} completed rentals, expected {expected}")
+    db.close()
+
+    for failure in failures[:20]:
+        print(f"FAIL {failure}")
+    print("ok" if not failures else f"{len(failures)} checks failed")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,147 @@
+"""
+Shows the effect of the index migrations in resources/migrations on the query
+plans and latencies of the hot rental and scooter queries.
+
+The database is filled with synthetic users, scooters and a long rental history
+(one active rental per user), then every query is explained and timed before and
+after db.migrate() is run.
+
+Runs on the in-memory SQLite backend by default. To measure MySQL/MariaDB, point
+it at an empty scratch database, since it inserts the synthetic rows:
+```
+python backend/benchmarks/schema_migrations.py --users 500 --rentals 200
+
+DB_BACKEND=mysql DB_HOST=localhost DB_USER=user DB_PASSWORD=password DB_NAME=scratch \
+    python backend/benchmarks/schema_migrations.py --users 500 --rentals 200
+```
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+os.environ.setdefault("DB_BACKEND", "memory")
+os.environ.setdefault("DB_MIGRATE", "False")
+os.environ.setdefault("DB_SQLITE_SEED", "False")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from api import database
+
+
+DB_CONFIG = {
+    'host':     os.getenv('DB_HOST', 'localhost'),
+    'user':     os.getenv('DB_USER', 'user'),
+    'password': os.getenv('DB_PASSWORD', 'password'),
+    'database': os.getenv('DB_NAME', 'database'),
+    'port':     int(os.getenv('DB_PORT', 3306)),
+}
+
+CENTER = (63.4305, 10.3951)
+
+QUERIES = {
+    "user_has_active_rental":       ("SELECT COUNT(*) FROM rentals WHERE user_id = %s AND is_active = 1", "user"),
+    "get_active_rental_by_user":    (f"SELECT {database.RENTAL_COLUMNS} FROM rentals WHERE user_id = %s AND is_active = 1", "user"),
+    "scooter_has_active_rental":    ("SELECT COUNT(*) FROM rentals WHERE scooter_id = %s AND is_active = 1", "scooter"),
+    "get_active_rental_by_scooter": (f"SELECT {database.RENTAL_COLUMNS} FROM rentals WHERE scooter_id = %s AND is_active = 1", "scooter"),
+    "get_active_rentals":           (f"SELECT {database.RENTAL_COLUMNS} FROM rentals WHERE is_active = 1", None),
+    "scooters_by_status_area":      (f"SELECT {database.SCOOTER_COLUMNS} FROM scooters WHERE status = %s AND latitude BETWEEN %s AND %s", "area"),
+}
+
+
+
+def seed(db, users: int, rentals: int) -> tuple[list, list]:
+    """
+    Insert synthetic users and scooters, and `rentals` completed rentals plus one active rental per user.
+    Returns:
+        tuple: The user IDs and scooter IDs.
+    """
+    rng = random.Random(12)
+
+    def insert(cursor):
+        cursor.executemany("INSERT INTO users (name, funds) VALUES (%s, %s)", [(f"user-{i}", 1000.0) for i in range(users)])
+    db._run(insert, commit=True)
+    db.add_scooters([(CENTER[0] + rng.uniform(-0.05, 0.05), CENTER[1] + rng.uniform(-0.1, 0.1), rng.choice((0, 0, 0, 1, 10))) for _ in range(users)])
+
+    user_ids = [row[0] for row in db.get_all_users()]
+    scooter_ids = [row[0] for row in db.get_all_scooters()]
+    query = "INSERT INTO rentals (user_id, scooter_id, is_active, start_time, end_time, total_price) VALUES (%s, %s, %s, %s, %s, %s)"
+
+    def insert_rentals(cursor):
+        for user_id, active_scooter in zip(user_ids, scooter_ids):
+            rows = [(user_id, rng.choice(scooter_ids), 0, "2025-01-01 12:00:00", "2025-01-01 12:20:00", 30.0) for _ in range(rentals)]
+            rows.append((user_id, active_scooter, 1, "2025-05-01 12:00:00", None, 0.0))
+            cursor.executemany(query, rows)
+    db._run(insert_rentals, commit=True)
+    return user_ids, scooter_ids
+
+
+
+def explain(db, query: str, params: tuple) -> list[str]:
+    """
+    Get the query plan of a query as text lines.
+    """
+    if database.DB_BACKEND == "mysql":
+        def run(cursor):
+            cursor.execute("EXPLAIN " + query, params)
+            # MySQL and MariaDB return different sets of columns, so look them up by name.
+            names = [column[0] for column in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+        return [f"type={row['type']} key={row['key']} rows={row['rows']} extra={row['Extra']}" for row in db._run(run)]
+    return [row[-1] for row in db._fetchall("EXPLAIN QUERY PLAN " + query, params)]
+
+
+
+def measure(db, user_ids: list, scooter_ids: list, iterations: int) -> dict:
+    """
+    Explain and time every query.
+    Returns:
+        dict: The plan and mean latency in milliseconds per query.
+    """
+    rng = random.Random(34)
+    params = {
+        "user":    lambda: (rng.choice(user_ids),),
+        "scooter": lambda: (rng.choice(scooter_ids),),
+        "area":    lambda: (0, CENTER[0] - 0.005, CENTER[0] + 0.005),
+        None:      lambda: (),
+    }
+    results = {}
+    for name, (query, kind) in QUERIES.items():
+        plan = explain(db, query, params[kind]())
+        runs = iterations if kind is not None else max(1, iterations // 20)
+        start = time.perf_counter()
+        for _ in range(runs):
+            db._fetchall(query, params[kind]())
+        results[name] = (plan, (time.perf_counter() - start) * 1000 / runs)
+    return results
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the schema index migrations.")
+    parser.add_argument("--users", type=int, default=500, help="Number of users and scooters (default: 500)")
+    parser.add_argument("--rentals", type=int, default=200, help="Completed rentals per user (default: 200)")
+    parser.add_argument("--iterations", type=int, default=1000, help="Executions per query (default: 1000)")
+    args = parser.parse_args()
+
+    db = database.db(DB_CONFIG)
+    if db.schema_version() > 0:
+        print(f"warning: schema is already at version {db.schema_version()}, the 'before' numbers include those indexes")
+
+    user_ids, scooter_ids = seed(db, args.users, args.rentals)
+    print(f"backend: {database.DB_BACKEND}  users: {len(user_ids)}  rentals: {len(user_ids) * (args.rentals + 1)}\n")
+
+    before = measure(db, user_ids, scooter_ids, args.iterations)
+    start = time.perf_counter()
+    applied = db.migrate()
+    print(f"applied migrations {applied} in {(time.perf_counter() - start) * 1000:.1f} ms\n")
+    after = measure(db, user_ids, scooter_ids, args.iterations)
+
+    for name in QUERIES:
+        plan_before, ms_before = before[name]
+        plan_after, ms_after = after[name]
+        print(f"{name}: {ms_before:.4f} ms -> {ms_after:.4f} ms ({ms_before / ms_after:.1f}x)")
+        print(f"    before: {' | '.join(plan_before)}")
+        print(f"    after:  {' | '.join(plan_after)}")
+    db.close()
@@ -0,0 +1,71 @@
+"""
+Compares writing scooter position reports one UPDATE at a time with the write-behind
+buffer, which coalesces reports per scooter and writes them in batches.
+
+Every scooter reports its position `--reports` times. Without the flusher running each
+report is flushed synchronously; with it, reports are buffered and written every
+`--interval` seconds.
+
+Usage:
+```
+python backend/benchmarks/scooter_write_behind.py --scooters 500 --reports 20
+DB_BACKEND=sqlite python backend/benchmarks/scooter_write_behind.py
+```
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+os.environ.setdefault("DB_BACKEND", "memory")
+os.environ.setdefault("DB_SQLITE_SEED", "False")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from api import database
+
+
+CENTER = (63.4305, 10.3951)
+
+
+
+def report_positions(db, scooter_ids: list, reports: int) -> float:
+    """
+    Send `reports` position reports per scooter, interleaved, and wait until they are written.
+    Returns:
+        float: Seconds taken.
+    """
+    rng = random.Random(7)
+    start = time.perf_counter()
+    for _ in range(reports):
+        for scooter_id in scooter_ids:
+            db._update_scooter_info(scooter_id, CENTER[0] + rng.uniform(-0.05, 0.05), CENTER[1] + rng.uniform(-0.1, 0.1), 0)
+    db.flush_scooter_updates()
+    return time.perf_counter() - start
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the scooter write-behind buffer.")
+    parser.add_argument("--scooters", type=int, default=500, help="Number of scooters (default: 500)")
+    parser.add_argument("--reports", type=int, default=20, help="Position reports per scooter (default: 20)")
+    parser.add_argument("--interval", type=float, default=0.5, help="Flush interval in seconds (default: 0.5)")
+    args = parser.parse_args()
+
+    db = database.db({})
+    db.add_scooters([(CENTER[0], CENTER[1], 0) for _ in range(args.scooters)])
+    scooter_ids = [scooter[0] for scooter in db.get_all_scooters()]
+    total = args.scooters * args.reports
+    print(f"backend: {database.DB_BACKEND}  scooters: {len(scooter_ids)}  reports: {total}\n")
+
+    direct = report_positions(db, scooter_ids, args.reports)
+    written = db.scooter_write_stats()["written"]
+    print(f"synchronous:  {direct * 1000:8.1f} ms  {total / direct:9.0f} reports/s  rows written: {written}")
+
+    db.start_scooter_flusher(args.interval)
+    buffered = report_positions(db, scooter_ids, args.reports)
+    stats = db.scooter_write_stats()
+    print(f"write-behind: {buffered * 1000:8.1f} ms  {total / buffered:9.0f} reports/s  rows written: {stats['written'] - written}")
+    print(f"\nspeedup: {direct / buffered:.1f}x  coalesced: {stats['coalesced']}  flushes: {stats['flushes']}")
+    db.close()
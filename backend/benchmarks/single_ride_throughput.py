@@ -0,0 +1,94 @@
+"""
+Measures the throughput and latency of single_ride_service unlock/lock cycles
+without a database server, MQTT broker or weather API.
+
+The db runs on the in-memory SQLite backend (DB_BACKEND=memory) by default, and
+MQTT and the weather check are disabled, so the numbers only depend on the
+service and database code and are reproducible on any machine. Set
+DB_BACKEND=sqlite to measure against a SQLite file instead.
+
+Usage:
+```
+python backend/benchmarks/single_ride_throughput.py --users 100 --scooters 100 --cycles 2000
+```
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+os.environ.setdefault("DB_BACKEND", "memory")
+os.environ.setdefault("DB_SQLITE_SEED", "False")
+os.environ.setdefault("DISABLE_MQTT", "True")
+os.environ.setdefault("DISABLE_WEATHER", "True")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from api import database
+from service import single_ride_service
+
+
+CENTER = (63.4305, 10.3951)
+
+
+
+def percentile(samples: list, p: float) -> float:
+    """
+    Get a percentile of the samples, in milliseconds.
+    """
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(p / 100 * len(samples)))] * 1000
+
+
+
+def report(name: str, samples: list) -> None:
+    """
+    Print the mean and percentile latencies of an operation.
+    """
+    print(
+        f"{name:<8} n={len(samples):<6} mean={statistics.mean(samples) * 1000:7.3f} ms  "
+        f"p50={percentile(samples, 50):7.3f} ms  p95={percentile(samples, 95):7.3f} ms  p99={percentile(samples, 99):7.3f} ms"
+    )
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark single ride unlock/lock cycles offline.")
+    parser.add_argument("--users", type=int, default=100, help="Number of users (default: 100)")
+    parser.add_argument("--scooters", type=int, default=100, help="Number of scooters (default: 100)")
+    parser.add_argument("--cycles", type=int, default=2000, help="Unlock/lock cycles (default: 2000)")
+    args = parser.parse_args()
+
+    db = database.db({})
+    for i in range(args.users):
+        db.add_user(f"user-{i}", 1e9)
+    db.add_scooters([(CENTER[0] + i * 1e-4, CENTER[1], 0) for i in range(args.scooters)])
+    user_ids = [user[0] for user in db.get_all_users()]
+    scooter_ids = [scooter[0] for scooter in db.get_all_scooters()]
+
+    service = single_ride_service.single_ride_service()
+    unlock_times, lock_times = [], []
+
+    start = time.perf_counter()
+    for cycle in range(args.cycles):
+        user_id = user_ids[cycle % len(user_ids)]
+        scooter_id = scooter_ids[cycle % len(scooter_ids)]
+
+        t0 = time.perf_counter()
+        unlocked = service.unlock_scooter(scooter_id, user_id)
+        t1 = time.perf_counter()
+        locked = service.lock_scooter(scooter_id, user_id)
+        t2 = time.perf_counter()
+
+        assert unlocked[0], f"unlock failed: {unlocked}"
+        assert locked[0], f"lock failed: {locked}"
+        unlock_times.append(t1 - t0)
+        lock_times.append(t2 - t1)
+    elapsed = time.perf_counter() - start
+
+    print(f"backend: {database.DB_BACKEND}  users: {len(user_ids)}  scooters: {len(scooter_ids)}")
+    report("unlock", unlock_times)
+    report("lock", lock_times)
+    print(f"throughput: {args.cycles / elapsed:.1f} cycles/s")
+    db.close()
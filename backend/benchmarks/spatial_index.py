@@ -0,0 +1,82 @@
+"""
+Measures radius and k-nearest query latency of the in-memory scooter index
+(tools/spatial_index.py) for a synthetic fleet spread over Trondheim, and
+checks the results against a brute-force scan.
+
+Usage:
+```
+python backend/benchmarks/spatial_index.py --scooters 100000 --queries 2000
+```
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from tools.spatial_index import grid_index, haversine
+
+
+CENTER = (63.4305, 10.3951)
+SPREAD = 0.08
+
+
+
+def timed(func, queries: list) -> tuple[float, list]:
+    """
+    Run a query function over all query points.
+    Returns:
+        tuple: Mean latency in milliseconds and the query results.
+    """
+    results = []
+    start = time.perf_counter()
+    for lat, lon in queries:
+        results.append(func(lat, lon))
+    return (time.perf_counter() - start) * 1000 / len(queries), results
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the scooter spatial index.")
+    parser.add_argument("--scooters", type=int, default=100000, help="Number of scooters (default: 100000)")
+    parser.add_argument("--queries", type=int, default=2000, help="Number of queries (default: 2000)")
+    parser.add_argument("--radius", type=float, default=250.0, help="Radius in meters (default: 250)")
+    parser.add_argument("--k", type=int, default=5, help="Neighbours for k-nearest (default: 5)")
+    parser.add_argument("--cell", type=float, default=0.0025, help="Cell size in degrees (default: 0.0025)")
+    args = parser.parse_args()
+
+    rng = random.Random(16)
+    fleet = [
+        (uuid, CENTER[0] + rng.uniform(-SPREAD, SPREAD), CENTER[1] + rng.uniform(-2 * SPREAD, 2 * SPREAD), rng.choice((0, 0, 0, 1, 10, 11)))
+        for uuid in range(1, args.scooters + 1)
+    ]
+    queries = [(CENTER[0] + rng.uniform(-SPREAD, SPREAD), CENTER[1] + rng.uniform(-2 * SPREAD, 2 * SPREAD)) for _ in range(args.queries)]
+
+    index = grid_index(cell_size=args.cell)
+    start = time.perf_counter()
+    for uuid, lat, lon, status in fleet:
+        index.upsert(uuid, lat, lon, status)
+    print(f"build:          {(time.perf_counter() - start) * 1000:8.1f} ms for {len(index)} scooters")
+
+    radius_ms, radius_res = timed(lambda lat, lon: index.within_radius(lat, lon, args.radius, status=0), queries)
+    print(f"within_radius:  {radius_ms:8.4f} ms/query (r={args.radius:.0f} m, status=0)")
+
+    knn_ms, knn_res = timed(lambda lat, lon: index.nearest(lat, lon, k=args.k, status=0), queries)
+    print(f"nearest:        {knn_ms:8.4f} ms/query (k={args.k}, status=0)")
+
+    start = time.perf_counter()
+    move = rng.sample(fleet, min(1000, len(fleet)))
+    for uuid, lat, lon, status in move:
+        index.upsert(uuid, lat + 0.001, lon + 0.001, status)
+    print(f"move:           {(time.perf_counter() - start) * 1000 / len(move):8.4f} ms/update")
+    for uuid, lat, lon, status in move:
+        index.upsert(uuid, lat, lon, status)
+
+    # Verify a sample of queries against a brute-force scan.
+    for (lat, lon), got_radius, got_knn in list(zip(queries, radius_res, knn_res))[:50]:
+        scan = sorted((haversine(lat, lon, s_lat, s_lon), uuid) for uuid, s_lat, s_lon, status in fleet if status == 0)
+        assert [u for _, u in scan if _ <= args.radius] == [r[0] for r in got_radius]
+        assert [u for _, u in scan[:args.k]] == [r[0] for r in got_knn]
+    print("results match brute force")
@@ -0,0 +1,97 @@
+"""
+Measures the database latency of starting a rental, comparing the original
+sequence of autocommit statements used by single_ride_service.unlock_scooter
+(get_scooter, get_user, user_has_active_rental, scooter_has_active_rental,
+rental_started) with the transactional db.claim_scooter().
+
+Every iteration starts a rental and removes it again, so the benchmark can be
+run repeatedly against a test database. The user and scooter must exist and
+must not have an active rental.
+
+Usage:
+```
+DB_HOST=localhost DB_USER=user DB_PASSWORD=password DB_NAME=database \
+    python backend/benchmarks/unlock_latency.py --user 1 --scooter 2 --iterations 200
+```
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from api import database
+
+
+DB_CONFIG = {
+    'host':     os.getenv('DB_HOST', 'localhost'),
+    'user':     os.getenv('DB_USER', 'user'),
+    'password': os.getenv('DB_PASSWORD', 'password'),
+    'database': os.getenv('DB_NAME', 'database'),
+    'port':     int(os.getenv('DB_PORT', 3306)),
+}
+
+
+
+def unlock_sequential(db, user_id: int, scooter_id: int) -> int:
+    """
+    The original unlock sequence: five separate autocommit statements.
+    Returns the ID of the started rental.
+    """
+    db.get_scooter(scooter_id)
+    db.get_user(user_id)
+    db.user_has_active_rental(user_id)
+    db.scooter_has_active_rental(scooter_id)
+    db.rental_started(user_id, scooter_id)
+    return db.get_active_rental_by_user(user_id)[0]
+
+
+
+def unlock_claim(db, user_id: int, scooter_id: int) -> int:
+    """
+    The transactional unlock: a single claim_scooter() call.
+    Returns the ID of the started rental.
+    """
+    claim, _, _, rental_id = db.claim_scooter(user_id, scooter_id)
+    if claim != "":
+        raise RuntimeError(f"claim failed: {claim}")
+    return rental_id
+
+
+
+def measure(name: str, func, db, user_id: int, scooter_id: int, iterations: int) -> None:
+    """
+    Run a single unlock variant and print its latency distribution in milliseconds.
+    Only the unlock itself is timed, not the removal of the rental afterwards.
+    """
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        rental_id = func(db, user_id, scooter_id)
+        samples.append((time.perf_counter() - start) * 1000)
+        db.release_claim(rental_id)
+
+    samples.sort()
+    print(
+        f"{name:<12} n={iterations:<5} "
+        f"mean={statistics.mean(samples):7.2f} ms  "
+        f"p50={samples[len(samples) // 2]:7.2f} ms  "
+        f"p95={samples[int(len(samples) * 0.95) - 1]:7.2f} ms  "
+        f"max={samples[-1]:7.2f} ms"
+    )
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark unlock latency against a test database.")
+    parser.add_argument("--user", type=int, required=True, help="ID of a user without an active rental")
+    parser.add_argument("--scooter", type=int, required=True, help="ID of an idle scooter with status 0")
+    parser.add_argument("--iterations", type=int, default=100, help="Unlocks per variant (default: 100)")
+    args = parser.parse_args()
+
+    db = database.db(DB_CONFIG)
+    measure("sequential", unlock_sequential, db, args.user, args.scooter, args.iterations)
+    measure("claim", unlock_claim, db, args.user, args.scooter, args.iterations)
+    db.close()